@@ -1 +1,102 @@
-# TODO: build app
\ No newline at end of file
+from typing import Any, Dict
+import argparse
+import time
+
+from app.llm import LLM
+from n4j.communicator import GraphReader, GraphWriter
+from tools.answer_cache import AnswerCache
+from tools.embedding import EmbeddingService
+from utils.metrics import metrics
+
+
+class RAGPipeline:
+    """
+    Answers questions about the reviews: embed the question, retrieve the closest Child documents
+    with their parents from the graph and let the LLM answer from them.
+    Results are kept in an AnswerCache, so repeated or near identical questions skip the model calls and the graph.
+    Pass the GraphWriter loading new nodes, if any, so the cache drops the answers the loaded Sources could change,
+    those citing them and those asked with a filter they match, and the answers citing deleted Sources,
+    see AnswerCache.on_load and AnswerCache.on_delete.
+    """
+
+    def __init__(self, embedding_service: EmbeddingService = None, reader: GraphReader = None, llm: LLM = None,
+                 cache: AnswerCache = None, writer: GraphWriter = None, k: int = 10) -> None:
+
+        self.embedding_service = EmbeddingService() if embedding_service is None else embedding_service
+        self.reader = GraphReader() if reader is None else reader
+        self.llm = LLM() if llm is None else llm
+        self.cache = AnswerCache() if cache is None else cache
+        self.k = k
+
+        if writer is not None:
+            writer.add_load_listener(self.cache.on_load)
+            writer.add_delete_listener(self.cache.on_delete)
+
+    def answer(self, question: str, playlist_id: str = None, published_after: str = None, published_before: str = None) -> Dict[str, Any]:
+        """
+        Answer a question, optionally from the reviews of one playlist and/or a publish date range (YYYY-MM-DD).
+        Returns the question, answer, contexts, `cached`: "exact", "semantic" or None,
+        and `cached_question`: the question the cached result was stored for.
+        """
+
+        start = time.perf_counter()
+        scope = (playlist_id, published_after, published_before)
+
+        entry = self.cache.get(question, scope)
+        level = "exact"
+
+        if entry is None:
+            embedding = self.embedding_service.get_document_embedding(question)
+            entry = self.cache.get_similar(question, embedding, scope)
+            level = "semantic"
+
+            if entry is None:
+                if any(scope):
+                    contexts = self.reader.retrieve_filtered(embedding, k=self.k, playlist_id=playlist_id,
+                                                             published_after=published_after, published_before=published_before)
+                else:
+                    contexts = self.reader.retrieve(embedding, k=self.k)
+
+                answer = self.llm.generate(question, contexts)
+                entry = self.cache.put(question, embedding, contexts, answer, scope)
+                level = None
+
+        metrics.observe("rag_answer_seconds", time.perf_counter() - start, cached=str(level))
+
+        return {"question": question, "answer": entry['answer'], "contexts": entry['contexts'], "cached": level,
+                "cached_question": entry['question']}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Answer questions about the reviews in the graph.")
+    parser.add_argument("questions", nargs="*", help="questions to answer, or read from stdin")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--playlist-id")
+    parser.add_argument("--published-after")
+    parser.add_argument("--published-before")
+    args = parser.parse_args()
+
+    pipeline = RAGPipeline(k=args.k)
+
+    def questions():
+        if args.questions:
+            yield from args.questions
+        else:
+            while True:
+                try:
+                    line = input("> ").strip()
+                except EOFError:
+                    return
+                if line:
+                    yield line
+
+    for question in questions():
+        result = pipeline.answer(question, playlist_id=args.playlist_id,
+                                 published_after=args.published_after, published_before=args.published_before)
+        print(result['answer'])
+        for context in result['contexts']:
+            print(f"    {context.get('score', 0):.3f} {context.get('title')} {context.get('url')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,65 @@
+from typing import Dict, List
+import os
 
 
+PROMPT_TEMPLATE = """You answer questions about Anthony Fantano's album reviews.
+Use only the review excerpts below. If they do not contain the answer, say so.
 
+{context}
 
+Question: {question}
+Answer:"""
 
-#TODO: build LLM class
 class LLM:
+    """
+    Answers a question from the contexts retrieved by GraphReader.
+    Without a model, the one named by LLM_MODEL (default mistral) is served by Ollama at OLLAMA_BASE_URL
+    through LangChain, created on first use. Any object with a LangChain style `predict(prompt) -> str`
+    can be passed in instead, e.g. a local stub.
+    """
 
-    def __init__(self) -> None:
+    def __init__(self, llm = None, model_name: str = None, max_context_chars: int = 6_000) -> None:
 
-        self._llm = 'mistral'
+        self._llm = llm
+        self.model_name = model_name or os.environ.get("LLM_MODEL", "mistral")
+        self.max_context_chars = max_context_chars
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            from langchain.llms import Ollama
+
+            self._llm = Ollama(model=self.model_name, base_url=os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434"))
+        return self._llm
+
+    def build_prompt(self, question: str, contexts: List[Dict]) -> str:
+        """
+        The prompt for a question, with the parent text of each distinct parent among the contexts,
+        in order of retrieval and cut at `max_context_chars`.
+        """
+
+        excerpts = []
+        seen = set()
+        length = 0
+
+        for context in contexts:
+            key = context.get('parent_index') or context.get('index')
+            if key in seen:
+                continue
+            seen.add(key)
+
+            text = context.get('parent_text') or context.get('text') or ""
+            excerpt = f"[{context.get('title') or context.get('url')}]\n{text}"
+            if excerpts and length + len(excerpt) > self.max_context_chars:
+                break
+            excerpts.append(excerpt[:self.max_context_chars])
+            length += len(excerpt)
+
+        return PROMPT_TEMPLATE.format(context="\n\n".join(excerpts), question=question)
+
+    def generate(self, question: str, contexts: List[Dict]) -> str:
+        """
+        Answer the question from the contexts.
+        """
+
+        return self.llm.predict(self.build_prompt(question, contexts)).strip()
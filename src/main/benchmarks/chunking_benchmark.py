@@ -0,0 +1,54 @@
+"""
+Measure how chunking scales with the number of worker processes in Chunker.
+
+Run from src/main:
+    python -m benchmarks.chunking_benchmark --transcripts 200 --words 3000
+"""
+import argparse
+import os
+import time
+
+from langchain.schema.document import Document
+
+from benchmarks.corpus import synthetic_transcript
+from tools.chunker import Chunker
+from utils.utils import remove_filler_words
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transcripts", type=int, default=200)
+    parser.add_argument("--words", type=int, default=3000)
+    parser.add_argument("--processes", type=int, nargs="+", default=None,
+                        help="process counts to compare, defaults to powers of 2 up to the number of cores")
+    args = parser.parse_args()
+
+    processes = args.processes
+    if processes is None:
+        processes = [1]
+        while processes[-1] * 2 <= (os.cpu_count() or 1):
+            processes.append(processes[-1] * 2)
+
+    documents = [Document(page_content=synthetic_transcript(args.words, seed=i),
+                          metadata={"video_id": f"video{i}", "source": f"https://www.youtube.com/watch?v=video{i}",
+                                    "publish_date": "2020-01-01", "title": f"Video {i}"})
+                 for i in range(args.transcripts)]
+
+    # no transcripts are downloaded, the documents are split directly
+    chunker = Chunker(bucket=object())
+
+    print(f"corpus: {len(documents)} transcripts of {args.words} words, {os.cpu_count()} cores")
+
+    baseline = None
+    for n_process in processes:
+        start = time.perf_counter()
+        chunks = sum(len(children) for children in chunker._iter_split_documents(iter(documents), [remove_filler_words], n_process=n_process))
+        seconds = time.perf_counter() - start
+
+        baseline = baseline or seconds
+        print(f"processes: {n_process:3d} | chunks: {chunks} | transcripts/sec: {len(documents) / seconds:8.1f} | "
+              f"speedup: {baseline / seconds:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Compare retrieval (and optionally write) throughput of GraphReader/GraphWriter, serially and on a thread pool,
+with AsyncGraphReader/AsyncGraphWriter under asyncio, at several concurrency levels.
+
+By default both run against the fake driver in benchmarks.fakes, which adds `--latency` seconds per transaction
+and allows `--pool-size` transactions at once. With --live they run against the database configured by
+NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD and NEO4J_DATABASE, using the given pool settings.
+--writes also loads synthetic rows, which in live mode writes synthetic nodes.
+
+Run from src/main:
+    python -m benchmarks.concurrency_benchmark --questions 500 --concurrency 1 8 32 --latency 0.005 --writes
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import asyncio
+import os
+import random
+import time
+
+from benchmarks.corpus import synthetic_rows
+from benchmarks.fakes import FakeAsyncDriver, FakeDriver, FakeGraph
+from n4j import drivers
+from n4j.async_communicator import AsyncGraphReader, AsyncGraphWriter
+from n4j.communicator import GraphReader, GraphWriter
+from utils.metrics import LatencyRecorder
+from utils.utils import batch_method
+
+
+def report(name: str, count: int, seconds: float, latency: LatencyRecorder) -> None:
+    summary = latency.summary()
+    print(f"{name:28s} {count / seconds:10.1f} /sec | p50 {summary['p50'] * 1000:8.2f} ms | p99 {summary['p99'] * 1000:8.2f} ms")
+
+
+def timed_call(func, latency: LatencyRecorder, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    latency.record(time.perf_counter() - start)
+    return result
+
+
+async def timed_await(func, latency: LatencyRecorder, limit: asyncio.Semaphore, *args, **kwargs):
+    async with limit:
+        start = time.perf_counter()
+        result = await func(*args, **kwargs)
+        latency.record(time.perf_counter() - start)
+        return result
+
+
+def run_sync(func, items, concurrency: int) -> LatencyRecorder:
+    latency = LatencyRecorder(max_samples=len(items))
+
+    if concurrency == 1:
+        for item in items:
+            timed_call(func, latency, item)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(lambda item: timed_call(func, latency, item), items))
+
+    return latency
+
+
+async def run_async(func, items, concurrency: int) -> LatencyRecorder:
+    latency = LatencyRecorder(max_samples=len(items))
+    limit = asyncio.Semaphore(concurrency)
+    await asyncio.gather(*(timed_await(func, latency, limit, item) for item in items))
+    return latency
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--writes", action="store_true", help="also load synthetic rows in batches")
+    parser.add_argument("--videos", type=int, default=50, help="synthetic videos to load")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--dimensions", type=int, default=96)
+    parser.add_argument("--latency", type=float, default=0.005, help="fake driver: seconds per transaction")
+    parser.add_argument("--pool-size", type=int, default=100, help="max_connection_pool_size")
+    parser.add_argument("--acquisition-timeout", type=float, default=None, help="connection_acquisition_timeout")
+    parser.add_argument("--live", action="store_true")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    questions = [[rng.uniform(-1, 1) for _ in range(args.dimensions)] for _ in range(args.questions)]
+    batches = list(batch_method(synthetic_rows(args.videos, dimensions=args.dimensions), args.batch_size))
+
+    pool_config = {"max_connection_pool_size": args.pool_size, "connection_acquisition_timeout": args.acquisition_timeout}
+    graph = FakeGraph()
+
+    def sync_driver():
+        if args.live:
+            return drivers.init_driver(os.environ.get("NEO4J_URI"), os.environ.get("NEO4J_USERNAME"),
+                                       os.environ.get("NEO4J_PASSWORD"), **pool_config)
+        return FakeDriver(latency=args.latency, graph=graph, max_connection_pool_size=args.pool_size)
+
+    async def async_driver():
+        if args.live:
+            return await drivers.init_async_driver(os.environ.get("NEO4J_URI"), os.environ.get("NEO4J_USERNAME"),
+                                                   os.environ.get("NEO4J_PASSWORD"), **pool_config)
+        return FakeAsyncDriver(latency=args.latency, graph=graph, max_connection_pool_size=args.pool_size)
+
+    driver = sync_driver()
+    writer = GraphWriter(driver=driver)
+    reader = GraphReader(driver=driver)
+
+    print(f"{'live' if args.live else 'fake'} driver | pool size {args.pool_size} | "
+          f"{len(questions)} questions | {len(batches)} write batches of {args.batch_size} rows")
+
+    for concurrency in args.concurrency:
+        if args.writes:
+            start = time.perf_counter()
+            latency = run_sync(writer.load_nodes_normalized, batches, concurrency)
+            report(f"sync write x{concurrency}", len(batches) * args.batch_size, time.perf_counter() - start, latency)
+
+        start = time.perf_counter()
+        latency = run_sync(lambda question: reader.retrieve(question, k=args.k), questions, concurrency)
+        report(f"sync retrieve x{concurrency}", len(questions), time.perf_counter() - start, latency)
+
+    driver.close()
+
+    async def run_all():
+        async_driver_ = await async_driver()
+        async_writer = AsyncGraphWriter(driver=async_driver_)
+        async_reader = AsyncGraphReader(driver=async_driver_)
+
+        for concurrency in args.concurrency:
+            if args.writes:
+                start = time.perf_counter()
+                latency = await run_async(async_writer.load_nodes_normalized, batches, concurrency)
+                report(f"async write x{concurrency}", len(batches) * args.batch_size, time.perf_counter() - start, latency)
+
+            start = time.perf_counter()
+            latency = await run_async(lambda question: async_reader.retrieve(question, k=args.k), questions, concurrency)
+            report(f"async retrieve x{concurrency}", len(questions), time.perf_counter() - start, latency)
+
+        await async_driver_.close()
+
+    asyncio.run(run_all())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+from typing import Dict, List, Tuple
+import random
+
+# vocabulary loosely modeled on album review transcripts
+VOCABULARY = """
+hi everyone anthony fantano here the internet's busiest music nerd and it's time for a review of the new album
+from this artist the record is an interesting listen production beats vocals lyrics hooks verses chorus bridge
+guitar synth drums bass sample mixing mastering track tracklist single feature features rapper singer band
+um uh ah like you know really kind of sort of pretty very super honestly actually basically literally just
+decent strong light fan heavy fan classic transition forgettable highlight standout favorite least favorite
+experimental electronic hip hop rock pop jazz punk metal folk soul ambient noise indie dance house techno
+""".split()
+
+
+def synthetic_transcript(n_words: int, seed: int = 0) -> str:
+    """
+    Create a transcript-like string of n_words random words.
+    """
+
+    rng = random.Random(seed)
+    return " ".join(rng.choice(VOCABULARY) for _ in range(n_words))
+
+
+def synthetic_chunks(n_chunks: int, chunk_size: int = 140, seed: int = 0) -> List[str]:
+    """
+    Create n_chunks strings of roughly chunk_size characters, similar to the child chunks.
+    """
+
+    rng = random.Random(seed)
+    chunks = []
+
+    for _ in range(n_chunks):
+        words = []
+        while sum(len(w) + 1 for w in words) < chunk_size:
+            words.append(rng.choice(VOCABULARY))
+        chunks.append(" ".join(words)[:chunk_size])
+
+    return chunks
+
+
+def synthetic_rows(n_videos: int, parents_per_video: int = 4, children_per_parent: int = 12, 
+                   dimensions: int = 96, playlist_id: str = "synthetic", seed: int = 0) -> List[Dict]:
+    """
+    Create rows in the format returned by utils.prepare_new_nodes, with random embeddings.
+    """
+
+    rng = random.Random(seed)
+    rows = []
+
+    for v in range(n_videos):
+        video_id = f"synthetic-{seed}-{v}"
+        for p in range(parents_per_video):
+            parent_index = f"{video_id}-parent-{p}"
+            parent_transcript = synthetic_transcript(400, seed=rng.random())
+            for c in range(children_per_parent):
+                rows.append({"url": "https://www.youtube.com/watch?v="+video_id,
+                             "video_id": video_id,
+                             "parent_index": parent_index,
+                             "parent_transcript": parent_transcript,
+                             "title": f"Synthetic Album {v} REVIEW",
+                             "publish_date": f"20{10 + v % 14:02d}-{1 + v % 12:02d}-{1 + v % 28:02d}",
+                             "transcript": parent_transcript[c * 105:c * 105 + 140],
+                             "child_index": f"{parent_index}-child-{c}",
+                             "playlist_id": playlist_id,
+                             "embedding": [rng.uniform(-1, 1) for _ in range(dimensions)]})
+
+    return rows
+
+
+def synthetic_channel(n_videos: int, n_words: int = 2500, unavailable: float = 0.0, seed: int = 0) -> Tuple[List[Dict[str, str]], Dict[str, str]]:
+    """
+    Create the video info of a playlist, as stored in the video info csv, and the transcripts of its videos.
+    A share `unavailable` of the videos has no transcript.
+    """
+
+    rng = random.Random(seed)
+    videos = []
+    transcripts = {}
+
+    for v in range(n_videos):
+        video_id = f"vid{seed:03d}{v:07d}"
+        videos.append({"id": video_id,
+                       "title": f"Synthetic Album {v} REVIEW",
+                       "publish_date": f"20{10 + v % 14:02d}-{1 + v % 12:02d}-{1 + v % 28:02d}"})
+
+        if rng.random() >= unavailable:
+            transcripts[video_id] = synthetic_transcript(n_words, seed=rng.random())
+
+    return videos, transcripts
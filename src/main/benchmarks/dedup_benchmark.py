@@ -0,0 +1,161 @@
+"""
+Measure near-duplicate child suppression with tools.dedup.NearDuplicateFilter on a corpus where every transcript
+opens with an intro, has a sponsor read and closes with an outro, each said with slight variations.
+Children are split like Chunker splits them, then loaded into a FakeGraph without a filter, and with one per mode.
+Reports the children embedded and indexed, the dedup time per child, the search latency and the share of
+top-k results that are near duplicates of a higher ranked result.
+
+Embeddings come from FakeHashingEmbeddings, so similar texts get similar vectors.
+
+Run from src/main:
+    python -m benchmarks.dedup_benchmark --videos 500 --words 1500
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from benchmarks.corpus import VOCABULARY
+from benchmarks.fakes import FakeDriver, FakeHashingEmbeddings
+from n4j.communicator import GraphReader, GraphWriter
+from tools.dedup import COLLAPSE, DROP, NearDuplicateFilter
+from utils.metrics import LatencyRecorder
+from utils.utils import parent_index, prepare_new_nodes
+
+INTRO = "hi everyone anthony fantano here the internet's busiest music nerd and it's time for a review of the new album from {artist}"
+SPONSOR = ("before we get into the review i want to thank today's sponsor for supporting the channel check out the link "
+           "in the description below to get twenty percent off your first order")
+OUTRO = ("transition so that's my review what did you think of this album let me know in the comments below "
+         "hit that like button subscribe and i'll see you in the next one anthony fantano forever")
+
+# review words, the boilerplate has its own
+BODY_VOCABULARY = sorted(set(VOCABULARY) - set(" ".join([INTRO, SPONSOR, OUTRO]).split()))
+
+QUERIES = ["what did you think of this album", "anthony fantano review of the new album", "review of the new album from this artist",
+           "the sponsor of the channel", "heavy synth production on the record", "rapper verses and features on the tracklist"]
+
+
+def vary(text: str, rng: random.Random) -> str:
+    """
+    Say a boilerplate line slightly differently: drop or repeat a word, or add a filler word.
+    """
+
+    words = text.split()
+    for _ in range(rng.randint(0, 2)):
+        i = rng.randrange(len(words))
+        edit = rng.random()
+        if edit < 0.33:
+            del words[i]
+        elif edit < 0.66:
+            words.insert(i, words[i])
+        else:
+            words.insert(i, rng.choice(["um", "uh", "like", "so"]))
+    return " ".join(words)
+
+
+def corpus_rows(n_videos: int, n_words: int, seed: int = 0):
+    rng = random.Random(seed)
+    parent_splitter = RecursiveCharacterTextSplitter(chunk_size=4_000, chunk_overlap=0)
+    child_splitter = RecursiveCharacterTextSplitter(chunk_size=140, chunk_overlap=20)
+    rows = []
+
+    for v in range(n_videos):
+        video_id = f"video{v:06d}"
+        body = [rng.choice(BODY_VOCABULARY) for _ in range(n_words)]
+        middle = rng.randrange(len(body))
+        transcript = " ".join([vary(INTRO.format(artist=f"artist {v}"), rng), *body[:middle], vary(SPONSOR, rng),
+                               *body[middle:], vary(OUTRO, rng)])
+
+        for offset, parent in enumerate(parent_splitter.split_text(transcript)):
+            index = parent_index(video_id, offset, parent)
+            for child_offset, text in enumerate(child_splitter.split_text(parent)):
+                rows.append({"url": "https://www.youtube.com/watch?v="+video_id, "video_id": video_id,
+                             "parent_index": index, "child_offset": child_offset, "parent_transcript": parent,
+                             "title": f"Synthetic Album {v} REVIEW", "publish_date": "2020-01-01", "transcript": text})
+    return rows
+
+
+def is_boilerplate(text: str) -> bool:
+    return any(phrase in text for phrase in ("fantano here", "sponsor", "link in the", "like button", "my review"))
+
+
+def redundant_results(results, threshold: float) -> int:
+    """
+    The results that are near duplicates of a higher ranked one.
+    """
+
+    rows = [{"parent_index": result['parent_index'], "child_index": result['index'], "transcript": result['text']} for result in results]
+    return len(rows) - len(NearDuplicateFilter(mode=DROP, threshold=threshold).filter_rows(rows))
+
+
+def run(name: str, rows, dedup: NearDuplicateFilter, embeddings: FakeHashingEmbeddings, k: int, repeats: int, threshold: float) -> None:
+    rows = [dict(row) for row in rows]
+    n_rows = len(rows)
+
+    start = time.perf_counter()
+    if dedup is not None:
+        rows = dedup.filter_rows(rows)
+    dedup_seconds = time.perf_counter() - start
+
+    texts = [row['transcript'] for row in rows if row.get('duplicate_of') is None]
+    start = time.perf_counter()
+    vectors = np.array(embeddings.embed_documents(texts), dtype=np.float32)
+    embed_seconds = time.perf_counter() - start
+
+    driver = FakeDriver()
+    GraphWriter(driver=driver).load_nodes(prepare_new_nodes(rows, embedding_service=None, playlist_id="synthetic",
+                                                            embeddings=vectors))
+    reader = GraphReader(driver=driver)
+
+    latency = LatencyRecorder()
+    redundant = 0
+    for _ in range(repeats):
+        for query in QUERIES:
+            embedding = embeddings.embed_query(query)
+            start = time.perf_counter()
+            results = reader.retrieve(embedding, k=k)
+            latency.record(time.perf_counter() - start)
+            redundant += redundant_results(results, threshold)
+
+    removed = dedup.removed if dedup is not None else 0
+    print(f"{name:9s} | {len(texts):8d} | {len(driver.graph.children):8d} | {removed:7d} | "
+          f"{dedup_seconds / n_rows * 1e6:8.1f} | "
+          f"{embed_seconds:6.2f} | {latency.percentile(50) * 1000:7.2f} | {redundant / (repeats * len(QUERIES) * k):6.1%}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--videos", type=int, default=500)
+    parser.add_argument("--words", type=int, default=1_500)
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--dimensions", type=int, default=96)
+    args = parser.parse_args()
+
+    rows = corpus_rows(args.videos, args.words)
+    boilerplate = sum(is_boilerplate(row['transcript']) for row in rows)
+    embeddings = FakeHashingEmbeddings(args.dimensions)
+
+    print(f"{args.videos} videos | {len(rows)} children | {boilerplate} boilerplate children | threshold {args.threshold}")
+    print(f"{'filter':9s} | {'embedded':>8s} | {'indexed':>8s} | {'removed':>7s} | {'us/child':>8s} | {'embed s':>6s} | "
+          f"{'p50 ms':>7s} | near duplicates in top k")
+
+    run("none", rows, None, embeddings, args.k, args.repeats, args.threshold)
+    for mode in (DROP, COLLAPSE):
+        run(mode, rows, NearDuplicateFilter(mode=mode, threshold=args.threshold), embeddings, args.k, args.repeats, args.threshold)
+
+    # the filter should scale linearly with the number of children
+    print(f"{'children':>9s} | {'seconds':>8s} | us/child")
+    for n_videos in (args.videos // 4, args.videos // 2, args.videos):
+        scaled = corpus_rows(n_videos, args.words, seed=1)
+        start = time.perf_counter()
+        NearDuplicateFilter(mode=DROP, threshold=args.threshold).filter_rows(scaled)
+        seconds = time.perf_counter() - start
+        print(f"{len(scaled):9d} | {seconds:8.2f} | {seconds / len(scaled) * 1e6:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
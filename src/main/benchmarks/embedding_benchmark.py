@@ -0,0 +1,43 @@
+"""
+Compare per-call and batched embedding throughput.
+
+Run from src/main:
+    python -m benchmarks.embedding_benchmark --chunks 2000 --batch-size 256 --n-process 1
+"""
+import argparse
+import time
+
+from benchmarks.corpus import synthetic_chunks
+from tools.embedding import EmbeddingService
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--n-process", type=int, default=1)
+    args = parser.parse_args()
+
+    texts = synthetic_chunks(args.chunks)
+    service = EmbeddingService()
+
+    # warm up the model
+    service.get_document_embeddings(texts[:32])
+
+    start = time.perf_counter()
+    for text in texts:
+        service.get_document_embedding(text)
+    per_call = time.perf_counter() - start
+
+    start = time.perf_counter()
+    service.get_document_embeddings(texts, batch_size=args.batch_size, n_process=args.n_process)
+    batched = time.perf_counter() - start
+
+    print(f"chunks:   {len(texts)}")
+    print(f"per-call: {len(texts) / per_call:10.1f} chunks/sec ({per_call:.2f} s)")
+    print(f"batched:  {len(texts) / batched:10.1f} chunks/sec ({batched:.2f} s)")
+    print(f"speedup:  {per_call / batched:10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
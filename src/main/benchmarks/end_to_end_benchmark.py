@@ -0,0 +1,232 @@
+"""
+Offline end-to-end benchmark of scrape -> chunk -> embed -> load -> retrieve.
+
+The real Scraper, Chunker, EmbeddingService, prepare_new_nodes, GraphWriter and GraphReader run
+against the in-process fakes in benchmarks.fakes and a synthetic corpus, so no cloud service is needed.
+Per stage it reports throughput, latency percentiles and peak memory as JSON, which can be
+saved and compared between commits:
+
+Run from src/main:
+    python -m benchmarks.end_to_end_benchmark --videos 200 --output before.json
+    python -m benchmarks.end_to_end_benchmark --videos 200 --output after.json --compare before.json
+
+Use --embeddings blank when en_core_web_sm is not installed. Vectors then come from an untrained
+spaCy tok2vec pipeline, which is fine for timing but meaningless for retrieval quality.
+"""
+from typing import Callable, Dict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+from benchmarks.corpus import synthetic_channel, synthetic_chunks
+from benchmarks.fakes import FakeBucket, FakeDriver, FakeSpacyEmbeddings, FakeTranscriptApi
+from n4j.communicator import GraphReader, GraphWriter
+from tools.chunker import Chunker
+from tools.embedding import EmbeddingService
+from tools.scraper import Scraper
+from utils.metrics import LatencyRecorder
+from utils.normalization import TextNormalizer
+from utils.utils import batch_method, prepare_new_nodes
+
+PLAYLIST_TITLE = "synthetic"
+PLAYLIST_ID = "synthetic-playlist"
+
+
+class StageReport:
+
+    def __init__(self, unit: str) -> None:
+        self.unit = unit
+        self.items = 0
+        self.latency = LatencyRecorder(max_samples=1_000_000)
+
+
+def timed(func: Callable, recorder: LatencyRecorder) -> Callable:
+    """
+    Wrap a function so that the latency of every call is recorded.
+    """
+
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            recorder.record(time.perf_counter() - start)
+
+    return wrapper
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class BenchmarkRun:
+
+    def __init__(self, trace_memory: bool = False) -> None:
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+        if trace_memory:
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str, unit: str):
+        report = StageReport(unit)
+
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+
+        print(f"{name}...")
+        start = time.perf_counter()
+        yield report
+        seconds = time.perf_counter() - start
+
+        latency = report.latency.summary()
+        latency.update({"p90": report.latency.percentile(90)})
+
+        self.stages[name] = {"unit": report.unit,
+                             "items": report.items,
+                             "seconds": round(seconds, 4),
+                             "throughput": round(report.items / seconds, 2) if seconds else 0.0,
+                             "latency_seconds": {key: round(value, 6) for key, value in latency.items()},
+                             "peak_rss_mb": round(peak_rss_mb(), 1)}
+
+        if self.trace_memory:
+            self.stages[name]["peak_traced_mb"] = round(tracemalloc.get_traced_memory()[1] / 1e6, 1)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def compare(current: Dict, previous: Dict) -> None:
+    print(f"{'stage':10s} {'before':>12s} {'after':>12s} {'change':>8s}  (throughput)")
+    for name, stage in current["stages"].items():
+        before = previous.get("stages", {}).get(name)
+        if not before or not before["throughput"]:
+            continue
+        ratio = stage["throughput"] / before["throughput"]
+        print(f"{name:10s} {before['throughput']:12.1f} {stage['throughput']:12.1f} {ratio:7.2f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--videos", type=int, default=200)
+    parser.add_argument("--words", type=int, default=2500, help="words per transcript")
+    parser.add_argument("--unavailable", type=float, default=0.02, help="share of videos without a transcript")
+    parser.add_argument("--workers", type=int, default=8, help="scraper and download threads")
+    parser.add_argument("--chunk-processes", type=int, default=1)
+    parser.add_argument("--embed-batch-size", type=int, default=256)
+    parser.add_argument("--load-batch-size", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--storage-latency", type=float, default=0.0, help="seconds added to every storage request")
+    parser.add_argument("--youtube-latency", type=float, default=0.0, help="seconds added to every transcript request")
+    parser.add_argument("--neo4j-latency", type=float, default=0.0, help="seconds added to every transaction")
+    parser.add_argument("--embeddings", choices=["spacy", "blank"], default="spacy")
+    parser.add_argument("--trace-memory", action="store_true", help="also report the peak traced python allocations per stage")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--compare", help="JSON report of a previous run to compare throughput with")
+    args = parser.parse_args()
+
+    videos, transcripts = synthetic_channel(args.videos, n_words=args.words, unavailable=args.unavailable)
+
+    bucket = FakeBucket(latency=args.storage_latency)
+    bucket.blob("youtube/"+PLAYLIST_TITLE+".csv").upload_from_string(pd.DataFrame.from_dict(videos).to_csv(), "text/csv")
+
+    embedding_service = EmbeddingService(embeddings=FakeSpacyEmbeddings() if args.embeddings == "blank" else None)
+    driver = FakeDriver(latency=args.neo4j_latency)
+
+    run = BenchmarkRun(trace_memory=args.trace_memory)
+
+    with run.stage("scrape", unit="videos") as stage:
+        scraper = Scraper(channel_id="synthetic-channel", playlist_id=PLAYLIST_ID, bucket=bucket,
+                          transcript_api=FakeTranscriptApi(transcripts, latency=args.youtube_latency))
+        scraper._create_transcript = timed(scraper._create_transcript, stage.latency)
+        scraper.create_and_upload_transcripts(transcripts_folder=PLAYLIST_TITLE, video_info_file_name=PLAYLIST_TITLE,
+                                              max_workers=args.workers)
+        stage.items = len(videos)
+        print()
+
+    # per transcript latency, including the wait for its download
+    with run.stage("chunk", unit="chunks") as stage:
+        chunker = Chunker(bucket=bucket, max_workers=args.workers, normalizer=TextNormalizer())
+        rows = []
+        current_video = None
+        last = time.perf_counter()
+
+        for row in chunker.iter_chunks(playlist_title=PLAYLIST_TITLE, n_process=args.chunk_processes):
+            if row['video_id'] != current_video:
+                now = time.perf_counter()
+                if current_video is not None:
+                    stage.latency.record(now - last)
+                current_video, last = row['video_id'], now
+            rows.append(row)
+
+        if current_video is not None:
+            stage.latency.record(time.perf_counter() - last)
+        stage.items = len(rows)
+
+    # warm up the model outside of the measurement
+    embedding_service.get_document_embeddings(["warm up"])
+
+    with run.stage("embed", unit="chunks") as stage:
+        prepare = timed(prepare_new_nodes, stage.latency)
+        nodes = []
+        for batch in batch_method(rows, args.embed_batch_size):
+            nodes.extend(prepare(batch, embedding_service, playlist_id=PLAYLIST_ID, batch_size=args.embed_batch_size))
+        stage.items = len(nodes)
+
+    with run.stage("load", unit="rows") as stage:
+        writer = GraphWriter(driver=driver)
+        load = timed(writer.load_nodes_normalized, stage.latency)
+        for batch in batch_method(nodes, args.load_batch_size):
+            load(batch)
+        stage.items = len(nodes)
+
+    questions = embedding_service.get_document_embeddings(synthetic_chunks(args.queries, chunk_size=80, seed=1))
+
+    with run.stage("retrieve", unit="queries") as stage:
+        reader = GraphReader(driver=driver)
+        retrieve = timed(reader.retrieve, stage.latency)
+        for question in questions:
+            retrieve(question, k=args.k)
+        stage.items = len(questions)
+
+    report = {"created": datetime.now(timezone.utc).isoformat(),
+              "commit": git_commit(),
+              "python": sys.version.split()[0],
+              "config": vars(args),
+              "counts": {"videos": len(videos),
+                         "failed_transcripts": len(scraper._unsuccessful_list),
+                         "chunks": len(rows),
+                         "graph_children": len(driver.graph.children),
+                         "transactions": driver.transactions,
+                         "unhandled_queries": len(driver.graph.unhandled)},
+              "stages": run.stages}
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print("report written to", args.output)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Compare the storage cost of failure bookkeeping per run as the history grows:
+    csv     what update_unsuccessful_transcripts used to do: download the whole failed csv, append, upload it again
+    ledger  Scraper.update_unsuccessful_transcripts: append the new failures to the FailureLedger
+Each run records `--failures` new failures; every `--retry-every` runs the due failures are retried, see
+Scraper.retry_failed_transcripts (none recover, so the ledger keeps growing like the csv).
+
+Run from src/main:
+    python -m benchmarks.failure_ledger_benchmark --runs 200 --failures 20
+"""
+from datetime import timedelta
+import argparse
+import io
+
+import pandas as pd
+
+from benchmarks.fakes import FakeBucket, FakeTranscriptApi
+from tools.failure_ledger import utc_now
+from tools.scraper import Scraper
+
+
+class CountingBucket(FakeBucket):
+    """
+    FakeBucket that also counts the bytes uploaded and downloaded.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.bytes = 0
+
+    def _put(self, name: str, data: bytes) -> None:
+        self.bytes += len(data)
+        super()._put(name, data)
+
+    def blob(self, name: str):
+        blob = super().blob(name)
+        download = blob.download_as_bytes
+
+        def counted_download(start: int = None, end: int = None) -> bytes:
+            data = download(start, end)
+            self.bytes += len(data)
+            return data
+
+        blob.download_as_bytes = blob.download_as_string = counted_download
+        blob.download_as_text = lambda encoding="utf-8": counted_download().decode(encoding)
+        return blob
+
+    def get_blob(self, name: str):
+        return self.blob(name) if super().get_blob(name) is not None else None
+
+
+def csv_bookkeeping(bucket: FakeBucket, failed) -> None:
+    failed_df = pd.DataFrame.from_dict(failed)
+    blob = bucket.get_blob("youtube/failed_video_info.csv")
+
+    if blob is not None:
+        previous = pd.read_csv(io.BytesIO(blob.download_as_bytes()))[['id', 'title', 'publish_date']]
+        failed_df = pd.concat([previous, failed_df], ignore_index=True)
+
+    bucket.blob("youtube/failed_video_info.csv").upload_from_string(failed_df.to_csv(), 'text/csv')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--failures", type=int, default=20, help="new failures per run")
+    parser.add_argument("--retry-every", type=int, default=1, help="retry due failures every n runs")
+    parser.add_argument("--hours-per-run", type=float, default=24.0)
+    args = parser.parse_args()
+
+    csv_bucket = CountingBucket()
+    ledger_bucket = CountingBucket()
+    scraper = Scraper(channel_id="channel", playlist_id="playlist", bucket=ledger_bucket, transcript_api=FakeTranscriptApi({}))
+    start = utc_now()
+
+    print(f"{'run':>5s} | {'csv requests':>12s} {'csv bytes':>10s} | {'ledger requests':>15s} {'ledger bytes':>12s} | pending shards")
+
+    for run in range(1, args.runs + 1):
+        now = start + timedelta(hours=run * args.hours_per_run)
+        failed = [{"id": f"video-{run}-{i}", "title": f"Video {run} {i} REVIEW", "publish_date": "2023-01-01", "error": "TranscriptsDisabled"}
+                  for i in range(args.failures)]
+
+        requests, size = csv_bucket.requests, csv_bucket.bytes
+        csv_bookkeeping(csv_bucket, failed)
+        csv_cost = (csv_bucket.requests - requests, csv_bucket.bytes - size)
+
+        requests, size = ledger_bucket.requests, ledger_bucket.bytes
+        scheduler = scraper.retry_scheduler("playlist")
+        scheduler.record_failures(failed, now=now)
+        if run % args.retry_every == 0:
+            # the retries themselves are not bookkeeping, only the ledger reads and writes are counted
+            due, not_due, shards = scheduler.due(now)
+            scheduler.complete(due, not_due, shards, [{**entry, "error": "TranscriptsDisabled"} for entry in due], now)
+        ledger_cost = (ledger_bucket.requests - requests, ledger_bucket.bytes - size)
+
+        if run in (1, 10) or run % 50 == 0:
+            pending = len(ledger_bucket.list_blobs(prefix="youtube/failures/playlist/pending/"))
+            print(f"{run:5d} | {csv_cost[0]:12d} {csv_cost[1]:10d} | {ledger_cost[0]:15d} {ledger_cost[1]:12d} | {pending}")
+
+
+if __name__ == "__main__":
+    main()
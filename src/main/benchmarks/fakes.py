@@ -0,0 +1,671 @@
+"""
+In-process stand-ins for GCP Storage, YouTubeTranscriptApi, the Neo4j driver, the embedding model and the LLM,
+for running the real Scraper, Chunker, GraphWriter, GraphReader and RAGPipeline code paths without any cloud service.
+
+Every fake can add a fixed latency per request to approximate network round trips.
+"""
+from typing import Any, AsyncIterator, Dict, Iterator, List
+from collections.abc import MutableMapping
+import asyncio
+import base64
+import hashlib
+import os
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+from youtube_transcript_api import TranscriptsDisabled
+
+
+class FakeBlob:
+    """
+    The parts of google.cloud.storage.Blob used by this repo.
+    """
+
+    def __init__(self, bucket: "FakeBucket", name: str) -> None:
+
+        self.bucket = bucket
+        self.name = name
+        self._load_metadata()
+
+    def _load_metadata(self) -> None:
+        stored = self.bucket._objects.get(self.name)
+
+        if stored is None:
+            self.generation = self.etag = self.md5_hash = None
+            self.size = None
+            return
+
+        data, generation = stored
+        self.generation = generation
+        self.etag = f"etag-{generation}"
+        self.md5_hash = base64.b64encode(hashlib.md5(data).digest()).decode()
+        self.size = len(data)
+
+    def exists(self, client: Any = None) -> bool:
+        self.bucket._request()
+        return self.name in self.bucket._objects
+
+    def upload_from_string(self, data, content_type: str = None) -> None:
+        self.bucket._request()
+        self.bucket._put(self.name, data.encode("utf-8") if isinstance(data, str) else bytes(data))
+        self._load_metadata()
+
+    def download_as_bytes(self, start: int = None, end: int = None) -> bytes:
+        self.bucket._request()
+
+        stored = self.bucket._objects.get(self.name)
+        if stored is None:
+            raise FileNotFoundError(self.name)
+
+        data = stored[0]
+        if start is not None or end is not None:
+            # inclusive byte range, like the GCS client
+            data = data[start or 0:(end + 1) if end is not None else None]
+        return data
+
+    download_as_string = download_as_bytes
+
+    def delete(self) -> None:
+        self.bucket._request()
+        with self.bucket._lock:
+            if self.bucket._objects.pop(self.name, None) is None:
+                raise FileNotFoundError(self.name)
+
+    def download_as_text(self, encoding: str = "utf-8") -> str:
+        return self.download_as_bytes().decode(encoding)
+
+
+class FakeBucket:
+    """
+    Thread-safe in-memory stand-in for google.cloud.storage.Bucket.
+    """
+
+    def __init__(self, name: str = "fake-bucket", latency: float = 0.0) -> None:
+
+        self.name = name
+        self.latency = latency
+        self.requests = 0
+        self._objects = {}
+        self._lock = threading.Lock()
+
+    def _request(self) -> None:
+        with self._lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _put(self, name: str, data: bytes) -> None:
+        with self._lock:
+            generation = self._objects[name][1] + 1 if name in self._objects else 1
+            self._objects[name] = (data, generation)
+
+    def blob(self, name: str) -> FakeBlob:
+        return FakeBlob(self, name)
+
+    def get_blob(self, name: str) -> FakeBlob:
+        self._request()
+        return FakeBlob(self, name) if name in self._objects else None
+
+    def list_blobs(self, prefix: str = "", start_offset: str = None, end_offset: str = None) -> List[FakeBlob]:
+        self._request()
+        with self._lock:
+            names = sorted(name for name in self._objects if name.startswith(prefix)
+                           and (start_offset is None or name >= start_offset)
+                           and (end_offset is None or name < end_offset))
+        return [FakeBlob(self, name) for name in names]
+
+    @property
+    def exists(self) -> bool:
+        return True
+
+
+class _DirectoryObjects(MutableMapping):
+    """
+    name -> (data, generation) mapping stored in a directory: the data under objects/, the generation under generations/.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.objects = os.path.join(directory, "objects")
+        self.generations = os.path.join(directory, "generations")
+        os.makedirs(self.objects, exist_ok=True)
+        os.makedirs(self.generations, exist_ok=True)
+
+    @staticmethod
+    def _write(path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp." + str(threading.get_ident())
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def __getitem__(self, name: str) -> tuple:
+        try:
+            with open(os.path.join(self.objects, name), "rb") as f:
+                data = f.read()
+            with open(os.path.join(self.generations, name)) as f:
+                return data, int(f.read())
+        except FileNotFoundError:
+            raise KeyError(name)
+
+    def __setitem__(self, name: str, value: tuple) -> None:
+        data, generation = value
+        self._write(os.path.join(self.objects, name), data)
+        self._write(os.path.join(self.generations, name), str(generation).encode())
+
+    def __delitem__(self, name: str) -> None:
+        try:
+            os.remove(os.path.join(self.objects, name))
+            os.remove(os.path.join(self.generations, name))
+        except FileNotFoundError:
+            raise KeyError(name)
+
+    def __contains__(self, name: object) -> bool:
+        return isinstance(name, str) and os.path.isfile(os.path.join(self.objects, name))
+
+    def __iter__(self) -> Iterator[str]:
+        for root, _, files in os.walk(self.objects):
+            for file in files:
+                if ".tmp." not in file:
+                    yield os.path.relpath(os.path.join(root, file), self.objects).replace(os.sep, "/")
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class LocalDirectoryBucket(FakeBucket):
+    """
+    FakeBucket that keeps its objects in a local directory, so they survive between runs and can be inspected.
+    """
+
+    def __init__(self, directory: str, name: str = "local-bucket", latency: float = 0.0) -> None:
+        super().__init__(name=name, latency=latency)
+        self.directory = directory
+        self._objects = _DirectoryObjects(directory)
+
+
+class FakeStorageClient:
+    """
+    Stand-in for google.cloud.storage.Client serving one FakeBucket.
+    """
+
+    def __init__(self, bucket: FakeBucket) -> None:
+        self._bucket = bucket
+
+    def bucket(self, name: str) -> FakeBucket:
+        return self._bucket
+
+    def get_bucket(self, name: str) -> FakeBucket:
+        return self._bucket
+
+    def list_blobs(self, bucket_or_name: Any, prefix: str = "", start_offset: str = None, end_offset: str = None) -> List[FakeBlob]:
+        return self._bucket.list_blobs(prefix=prefix, start_offset=start_offset, end_offset=end_offset)
+
+
+class FakeTranscriptApi:
+    """
+    Stand-in for YouTubeTranscriptApi serving transcripts from a dict of video id -> transcript.
+    Unknown video ids raise TranscriptsDisabled, like videos without captions.
+    """
+
+    def __init__(self, transcripts: Dict[str, str], latency: float = 0.0, words_per_segment: int = 12) -> None:
+
+        self.transcripts = transcripts
+        self.latency = latency
+        self.words_per_segment = words_per_segment
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def get_transcript(self, video_id: str, languages: List[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        if video_id not in self.transcripts:
+            raise TranscriptsDisabled(video_id)
+
+        words = self.transcripts[video_id].split()
+        step = self.words_per_segment
+
+        return [{"text": " ".join(words[i:i + step]), "start": float(i), "duration": float(step)}
+                for i in range(0, len(words), step)]
+
+
+class FakeSpacyEmbeddings:
+    """
+    Stand-in for LangChain's SpacyEmbeddings around any spaCy pipeline, e.g. a blank one when
+    en_core_web_sm is not installed. Pass it to EmbeddingService(embeddings=...).
+    """
+
+    def __init__(self, nlp: Any = None) -> None:
+
+        if nlp is None:
+            import spacy
+
+            nlp = spacy.blank("en")
+            nlp.add_pipe("tok2vec")
+            nlp.initialize()
+
+        self.nlp = nlp
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.nlp(text).vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+class FakeHashingEmbeddings:
+    """
+    Stand-in for LangChain embeddings that hashes lowercased words into `dimensions` buckets, so texts
+    sharing most of their words get similar vectors, as paraphrased questions do with a real model.
+    """
+
+    def __init__(self, dimensions: int = 96) -> None:
+        self.dimensions = dimensions
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            vector[zlib.crc32(word.encode("utf-8")) % self.dimensions] += 1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+class FakeLLM:
+    """
+    Local stub for the LangChain LLM behind app.llm.LLM. Answers after `latency` seconds
+    with a summary of the prompt, and counts its calls.
+    """
+
+    def __init__(self, latency: float = 0.0) -> None:
+
+        self.latency = latency
+        self.calls = 0
+
+    def predict(self, prompt: str) -> str:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        question = prompt.rsplit("Question:", 1)[-1].split("Answer:", 1)[0].strip()
+        return f"stub answer to {question!r} from {prompt.count('[')} excerpts"
+
+
+class FakeRecord:
+
+    def __init__(self, values: Dict[str, Any]) -> None:
+        self._values = values
+
+    def data(self) -> Dict[str, Any]:
+        return dict(self._values)
+
+    def __getitem__(self, key: str) -> Any:
+        return self._values[key]
+
+
+class FakeResult:
+
+    def __init__(self, records: List[Dict[str, Any]]) -> None:
+        self._records = records
+
+    def __iter__(self) -> Iterator[FakeRecord]:
+        return (FakeRecord(record) for record in self._records)
+
+    def data(self) -> List[Dict[str, Any]]:
+        return [dict(record) for record in self._records]
+
+    def single(self) -> FakeRecord:
+        return FakeRecord(self._records[0]) if self._records else None
+
+    def consume(self) -> None:
+        pass
+
+
+class FakeGraph:
+    """
+    In-memory graph of Sources, Parents and Children that answers the queries of n4j.communicator
+    by recognizing them, rather than by interpreting Cypher.
+    Vector searches are exact cosine searches scored like the Neo4j vector index.
+    Queries that are not recognized return no records and are kept in `unhandled`.
+    """
+
+    def __init__(self) -> None:
+
+        self.sources = {}
+        self.parents = {}
+        self.children = {}
+        self.queries = {}
+        self.unhandled = []
+        self._lock = threading.RLock()
+        self._matrix = None
+        self._matrix_ids = None
+
+    def run(self, query: str, parameters: Dict[str, Any]) -> List[Dict[str, Any]]:
+
+        for marker, handler in ((" $urls AS", self._delete_sources),
+                                (" $data AS", self._write_rows),
+                                (" $sources AS", self._write_sources),
+                                (" $parents AS", self._write_parents),
+                                (" $children AS", self._write_children),
+                                ("$embeddings", self._vector_search_many),
+                                ("AS matchingSources", self._filter_selectivity),
+                                ("vector.similarity.cosine", self._exact_filtered_search),
+                                ("$fetch", self._overfetch_filtered_search),
+                                ("$questionEmbedding", self._vector_search),
+                                (" $indexes AS", self._parent_texts),
+                                ("child.embedding AS embedding", self._child_embeddings),
+                                ("CREATE ", self._schema)):
+            if marker in query:
+                with self._lock:
+                    self.queries[handler.__name__] = self.queries.get(handler.__name__, 0) + 1
+                    return handler(parameters)
+
+        with self._lock:
+            self.unhandled.append(query)
+        return []
+
+    @staticmethod
+    def _schema(parameters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return []
+
+    def _write_rows(self, parameters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        for row in parameters['data']:
+            self._write_sources({"sources": [{"url": row['url'], "title": row.get('title'), "playlist_id": row.get('playlist_id'),
+                                              "video_id": row.get('video_id'), "publish_date": row.get('publish_date')}]})
+            self._write_parents({"parents": [{"index": row['parent_index'], "text": row.get('parent_transcript'), "url": row['url']}]})
+            self._write_children({"children": [{"index": row['child_index'], "text": row['transcript'],
+                                                "embedding": row['embedding'], "parent_index": row['parent_index']}]})
+        return []
+
+    def _delete_sources(self, parameters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        for url in parameters['urls']:
+            parents = {index for index, parent in self.parents.items() if parent['url'] == url}
+
+            for index, child in list(self.children.items()):
+                child_parents = set(child.get('parent_indexes', [child['parent_index']]))
+                if not child_parents & parents:
+                    continue
+                if child_parents <= parents:
+                    del self.children[index]
+                else:
+                    # the child stays with its parents in other sources
+                    remaining = [parent for parent in child.get('parent_indexes', []) if parent not in parents]
+                    child.update({"parent_index": remaining[0], "parent_indexes": remaining})
+
+            for index in parents:
+                del self.parents[index]
+        self._matrix = None
+        return []
+
+    def _write_sources(self, parameters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        for source in parameters['sources']:
+            self.sources[source['url']] = dict(source)
+        return []
+
+    def _write_parents(self, parameters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        for parent in parameters['parents']:
+            if parent['url'] in self.sources:
+                self.parents[parent['index']] = dict(parent)
+        return []
+
+    def _write_children(self, parameters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        for child in parameters['children']:
+            if child['parent_index'] in self.parents:
+                existing = self.children.get(child['index'])
+                if existing is not None and child.get('embedding') is None:
+                    # a child collapsed onto an existing one only adds its parent
+                    existing.setdefault('parent_indexes', [existing['parent_index']])
+                    if child['parent_index'] not in existing['parent_indexes']:
+                        existing['parent_indexes'].append(child['parent_index'])
+                    continue
+                self.children[child['index']] = dict(child)
+        self._matrix = None
+        return []
+
+    def _index(self):
+        if self._matrix is None:
+            self._matrix_ids = list(self.children)
+            matrix = np.array([self.children[index]['embedding'] for index in self._matrix_ids], dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True) if len(matrix) else np.ones((0, 1), dtype=np.float32)
+            norms[norms == 0] = 1
+            self._matrix = matrix / norms
+        return self._matrix, self._matrix_ids
+
+    def _record(self, child_index: str, score: float) -> Dict[str, Any]:
+        child = self.children[child_index]
+        parent = self.parents.get(child['parent_index'], {})
+        source = self.sources.get(parent.get('url'), {})
+
+        return {"index": child_index, "text": child['text'], "score": score,
+                "parent_index": parent.get('index'), "parent_text": parent.get('text'),
+                "url": source.get('url'), "title": source.get('title'), "video_id": source.get('video_id'),
+                "playlist_id": source.get('playlist_id'), "publish_date": source.get('publish_date')}
+
+    def _top_k(self, embedding: List[float], k: int) -> List[tuple]:
+        matrix, ids = self._index()
+        if len(ids) == 0:
+            return []
+
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+        similarities = matrix @ query
+
+        k = min(int(k), len(ids))
+        best = np.argpartition(-similarities, k - 1)[:k]
+        best = best[np.argsort(-similarities[best])]
+        return [(ids[i], float((1 + similarities[i]) / 2)) for i in best]
+
+    def _vector_search_many(self, parameters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [{"question": question, **self._record(index, score)}
+                for question, embedding in enumerate(parameters['embeddings'])
+                for index, score in self._top_k(embedding, parameters['k'])]
+
+    def _vector_search(self, parameters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [{key: record[key] for key in ("url", "text", "index", "score")}
+                for record in (self._record(index, score) for index, score in self._top_k(parameters['questionEmbedding'], parameters['k']))]
+
+    @staticmethod
+    def _source_matches(source: Dict[str, Any], parameters: Dict[str, Any]) -> bool:
+        if 'playlistId' in parameters and source.get('playlist_id') != parameters['playlistId']:
+            return False
+        if 'publishedAfter' in parameters and not (source.get('publish_date') or "") >= parameters['publishedAfter']:
+            return False
+        if 'publishedBefore' in parameters and not (source.get('publish_date') or "") <= parameters['publishedBefore']:
+            return False
+        return True
+
+    def _child_matches(self, child_index: str, parameters: Dict[str, Any]) -> bool:
+        parent = self.parents.get(self.children[child_index]['parent_index'], {})
+        return self._source_matches(self.sources.get(parent.get('url'), {}), parameters)
+
+    def _filter_selectivity(self, parameters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if not self.children:
+            return []
+        return [{"matchingSources": sum(self._source_matches(source, parameters) for source in self.sources.values()),
+                 "totalSources": len(self.sources),
+                 "totalChildren": len(self.children)}]
+
+    def _overfetch_filtered_search(self, parameters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        candidates = self._top_k(parameters['questionEmbedding'], parameters['fetch'])
+        return [self._record(index, score) for index, score in candidates
+                if self._child_matches(index, parameters)][:int(parameters['k'])]
+
+    def _exact_filtered_search(self, parameters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        matrix, ids = self._index()
+        urls = {url for url, source in self.sources.items() if self._source_matches(source, parameters)}
+        rows = [row for row, index in enumerate(ids)
+                if self.parents.get(self.children[index]['parent_index'], {}).get('url') in urls]
+        if not rows:
+            return []
+
+        query = np.asarray(parameters['questionEmbedding'], dtype=np.float32)
+        similarities = matrix[rows] @ (query / (np.linalg.norm(query) or 1))
+        k = min(int(parameters['k']), len(rows))
+        best = np.argpartition(-similarities, k - 1)[:k]
+        best = best[np.argsort(-similarities[best])]
+        return [self._record(ids[rows[i]], float((1 + similarities[i]) / 2)) for i in best]
+
+    def _parent_texts(self, parameters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [{"index": index, "text": self.parents[index]['text']} for index in parameters['indexes'] if index in self.parents]
+
+    def _child_embeddings(self, parameters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        records = []
+        for index, child in self.children.items():
+            record = self._record(index, None)
+            record.pop('score')
+            record.pop('parent_text')
+            record['embedding'] = child['embedding']
+            records.append(record)
+        return records
+
+
+class FakeTransaction:
+
+    def __init__(self, driver: "FakeDriver") -> None:
+        self._driver = driver
+
+    def run(self, query: str, parameters: Dict[str, Any] = None, **kwparameters: Any) -> FakeResult:
+        return FakeResult(self._driver.graph.run(query, {**(parameters or {}), **kwparameters}))
+
+
+class FakeSession:
+
+    def __init__(self, driver: "FakeDriver", **config: Any) -> None:
+        self._driver = driver
+        self.config = config
+
+    def __enter__(self) -> "FakeSession":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _round_trip(self) -> None:
+        self._driver.transactions += 1
+        if self._driver.latency:
+            time.sleep(self._driver.latency)
+
+    def run(self, query: str, parameters: Dict[str, Any] = None, **kwparameters: Any) -> FakeResult:
+        with self._driver.pool:
+            self._round_trip()
+            return FakeTransaction(self._driver).run(query, parameters, **kwparameters)
+
+    def execute_read(self, transaction_function, *args: Any, **kwargs: Any) -> Any:
+        with self._driver.pool:
+            self._round_trip()
+            return transaction_function(FakeTransaction(self._driver), *args, **kwargs)
+
+    execute_write = execute_read
+    read_transaction = execute_read
+    write_transaction = execute_read
+
+    def close(self) -> None:
+        pass
+
+
+class FakeDriver:
+    """
+    Stand-in for neo4j.Driver backed by a FakeGraph. `latency` is added to every transaction,
+    and at most `max_connection_pool_size` transactions run at once.
+    """
+
+    def __init__(self, latency: float = 0.0, graph: FakeGraph = None, max_connection_pool_size: int = 100) -> None:
+
+        self.latency = latency
+        self.graph = FakeGraph() if graph is None else graph
+        self.pool = threading.BoundedSemaphore(max_connection_pool_size)
+        self.transactions = 0
+
+    def session(self, **config: Any) -> FakeSession:
+        return FakeSession(self, **config)
+
+    def verify_connectivity(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class FakeAsyncResult:
+
+    def __init__(self, records: List[Dict[str, Any]]) -> None:
+        self._records = records
+
+    async def __aiter__(self) -> AsyncIterator[FakeRecord]:
+        for record in self._records:
+            yield FakeRecord(record)
+
+    async def data(self) -> List[Dict[str, Any]]:
+        return [dict(record) for record in self._records]
+
+    async def consume(self) -> None:
+        pass
+
+
+class FakeAsyncTransaction:
+
+    def __init__(self, driver: "FakeAsyncDriver") -> None:
+        self._driver = driver
+
+    async def run(self, query: str, parameters: Dict[str, Any] = None, **kwparameters: Any) -> FakeAsyncResult:
+        return FakeAsyncResult(self._driver.graph.run(query, {**(parameters or {}), **kwparameters}))
+
+
+class FakeAsyncSession:
+
+    def __init__(self, driver: "FakeAsyncDriver", **config: Any) -> None:
+        self._driver = driver
+        self.config = config
+
+    async def __aenter__(self) -> "FakeAsyncSession":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    async def _round_trip(self) -> None:
+        self._driver.transactions += 1
+        if self._driver.latency:
+            await asyncio.sleep(self._driver.latency)
+
+    async def run(self, query: str, parameters: Dict[str, Any] = None, **kwparameters: Any) -> FakeAsyncResult:
+        async with self._driver.pool:
+            await self._round_trip()
+            return await FakeAsyncTransaction(self._driver).run(query, parameters, **kwparameters)
+
+    async def execute_read(self, transaction_function, *args: Any, **kwargs: Any) -> Any:
+        async with self._driver.pool:
+            await self._round_trip()
+            return await transaction_function(FakeAsyncTransaction(self._driver), *args, **kwargs)
+
+    execute_write = execute_read
+
+    async def close(self) -> None:
+        pass
+
+
+class FakeAsyncDriver:
+    """
+    Stand-in for neo4j.AsyncDriver, see FakeDriver. Create it inside the running event loop.
+    """
+
+    def __init__(self, latency: float = 0.0, graph: FakeGraph = None, max_connection_pool_size: int = 100) -> None:
+
+        self.latency = latency
+        self.graph = FakeGraph() if graph is None else graph
+        self.pool = asyncio.BoundedSemaphore(max_connection_pool_size)
+        self.transactions = 0
+
+    def session(self, **config: Any) -> FakeAsyncSession:
+        return FakeAsyncSession(self, **config)
+
+    async def verify_connectivity(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,143 @@
+"""
+Compare the plans of GraphReader.retrieve_filtered on a synthetic graph of several playlists, for selective and broad filters:
+    postfilter  the global top k * overfetch factor, filtered in Python (what callers did before)
+    overfetch   over-fetch from the vector index with the filter pushed into the query
+    exact       filter-first exact scan of the matching Children
+    auto        the plan GraphReader chooses from the estimated selectivity
+Recall is measured against an exact filtered search over the synthetic rows.
+
+By default the graph is the in-memory FakeGraph, which adds `--latency` seconds per transaction; its latencies show
+the round trips and the work each plan hands to the database, not Neo4j's. With --live the searches run against the
+database configured by NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD and NEO4J_DATABASE, and --load writes the synthetic
+playlists there first (with constraints and indexes).
+
+Run from src/main:
+    python -m benchmarks.filtered_search_benchmark --playlists 20 --videos 25 --questions 50
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from benchmarks.corpus import synthetic_rows
+from benchmarks.fakes import FakeDriver
+from n4j import drivers
+from n4j.communicator import GraphReader, GraphWriter
+from utils.metrics import LatencyRecorder
+from utils.utils import batch_method
+
+PLANS = ["postfilter", "overfetch", "exact", "auto"]
+
+
+def build_rows(n_playlists: int, n_videos: int, dimensions: int):
+    rows = []
+    for p in range(n_playlists):
+        rows.extend(synthetic_rows(n_videos, dimensions=dimensions, playlist_id=f"playlist-{p}", seed=p))
+    return rows
+
+
+def row_matches(row, playlist_id=None, published_after=None, published_before=None) -> bool:
+    return ((playlist_id is None or row['playlist_id'] == playlist_id)
+            and (published_after is None or row['publish_date'] >= published_after)
+            and (published_before is None or row['publish_date'] <= published_before))
+
+
+def ground_truth(matrix: np.ndarray, rows, question: np.ndarray, k: int, **search_filter):
+    selected = [i for i, row in enumerate(rows) if row_matches(row, **search_filter)]
+    if not selected:
+        return set()
+    similarities = matrix[selected] @ (question / np.linalg.norm(question))
+    best = np.argsort(-similarities)[:k]
+    return {rows[selected[i]]['child_index'] for i in best}
+
+
+def postfilter(reader: GraphReader, question, k: int, **search_filter):
+    fetch = int(k * reader.overfetch_factor)
+    return [record for record in reader.retrieve(question, k=fetch) if row_matches(record, **search_filter)][:k]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--playlists", type=int, default=20)
+    parser.add_argument("--videos", type=int, default=25, help="videos per playlist")
+    parser.add_argument("--dimensions", type=int, default=96)
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--exact-scan-limit", type=int, default=2_000, help="GraphReader.exact_scan_limit, scaled to the synthetic graph")
+    parser.add_argument("--overfetch-factor", type=float, default=2.0)
+    parser.add_argument("--max-candidates", type=int, default=5_000)
+    parser.add_argument("--latency", type=float, default=0.002, help="fake driver: seconds per transaction")
+    parser.add_argument("--live", action="store_true")
+    parser.add_argument("--load", action="store_true", help="with --live, load the synthetic playlists first")
+    args = parser.parse_args()
+
+    rows = build_rows(args.playlists, args.videos, args.dimensions)
+    matrix = np.array([row['embedding'] for row in rows], dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+
+    if args.live:
+        driver = drivers.init_driver(os.environ.get("NEO4J_URI"), os.environ.get("NEO4J_USERNAME"), os.environ.get("NEO4J_PASSWORD"))
+    else:
+        driver = FakeDriver(latency=args.latency)
+
+    if not args.live or args.load:
+        writer = GraphWriter(driver=driver)
+        writer.create_constraints()
+        writer.create_indexes(args.dimensions)
+        for batch in batch_method(rows, 1_000):
+            writer.load_nodes_normalized(batch)
+
+    reader = GraphReader(driver=driver)
+    reader.exact_scan_limit = args.exact_scan_limit
+    reader.overfetch_factor = args.overfetch_factor
+    reader.max_candidates = args.max_candidates
+
+    filters = {
+        "selective: playlist + year": {"playlist_id": "playlist-1", "published_after": "2012-01-01", "published_before": "2012-12-31"},
+        "selective: one playlist": {"playlist_id": "playlist-0"},
+        "broad: 2011 to 2022": {"published_after": "2011-01-01", "published_before": "2022-12-31"},
+        "broad: since 2011": {"published_after": "2011-01-01"},
+    }
+
+    rng = np.random.default_rng(0)
+    questions = rng.uniform(-1, 1, size=(args.questions, args.dimensions)).astype(np.float32)
+
+    # warm up the driver and, for the fake graph, its index
+    reader.retrieve(questions[0].tolist(), k=args.k)
+
+    print(f"{'live' if args.live else 'fake'} graph | {args.playlists} playlists | {len(rows)} children | "
+          f"{args.questions} questions | k {args.k}")
+
+    for name, search_filter in filters.items():
+        selectivity, matching_children = reader.estimate_filter(**search_filter)
+        auto_plan, fetch = reader.plan_filtered_search(args.k, selectivity, matching_children)
+        print(f"\n{name} | selectivity {selectivity:.3f} | ~{matching_children} children | auto: {auto_plan}"
+              + (f" (fetch {fetch})" if fetch else ""))
+
+        truths = [ground_truth(matrix, rows, question, args.k, **search_filter) for question in questions]
+
+        for plan in PLANS:
+            latency = LatencyRecorder(max_samples=len(questions))
+            recall = []
+
+            for question, truth in zip(questions, truths):
+                start = time.perf_counter()
+                if plan == "postfilter":
+                    records = postfilter(reader, question.tolist(), args.k, **search_filter)
+                else:
+                    records = reader.retrieve_filtered(question.tolist(), k=args.k, plan=plan, **search_filter)
+                latency.record(time.perf_counter() - start)
+
+                if truth:
+                    recall.append(len(truth & {record['index'] for record in records}) / len(truth))
+
+            summary = latency.summary()
+            print(f"    {plan:10s} recall {np.mean(recall) if recall else float('nan'):6.3f} | "
+                  f"p50 {summary['p50'] * 1000:8.2f} ms | p99 {summary['p99'] * 1000:8.2f} ms")
+
+    driver.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Compare loading several playlists one after the other with tools.pipeline.stream_playlist_to_graph
+against loading them together with tools.ingest.IngestionScheduler.
+
+The transcripts of every playlist are scraped into a FakeBucket, then loaded into a FakeGraph behind a FakeDriver,
+each run into a new graph. Storage and neo4j latencies simulate the network, and embeddings come from
+FakeHashingEmbeddings, so no cloud service or spaCy model is needed.
+Reports the wall time, rows per second and children in the graph per run, and the per stage peak of the scheduler.
+
+Run from src/main:
+    python -m benchmarks.ingest_benchmark --playlists 4 --videos 50 --storage-latency 0.02 --neo4j-latency 0.01
+"""
+from typing import List
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.corpus import synthetic_channel
+from benchmarks.fakes import FakeBucket, FakeDriver, FakeHashingEmbeddings, FakeTranscriptApi
+from n4j.communicator import GraphWriter
+from tools.chunker import Chunker
+from tools.ingest import IngestionScheduler
+from tools.pipeline import stream_playlist_to_graph
+from tools.scraper import Scraper
+from utils.normalization import TextNormalizer
+
+
+class HashingEmbeddingService:
+    """
+    Stands in for EmbeddingService, with the vectors of FakeHashingEmbeddings.
+    """
+
+    def __init__(self, dimensions: int = 96) -> None:
+        self.embeddings = FakeHashingEmbeddings(dimensions)
+
+    def get_document_embeddings(self, chunk_texts: List[str], batch_size: int = 256, n_process: int = 1) -> np.ndarray:
+        return np.array(self.embeddings.embed_documents(chunk_texts), dtype=np.float32).reshape(len(chunk_texts), -1)
+
+
+def scrape_playlists(bucket: FakeBucket, n_playlists: int, n_videos: int, n_words: int) -> dict:
+    playlists = {}
+
+    for p in range(n_playlists):
+        title = f"synthetic {p}"
+        videos, transcripts = synthetic_channel(n_videos, n_words=n_words, seed=p)
+        bucket.blob("youtube/"+title+".csv").upload_from_string(pd.DataFrame.from_dict(videos).to_csv(), "text/csv")
+        Scraper(channel_id="synthetic-channel", playlist_id=f"playlist-{p}", bucket=bucket,
+                transcript_api=FakeTranscriptApi(transcripts)).create_and_upload_transcripts(transcripts_folder=title,
+                                                                                             video_info_file_name=title,
+                                                                                             max_workers=8)
+        playlists[title] = f"playlist-{p}"
+
+    print()
+    return playlists
+
+
+def report(name: str, seconds: float, rows: int, driver: FakeDriver) -> None:
+    print(f"{name:10s} | {seconds:8.2f} | {rows:8d} | {rows / seconds:10.1f} | {len(driver.graph.children):8d}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--playlists", type=int, default=4)
+    parser.add_argument("--videos", type=int, default=50, help="videos per playlist")
+    parser.add_argument("--words", type=int, default=2500, help="words per transcript")
+    parser.add_argument("--io-workers", type=int, default=8)
+    parser.add_argument("--split-processes", type=int, default=2)
+    parser.add_argument("--neo4j-sessions", type=int, default=4)
+    parser.add_argument("--max-playlists", type=int, default=4)
+    parser.add_argument("--embed-batch-size", type=int, default=256)
+    parser.add_argument("--load-batch-size", type=int, default=500)
+    parser.add_argument("--storage-latency", type=float, default=0.02, help="seconds added to every storage request")
+    parser.add_argument("--neo4j-latency", type=float, default=0.01, help="seconds added to every transaction")
+    args = parser.parse_args()
+
+    bucket = FakeBucket()
+    playlists = scrape_playlists(bucket, args.playlists, args.videos, args.words)
+    bucket.latency = args.storage_latency
+    embedding_service = HashingEmbeddingService()
+
+    print(f"{args.playlists} playlists | {args.videos} videos each")
+    print(f"{'run':10s} | {'seconds':>8s} | {'rows':>8s} | {'rows/s':>10s} | {'children':>8s}")
+
+    driver = FakeDriver(latency=args.neo4j_latency)
+    writer = GraphWriter(driver=driver)
+    start = time.perf_counter()
+    rows = 0
+    for title, playlist_id in playlists.items():
+        rows += stream_playlist_to_graph(Chunker(bucket=bucket, max_workers=args.io_workers, normalizer=TextNormalizer()),
+                                         embedding_service, writer, playlist_title=title, playlist_id=playlist_id,
+                                         embed_batch_size=args.embed_batch_size, load_batch_size=args.load_batch_size)['rows_loaded']
+    report("serial", time.perf_counter() - start, rows, driver)
+
+    driver = FakeDriver(latency=args.neo4j_latency)
+    scheduler = IngestionScheduler(bucket=bucket, embedding_service=embedding_service, writer=GraphWriter(driver=driver),
+                                   io_workers=args.io_workers, split_processes=args.split_processes,
+                                   neo4j_sessions=args.neo4j_sessions, max_playlists=args.max_playlists,
+                                   embed_batch_size=args.embed_batch_size, load_batch_size=args.load_batch_size)
+    start = time.perf_counter()
+    summaries = scheduler.run(playlists)
+    seconds = time.perf_counter() - start
+    report("scheduled", seconds, sum(summary.get('rows_loaded', 0) for summary in summaries.values()), driver)
+
+    for name, stage in scheduler.stages.items():
+        print(f"{name:10s} | tasks {stage.submitted:6d} | failed {stage.failed:3d} | blocked {stage.blocked_seconds:7.2f} s | limit {stage.limit}")
+
+
+if __name__ == "__main__":
+    main()
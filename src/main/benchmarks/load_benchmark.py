@@ -0,0 +1,62 @@
+"""
+Compare the row-per-child load_nodes payload with the normalized load_nodes_normalized payload.
+
+Payload sizes are measured with the driver's Bolt (PackStream) encoder.
+With --live, both write paths are also timed against the database configured by
+NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD and NEO4J_DATABASE. This writes synthetic nodes.
+
+Run from src/main:
+    python -m benchmarks.load_benchmark --videos 50 --batch-size 500 [--live]
+"""
+import argparse
+import io
+import time
+
+from neo4j._codec.packstream.v1 import Packer
+
+from benchmarks.corpus import synthetic_rows
+from n4j.communicator import GraphWriter
+from utils.utils import batch_method
+
+
+def payload_bytes(value) -> int:
+    stream = io.BytesIO()
+    Packer(stream).pack(value)
+    return len(stream.getvalue())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--videos", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--live", action="store_true")
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.videos)
+    batches = list(batch_method(rows, args.batch_size))
+
+    row_bytes = sum(payload_bytes({"data": batch}) for batch in batches)
+    normalized_bytes = 0
+    for batch in batches:
+        sources, parents, children = GraphWriter.normalize_rows(batch)
+        normalized_bytes += payload_bytes({"sources": sources}) + payload_bytes({"parents": parents}) + payload_bytes({"children": children})
+
+    print(f"rows:                 {len(rows)} in {len(batches)} batches")
+    print(f"row payload:          {row_bytes / 1e6:8.2f} MB")
+    print(f"normalized payload:   {normalized_bytes / 1e6:8.2f} MB ({row_bytes / normalized_bytes:.2f}x smaller)")
+
+    if not args.live:
+        return
+
+    writer = GraphWriter()
+
+    for name, load in (("load_nodes", writer.load_nodes), ("load_nodes_normalized", writer.load_nodes_normalized)):
+        start = time.perf_counter()
+        for batch in batches:
+            load(data=batch)
+        elapsed = time.perf_counter() - start
+        print(f"{name + ':':22}{elapsed:8.2f} s ({len(rows) / elapsed:.0f} rows/sec)")
+
+
+if __name__ == "__main__":
+    main()
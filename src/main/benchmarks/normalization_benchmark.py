@@ -0,0 +1,88 @@
+"""
+Compare the old per-child str.replace filler removal with TextNormalizer run once per transcript,
+and TextNormalizer's token filter with a single word-boundary regex doing the same filler removal.
+
+Run from src/main:
+    python -m benchmarks.normalization_benchmark --transcripts 500 --words 3000
+"""
+import argparse
+import re
+import time
+
+from benchmarks.corpus import synthetic_transcript
+from utils.normalization import DEFAULT_FILLER_WORDS, TextNormalizer
+
+# filler words with the punctuation attached to them, as TextNormalizer drops them
+FILLER_WORDS_REGEX = re.compile(r"(?<!\S)[^\w\s]*(?:" + "|".join(DEFAULT_FILLER_WORDS) + r")[^\w\s]*(?!\S)", re.IGNORECASE)
+WHITESPACE = re.compile(r"\s+")
+
+
+def replace_filler_words(text: str) -> str:
+    """
+    The previous implementation of utils.remove_filler_words.
+    """
+
+    for word in ["um", "ah", "uh"]:
+        text = text.replace(word, "")
+    return text.strip()
+
+
+def regex_filler_words(text: str) -> str:
+    """
+    The word-boundary regex alternative to TextNormalizer's token filter.
+    """
+
+    return WHITESPACE.sub(" ", FILLER_WORDS_REGEX.sub(" ", text)).strip()
+
+
+def children(transcript: str, size: int = 140, overlap: int = 35):
+    """
+    Approximates the overlapping child chunks that the old cleaning ran on.
+    """
+
+    return [transcript[i:i + size] for i in range(0, len(transcript), size - overlap)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transcripts", type=int, default=500)
+    parser.add_argument("--words", type=int, default=3000)
+    args = parser.parse_args()
+
+    corpus = [synthetic_transcript(args.words, seed=i) for i in range(args.transcripts)]
+    megabytes = sum(len(t) for t in corpus) / 1e6
+    normalizer = TextNormalizer()
+    filler_words_only = TextNormalizer(remove_caption_artifacts=False, unescape_html=False)
+
+    start = time.perf_counter()
+    for transcript in corpus:
+        for child in children(transcript):
+            replace_filler_words(child)
+    per_child = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for transcript in corpus:
+        normalizer(transcript)
+    per_transcript = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for transcript in corpus:
+        filler_words_only(transcript)
+    token_filter = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for transcript in corpus:
+        regex_filler_words(transcript)
+    regex = time.perf_counter() - start
+
+    assert all(regex_filler_words(transcript) == filler_words_only(transcript) for transcript in corpus[:20])
+
+    print(f"corpus:                         {megabytes:.1f} MB in {len(corpus)} transcripts")
+    print(f"str.replace per child:          {megabytes / per_child:8.1f} MB/s ({per_child:.2f} s)")
+    print(f"TextNormalizer per transcript:  {megabytes / per_transcript:8.1f} MB/s ({per_transcript:.2f} s)")
+    print(f"filler words only, token filter:{megabytes / token_filter:8.1f} MB/s ({token_filter:.2f} s)")
+    print(f"filler words only, regex:       {megabytes / regex:8.1f} MB/s ({regex:.2f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Compare the storage requests and wall time of the two transcript layouts, see tools/packed_transcripts.py:
+    blobs   one JSON blob per video, listed and downloaded one by one
+    packed  compressed JSONL shards with an offset index, read whole or by range
+for uploading a playlist with Scraper, reading all of it with Chunker, and reading a few videos by id.
+Also migrates the blobs playlist to the packed layout and checks both read back the same transcripts.
+
+The bucket is a FakeBucket with `--latency` per request, or a LocalDirectoryBucket with `--directory`.
+
+Run from src/main:
+    python -m benchmarks.packed_transcripts_benchmark --videos 500 --latency 0.01
+"""
+import argparse
+import time
+
+from benchmarks.corpus import synthetic_channel
+from benchmarks.fakes import FakeBucket, FakeTranscriptApi, LocalDirectoryBucket
+from tools.chunker import Chunker
+from tools.packed_transcripts import BLOBS_LAYOUT, PACKED_LAYOUT, migrate_playlist
+from tools.scraper import Scraper
+
+
+def measure(bucket: FakeBucket, function):
+    requests = bucket.requests
+    start = time.perf_counter()
+    result = function()
+    return result, bucket.requests - requests, time.perf_counter() - start
+
+
+def read_playlist(bucket: FakeBucket, layout: str, playlist_title: str, id_list=None):
+    chunker = Chunker(bucket=bucket, transcript_layout=layout)
+    docs = chunker._iter_youtube_transcripts_as_langchain_docs(playlist_title=playlist_title, id_list=id_list)
+    return sorted((doc.metadata['video_id'], doc.page_content) for doc in docs)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--videos", type=int, default=500)
+    parser.add_argument("--words", type=int, default=1_500)
+    parser.add_argument("--shard-size", type=int, default=500)
+    parser.add_argument("--by-id", type=int, default=5, help="videos read by id")
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds per storage request")
+    parser.add_argument("--directory", help="keep the objects in this directory instead of memory")
+    args = parser.parse_args()
+
+    bucket = LocalDirectoryBucket(args.directory, latency=args.latency) if args.directory else FakeBucket(latency=args.latency)
+
+    videos, transcripts = synthetic_channel(args.videos, n_words=args.words, unavailable=0.0)
+    api = FakeTranscriptApi(transcripts)
+    ids = [video['id'] for video in videos[::max(1, len(videos) // args.by_id)]][:args.by_id]
+
+    print(f"{len(videos)} videos of {args.words} words | {args.latency * 1000:.0f} ms per request | "
+          f"{'directory ' + args.directory if args.directory else 'in memory'}")
+    print(f"{'layout':8s} | {'step':8s} | {'requests':>8s} | {'seconds':>8s}")
+
+    results = {}
+    for layout in (BLOBS_LAYOUT, PACKED_LAYOUT):
+        scraper = Scraper(channel_id="channel", playlist_id="playlist", bucket=bucket, transcript_api=api,
+                          transcript_layout=layout)
+        steps = [("upload", lambda: scraper._create_and_upload(videos, transcripts_folder=layout)),
+                 ("read all", lambda: read_playlist(bucket, layout, layout)),
+                 ("read ids", lambda: read_playlist(bucket, layout, layout, id_list=ids))]
+
+        for step, function in steps:
+            result, requests, seconds = measure(bucket, function)
+            results[(layout, step)] = result
+            print(f"{layout:8s} | {step:8s} | {requests:8d} | {seconds:8.2f}")
+
+    summary, requests, seconds = measure(bucket, lambda: migrate_playlist(bucket, BLOBS_LAYOUT, shard_size=args.shard_size))
+    print(f"migrate  | {summary} | {requests} requests | {seconds:.2f} s")
+
+    migrated, requests, seconds = measure(bucket, lambda: read_playlist(bucket, PACKED_LAYOUT, BLOBS_LAYOUT))
+    print(f"migrated | read all | {requests:8d} | {seconds:8.2f}")
+    print("same transcripts in both layouts:", results[(BLOBS_LAYOUT, "read all")] == results[(PACKED_LAYOUT, "read all")] == migrated)
+
+
+if __name__ == "__main__":
+    main()
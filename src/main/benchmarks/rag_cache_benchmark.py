@@ -0,0 +1,124 @@
+"""
+Measure the AnswerCache of RAGPipeline on a stream of repeated questions: a Zipf distribution over question
+templates, each asked in several phrasings. Some phrasings only differ in case and punctuation (exact hits after
+normalization), others reword the question (semantic hits if within the similarity threshold).
+A semantic hit on a different template is counted as wrong.
+Runs the pipeline without and with the cache, then loads new nodes for the most asked-about Source to show invalidation.
+The questions are asked without a filter, so any Source can change their answers and that load drops every entry.
+
+Everything runs locally: FakeGraph behind FakeDriver, FakeHashingEmbeddings and the FakeLLM stub with `--llm-latency`.
+
+Run from src/main:
+    python -m benchmarks.rag_cache_benchmark --questions 1000 --templates 100 --threshold 0.85
+"""
+from typing import Tuple
+import argparse
+import random
+import time
+
+from app.app import RAGPipeline
+from app.llm import LLM
+from benchmarks.corpus import VOCABULARY, synthetic_rows
+from benchmarks.fakes import FakeDriver, FakeHashingEmbeddings, FakeLLM
+from n4j.communicator import GraphReader, GraphWriter
+from tools.answer_cache import AnswerCache
+from tools.embedding import EmbeddingService
+from utils.metrics import LatencyRecorder
+
+PHRASINGS = [
+    "What did Fantano think of {album}?",
+    "what did fantano think of {album}",
+    "WHAT DID FANTANO THINK OF {album}!",
+    "What did Fantano think about {album}?",
+    "What did Anthony Fantano think of {album}?",
+]
+
+
+def question_stream(n_questions: int, n_templates: int, zipf: float, seed: int = 0):
+    """
+    (album, question) pairs, with three word album titles.
+    """
+
+    rng = random.Random(seed)
+    albums = [" ".join(rng.sample(VOCABULARY, 3)) for _ in range(n_templates)]
+    weights = [1 / (rank + 1) ** zipf for rank in range(n_templates)]
+    chosen = rng.choices(albums, weights=weights, k=n_questions)
+    return [(album, rng.choice(PHRASINGS).format(album=album)) for album in chosen]
+
+
+def run(pipeline: RAGPipeline, questions) -> Tuple[LatencyRecorder, int]:
+    latency = LatencyRecorder(max_samples=len(questions))
+    wrong = 0
+
+    for album, question in questions:
+        start = time.perf_counter()
+        result = pipeline.answer(question)
+        latency.record(time.perf_counter() - start)
+
+        if result['cached'] == "semantic" and album.lower() not in result['cached_question'].lower():
+            wrong += 1
+
+    return latency, wrong
+
+
+def report(name: str, latency: LatencyRecorder, wrong: int, seconds: float, llm: FakeLLM) -> None:
+    summary = latency.summary()
+    print(f"{name:10s} {seconds:8.2f} s | p50 {summary['p50'] * 1000:8.2f} ms | p99 {summary['p99'] * 1000:8.2f} ms | "
+          f"llm calls {llm.calls} | wrong semantic hits {wrong}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=1_000)
+    parser.add_argument("--templates", type=int, default=100)
+    parser.add_argument("--zipf", type=float, default=1.1)
+    parser.add_argument("--videos", type=int, default=100)
+    parser.add_argument("--dimensions", type=int, default=96)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--max-entries", type=int, default=1_000)
+    parser.add_argument("--ttl", type=float, default=3_600.0)
+    parser.add_argument("--threshold", type=float, default=0.85, help="semantic similarity threshold")
+    parser.add_argument("--db-latency", type=float, default=0.005, help="fake driver: seconds per transaction")
+    parser.add_argument("--llm-latency", type=float, default=0.02, help="stub model: seconds per answer")
+    args = parser.parse_args()
+
+    driver = FakeDriver(latency=args.db_latency)
+    writer = GraphWriter(driver=driver)
+    rows = synthetic_rows(args.videos, dimensions=args.dimensions)
+    writer.load_nodes_normalized(rows)
+
+    embedding_service = EmbeddingService(embeddings=FakeHashingEmbeddings(args.dimensions))
+    questions = question_stream(args.questions, args.templates, args.zipf)
+
+    print(f"{len(questions)} questions over {args.templates} templates in {len(PHRASINGS)} phrasings | "
+          f"llm {args.llm_latency * 1000:.0f} ms | db {args.db_latency * 1000:.0f} ms per transaction")
+
+    llm = FakeLLM(latency=args.llm_latency)
+    uncached = RAGPipeline(embedding_service=embedding_service, reader=GraphReader(driver=driver), llm=LLM(llm=llm),
+                           cache=AnswerCache(max_entries=0), k=args.k)
+    start = time.perf_counter()
+    latency, wrong = run(uncached, questions)
+    report("uncached", latency, wrong, time.perf_counter() - start, llm)
+
+    llm = FakeLLM(latency=args.llm_latency)
+    cache = AnswerCache(max_entries=args.max_entries, ttl=args.ttl, similarity_threshold=args.threshold)
+    cached = RAGPipeline(embedding_service=embedding_service, reader=GraphReader(driver=driver), llm=LLM(llm=llm),
+                         cache=cache, writer=writer, k=args.k)
+    start = time.perf_counter()
+    latency, wrong = run(cached, questions)
+    report("cached", latency, wrong, time.perf_counter() - start, llm)
+    print(f"cache: {cache.stats}")
+
+    # reload the Source cited most often, as a new load of its transcript would
+    citations = {}
+    for _, question in questions[:50]:
+        for context in cached.answer(question)['contexts']:
+            citations[context['url']] = citations.get(context['url'], 0) + 1
+    url = max(citations, key=citations.get)
+    before = len(cache)
+    writer.load_nodes_normalized([row for row in rows if row['url'] == url])
+    print(f"loading {url} invalidated {before - len(cache)} of {before} entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Measure import and construction time of the entry point modules, each in a fresh interpreter,
+and fail if any exceeds its budget or pulls in a heavy dependency it should not need.
+
+Import time is the sum of the self times reported by `python -X importtime`, 
+less that of a bare interpreter.
+
+Run from src/main:
+    python -m benchmarks.startup_benchmark --repeat 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# module -> import budget in milliseconds
+IMPORT_BUDGETS = {
+    "utils.utils": 250,
+    "tools.embedding": 250,
+    "tools.chunker": 300,
+    "tools.scraper": 400,
+    "tools.manifest": 50,
+    "tools.vector_index": 250,
+    "n4j.communicator": 1200,
+}
+
+# packages that are only needed once a client or model is used
+HEAVY_PACKAGES = ["pandas", "langchain", "google.cloud.storage", "spacy", "neo4j"]
+
+# module -> heavy packages it is allowed to import eagerly
+ALLOWED_HEAVY = {
+    # the neo4j driver imports pandas itself when it is installed
+    "n4j.communicator": ["neo4j", "pandas"],
+}
+
+# name -> (setup statement, construction statement, budget in milliseconds)
+CONSTRUCTION_BUDGETS = {
+    "Chunker()": ("from tools.chunker import Chunker", "Chunker()", 50),
+    "Scraper()": ("from tools.scraper import Scraper", "Scraper()", 100),
+    "EmbeddingService()": ("from tools.embedding import EmbeddingService", "EmbeddingService()", 10),
+}
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+{setup}
+imported = time.perf_counter()
+{construct}
+constructed = time.perf_counter()
+print(json.dumps({{"construct_ms": (constructed - imported) * 1000,
+                  "modules": [name for name in {heavy} if name in sys.modules]}}))
+"""
+
+
+def run_probe(setup: str, construct: str = "pass") -> dict:
+    """
+    Run the statements in a fresh interpreter and return the import time, construction time and heavy modules loaded.
+    """
+
+    # no credentials, so any eager client creation or api call fails loudly
+    env = {key: value for key, value in os.environ.items() if key not in ("GCP_SERVICE_ACCOUNT_KEY_PATH", "YOUTUBE_API_KEY")}
+
+    code = PROBE.format(setup=setup, construct=construct, heavy=HEAVY_PACKAGES)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, env=env)
+
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    import_us = 0
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "self [us]" not in line:
+            import_us += int(line.split(":", 1)[1].split("|")[0])
+
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+    probe['import_ms'] = import_us / 1000
+
+    return probe
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement, the fastest is kept")
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="multiply every budget, e.g. on slow machines")
+    args = parser.parse_args()
+
+    failures = []
+
+    baseline_ms = min(run_probe("pass")['import_ms'] for _ in range(args.repeat))
+
+    print(f"imports (bare interpreter: {baseline_ms:.1f} ms)")
+    for module, budget in IMPORT_BUDGETS.items():
+        probes = [run_probe(f"import {module}") for _ in range(args.repeat)]
+        import_ms = min(probe['import_ms'] for probe in probes) - baseline_ms
+        heavy = [name for name in probes[0]['modules'] if name not in ALLOWED_HEAVY.get(module, [])]
+        budget *= args.budget_scale
+
+        ok = import_ms <= budget and not heavy
+        if not ok:
+            failures.append(module)
+
+        print(f"{'ok  ' if ok else 'FAIL'} {module:22s} {import_ms:8.1f} ms (budget {budget:6.0f} ms)"
+              + (f" | heavy imports: {', '.join(heavy)}" if heavy else ""))
+
+    print("construction")
+    for name, (setup, construct, budget) in CONSTRUCTION_BUDGETS.items():
+        construct_ms = min(run_probe(setup, construct)['construct_ms'] for _ in range(args.repeat))
+        budget *= args.budget_scale
+
+        ok = construct_ms <= budget
+        if not ok:
+            failures.append(name)
+
+        print(f"{'ok  ' if ok else 'FAIL'} {name:22s} {construct_ms:8.1f} ms (budget {budget:6.0f} ms)")
+
+    if failures:
+        print("over budget: ", ", ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
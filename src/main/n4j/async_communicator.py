@@ -0,0 +1,334 @@
+from typing import List, Dict, Tuple, AsyncIterator
+import os
+import time
+
+from neo4j.exceptions import ConstraintError
+from neo4j import AsyncDriver
+
+from n4j import drivers
+from n4j.communicator import (GraphWriter, GraphReader, VECTOR_INDEX_NAME, SOURCE_CONSTRAINT_QUERY, DOCUMENT_CONSTRAINT_QUERY,
+                              WRITE_ROWS_QUERY, DELETE_SOURCE_DOCUMENTS_QUERY, WRITE_SOURCES_QUERY, WRITE_PARENTS_QUERY, WRITE_CHILDREN_QUERY,
+                              VECTOR_SEARCH_QUERY, RETRIEVE_QUERY, CHILD_EMBEDDINGS_QUERY, PARENT_TEXTS_QUERY,
+                              SOURCE_INDEX_QUERIES, FilteredSearchPlanner, WriteNotifier, vector_index_query, source_filter,
+                              filter_selectivity_query, filtered_search_request)
+from utils.metrics import metrics
+
+
+class AsyncCommunicator:
+    """
+    asyncio counterpart of Communicator, running the same queries over a neo4j.AsyncDriver.
+    Without a driver, one is created on first use with the connection pool settings from the environment,
+    see drivers.POOL_SETTINGS. Close it with `await communicator.close()` or `async with`.
+    """
+
+    def __init__(self, driver: AsyncDriver = None) -> None:
+
+        self.driver = driver
+        self._owns_driver = driver is None
+        self.database_name = os.environ.get("NEO4J_DATABASE")
+
+    async def _get_driver(self) -> AsyncDriver:
+        if self.driver is None:
+            self.driver = await drivers.init_async_driver(os.environ.get("NEO4J_URI"),
+                                                          username=os.environ.get("NEO4J_USERNAME"),
+                                                          password=os.environ.get("NEO4J_PASSWORD"),
+                                                          **drivers.pool_config_from_env())
+        return self.driver
+
+    async def close(self) -> None:
+        if self._owns_driver and self.driver is not None:
+            await self.driver.close()
+            self.driver = None
+
+    async def __aenter__(self) -> "AsyncCommunicator":
+        await self._get_driver()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+class AsyncGraphWriter(WriteNotifier, AsyncCommunicator):
+    """
+    Handles writes to the graph database, see GraphWriter.
+    Writes can overlap with other work, e.g. embedding the next batch in an executor.
+    Listeners are registered and called as on GraphWriter, see WriteNotifier.
+    """
+
+    @staticmethod
+    async def _write_rows(tx, data: List[Dict[str, str]], replace_sources: List[str] = None) -> None:
+        if replace_sources:
+            await tx.run(DELETE_SOURCE_DOCUMENTS_QUERY, urls=replace_sources)
+        await tx.run(WRITE_ROWS_QUERY, data=data)
+
+    @staticmethod
+    async def _write_normalized(tx, sources: List[Dict], parents: List[Dict], children: List[Dict]) -> None:
+        await tx.run(WRITE_SOURCES_QUERY, sources=sources)
+        await tx.run(WRITE_PARENTS_QUERY, parents=parents)
+        await tx.run(WRITE_CHILDREN_QUERY, children=children)
+
+    async def load_nodes(self, data: List[Dict[str, str]], replace_sources: List[str] = None) -> bool:
+        """
+        This method uploads the formatted data into the graph, see GraphWriter.load_nodes.
+        Returns False if the write failed on a constraint, True otherwise.
+        """
+
+        driver = await self._get_driver()
+
+        try:
+            async with driver.session(database=self.database_name) as session:
+                with metrics.timer("neo4j_write_seconds"):
+                    await session.execute_write(self._write_rows, data, replace_sources)
+            metrics.inc("neo4j_rows_written_total", len(data))
+
+            if replace_sources:
+                self.notify_deleted(list(replace_sources))
+            if self._load_listeners:
+                self.notify_loaded(*GraphWriter.normalize_rows(data))
+
+            return True
+
+        except ConstraintError as err:
+            metrics.inc("neo4j_errors_total")
+            print(err)
+
+            return False
+
+    async def delete_sources(self, urls: List[str]) -> None:
+        """
+        Delete the documents of the given Source urls, see GraphWriter.delete_sources.
+        """
+
+        urls = list(urls)
+
+        async def run(tx):
+            await tx.run(DELETE_SOURCE_DOCUMENTS_QUERY, urls=urls)
+
+        driver = await self._get_driver()
+        async with driver.session(database=self.database_name) as session:
+            await session.execute_write(run)
+
+        self.notify_deleted(urls)
+
+    async def load_normalized(self, sources: List[Dict], parents: List[Dict], children: List[Dict]) -> None:
+        """
+        This method uploads distinct sources, parents and children into the graph, see GraphWriter.load_normalized.
+        """
+
+        driver = await self._get_driver()
+
+        try:
+            async with driver.session(database=self.database_name) as session:
+                with metrics.timer("neo4j_write_seconds"):
+                    await session.execute_write(self._write_normalized, sources, parents, children)
+            metrics.inc("neo4j_rows_written_total", len(children))
+
+            self.notify_loaded(sources, parents, children)
+
+        except ConstraintError as err:
+            metrics.inc("neo4j_errors_total")
+            print(err)
+
+    async def load_nodes_normalized(self, data: List[Dict[str, str]]) -> None:
+        """
+        Takes the same rows as load_nodes, but deduplicates sources and parents before writing.
+        """
+
+        await self.load_normalized(*GraphWriter.normalize_rows(data))
+
+    async def create_constraints(self) -> None:
+        """
+        Create the constraints.
+        This method should be run before any data is uploaded.
+        """
+
+        async def source_constraint(tx):
+            await tx.run(SOURCE_CONSTRAINT_QUERY)
+        async def document_constraint(tx):
+            await tx.run(DOCUMENT_CONSTRAINT_QUERY)
+
+        driver = await self._get_driver()
+
+        try:
+            async with driver.session(database=self.database_name) as session:
+                await session.execute_write(source_constraint)
+                await session.execute_write(document_constraint)
+
+        except ConstraintError as err:
+            print(err)
+
+    async def create_indexes(self, vector_dimensions: int) -> None:
+        """
+        Create the indexes.
+        """
+
+        async def vector_index(tx):
+            await tx.run(vector_index_query(vector_dimensions))
+        async def source_indexes(tx):
+            for query in SOURCE_INDEX_QUERIES:
+                await tx.run(query)
+
+        driver = await self._get_driver()
+
+        try:
+            async with driver.session(database=self.database_name) as session:
+                await session.execute_write(source_indexes)
+                await session.execute_write(vector_index)
+
+        except ConstraintError as err:
+            print(err)
+
+class AsyncGraphReader(FilteredSearchPlanner, AsyncCommunicator):
+    """
+    Handles reads from the graph database, see GraphReader.
+    Concurrent questions share the driver's connection pool, e.g.:
+        results = await asyncio.gather(*(reader.retrieve(embedding) for embedding in embeddings))
+    Filtered searches choose their plan with FilteredSearchPlanner, like GraphReader.
+    """
+
+    async def neo4j_vector_index_search(self, embeddings: List[float], k: int = 10) -> List[Dict]:
+        """
+        This method runs vector similarity search on the document embeddings against the question embedding.
+        """
+
+        async def run(tx):
+            result = await tx.run(VECTOR_SEARCH_QUERY, {'questionEmbedding': embeddings, 'k': k, 'indexName': VECTOR_INDEX_NAME})
+            return await result.data()
+
+        driver = await self._get_driver()
+
+        try:
+            async with driver.session(database=self.database_name) as session:
+                return await session.execute_read(run)
+
+        except ConstraintError as err:
+            print(err)
+
+    @staticmethod
+    async def _retrieve(tx, embeddings: List[List[float]], k: int) -> List[Dict]:
+        result = await tx.run(RETRIEVE_QUERY, {'embeddings': embeddings, 'k': k, 'indexName': VECTOR_INDEX_NAME})
+        return await result.data()
+
+    async def retrieve_many(self, embeddings: List[List[float]], k: int = 10) -> List[List[Dict]]:
+        """
+        Retrieve the top k Child documents for each question embedding in a single round trip, see GraphReader.retrieve_many.
+        """
+
+        results = [[] for _ in embeddings]
+
+        if not len(embeddings):
+            return results
+
+        embeddings = [list(map(float, embedding)) for embedding in embeddings]
+
+        driver = await self._get_driver()
+        start = time.perf_counter()
+
+        async with driver.session(database=self.database_name) as session:
+            records = await session.execute_read(self._retrieve, embeddings, k)
+
+        self.latency.record(time.perf_counter() - start)
+        metrics.observe("retrieval_seconds", time.perf_counter() - start)
+
+        return GraphReader._group_by_question(records, results)
+
+    async def retrieve(self, embedding: List[float], k: int = 10) -> List[Dict]:
+        """
+        Retrieve the top k Child documents for one question embedding, see retrieve_many.
+        """
+
+        return (await self.retrieve_many([embedding], k=k))[0]
+
+    async def iter_child_embeddings(self, batch_size: int = 10_000) -> AsyncIterator[List[Dict]]:
+        """
+        Stream every Child with its embedding and Source metadata, in batches of records.
+        """
+
+        driver = await self._get_driver()
+
+        async with driver.session(database=self.database_name, fetch_size=batch_size) as session:
+            result = await session.run(CHILD_EMBEDDINGS_QUERY)
+
+            batch = []
+            async for record in result:
+                batch.append(record.data())
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+    async def get_parent_texts(self, parent_indexes: List[str]) -> Dict[str, str]:
+        """
+        Fetch the text of the given Parent documents in one round trip.
+        """
+
+        async def run(tx):
+            result = await tx.run(PARENT_TEXTS_QUERY, {'indexes': list(set(parent_indexes))})
+            return await result.data()
+
+        driver = await self._get_driver()
+
+        async with driver.session(database=self.database_name) as session:
+            records = await session.execute_read(run)
+
+        return {record['index']: record['text'] for record in records}
+
+    async def estimate_filter(self, playlist_id: str = None, published_after: str = None, published_before: str = None) -> Tuple[float, int]:
+        """
+        Estimate the share of Sources a filter keeps and the number of matching Child nodes, see GraphReader.estimate_filter.
+        """
+
+        predicate, parameters = source_filter(playlist_id, published_after, published_before)
+        key = self._selectivity_key(predicate, parameters)
+
+        estimate = self._cached_selectivity(key)
+        if estimate is None:
+
+            async def run(tx):
+                result = await tx.run(filter_selectivity_query(predicate), parameters)
+                return await result.data()
+
+            driver = await self._get_driver()
+            async with driver.session(database=self.database_name) as session:
+                records = await session.execute_read(run)
+
+            estimate = self._store_selectivity(key, records)
+
+        return estimate
+
+    @staticmethod
+    async def _filtered_search(tx, query: str, parameters: Dict) -> List[Dict]:
+        result = await tx.run(query, parameters)
+        return await result.data()
+
+    async def retrieve_filtered(self, embedding: List[float], k: int = 10,
+                                playlist_id: str = None, published_after: str = None, published_before: str = None,
+                                plan: str = "auto") -> List[Dict]:
+        """
+        Retrieve the top k Child documents for one question embedding within a playlist and/or date range,
+        see GraphReader.retrieve_filtered.
+        """
+
+        predicate, parameters = source_filter(playlist_id, published_after, published_before)
+        selectivity, matching_children = await self.estimate_filter(playlist_id, published_after, published_before)
+        plan, fetch = self.plan_filtered_search(k, selectivity, matching_children, plan)
+
+        embedding = list(map(float, embedding))
+
+        driver = await self._get_driver()
+        start = time.perf_counter()
+
+        async with driver.session(database=self.database_name) as session:
+            if plan == "overfetch":
+                records = await session.execute_read(self._filtered_search,
+                                                     *filtered_search_request(plan, predicate, parameters, embedding, k, fetch))
+                if self._needs_exact_scan(records, k, matching_children):
+                    plan = "exact"
+
+            if plan == "exact":
+                records = await session.execute_read(self._filtered_search,
+                                                     *filtered_search_request(plan, predicate, parameters, embedding, k))
+
+        self._record_filtered_search(start, plan)
+
+        return records
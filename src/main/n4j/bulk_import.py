@@ -0,0 +1,151 @@
+from typing import Any, Dict, Iterable, List
+from datetime import datetime, timezone
+import csv
+import os
+
+from n4j.communicator import SOURCE_CONSTRAINT_QUERY, DOCUMENT_CONSTRAINT_QUERY, SOURCE_INDEX_QUERIES, vector_index_query
+
+# file name -> header, in neo4j-admin import format
+NODE_FILES = {
+    "source.csv": ["url:ID(Source)", "title", "playlist_id", "video_id", "publish_date", ":LABEL"],
+    "parent.csv": ["index:ID(Document)", "text", ":LABEL"],
+    "child.csv": ["index:ID(Document)", "text", "embedding:float[]", "createTime:datetime", ":LABEL"],
+}
+
+RELATIONSHIP_FILES = {
+    "has_source.csv": [":START_ID(Document)", ":END_ID(Source)", ":TYPE"],
+    "has_parent.csv": [":START_ID(Document)", ":END_ID(Document)", ":TYPE"],
+}
+
+
+class BulkImportExporter:
+    """
+    Writes prepared node rows (see utils.prepare_new_nodes) as CSV files for `neo4j-admin database import`,
+    which is much faster than transactional MERGE for the first load of a whole channel.
+
+    Rows are written to disk as they arrive. Only the ids of sources, parents and children already written
+    are kept in memory, so each node and relationship is exported once.
+
+    Rows collapsed onto a canonical child by tools.dedup only add a HAS_PARENT edge to it. If the canonical child
+    was not written by this exporter, e.g. it was exported by another one sharing the filter, the import would
+    reject the edge, so the row is skipped and counted in `skipped_duplicates`.
+
+    Usage:
+        with BulkImportExporter("import/") as exporter:
+            for batch in batches:
+                exporter.write(prepare_new_nodes(batch, embedding_service, playlist_id))
+
+    After closing, the directory also holds:
+        import.sh    the neo4j-admin command that imports the files
+        setup.cypher the constraints and vector index, to be run once the imported database is started
+    """
+
+    def __init__(self, directory: str, vector_dimensions: int = 96, array_delimiter: str = ";", database: str = "neo4j") -> None:
+
+        self.directory = directory
+        self.vector_dimensions = vector_dimensions
+        self.array_delimiter = array_delimiter
+        self.database = database
+        self.create_time = datetime.now(timezone.utc).isoformat()
+
+        self._seen_sources = set()
+        self._seen_parents = set()
+        self._seen_children = set()
+        self._seen_has_parent = set()
+        self.skipped_duplicates = 0
+        self.counts = {name: 0 for name in list(NODE_FILES) + list(RELATIONSHIP_FILES)}
+
+        os.makedirs(directory, exist_ok=True)
+
+        self._files = {}
+        self._writers = {}
+        for name, header in {**NODE_FILES, **RELATIONSHIP_FILES}.items():
+            f = open(os.path.join(directory, name), "w", newline="", encoding="utf-8")
+            self._files[name] = f
+            self._writers[name] = csv.writer(f, quoting=csv.QUOTE_MINIMAL)
+            self._writers[name].writerow(header)
+
+    def __enter__(self) -> "BulkImportExporter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _encode_embedding(self, embedding: Iterable[float]) -> str:
+        return self.array_delimiter.join(f"{value:.9g}" for value in embedding)
+
+    def write(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """
+        Append the rows to the CSV files.
+        """
+
+        sources = self._writers["source.csv"]
+        parents = self._writers["parent.csv"]
+        children = self._writers["child.csv"]
+        has_source = self._writers["has_source.csv"]
+        has_parent = self._writers["has_parent.csv"]
+
+        for row in rows:
+            if row['url'] not in self._seen_sources:
+                self._seen_sources.add(row['url'])
+                sources.writerow([row['url'], row.get('title'), row.get('playlist_id'), row.get('video_id'), row.get('publish_date'), "Source"])
+                self.counts["source.csv"] += 1
+
+            if row['parent_index'] not in self._seen_parents:
+                self._seen_parents.add(row['parent_index'])
+                parents.writerow([row['parent_index'], row.get('parent_transcript'), "Document;Parent"])
+                has_source.writerow([row['parent_index'], row['url'], "HAS_SOURCE"])
+                self.counts["parent.csv"] += 1
+                self.counts["has_source.csv"] += 1
+
+            if row.get('duplicate_of') is not None or row.get('embedding') is None:
+                if row['child_index'] not in self._seen_children:
+                    self.skipped_duplicates += 1
+                    continue
+
+            elif row['child_index'] not in self._seen_children:
+                self._seen_children.add(row['child_index'])
+                children.writerow([row['child_index'], row['transcript'], self._encode_embedding(row['embedding']), self.create_time, "Document;Child"])
+                self.counts["child.csv"] += 1
+
+            edge = (row['child_index'], row['parent_index'])
+            if edge not in self._seen_has_parent:
+                self._seen_has_parent.add(edge)
+                has_parent.writerow([row['child_index'], row['parent_index'], "HAS_PARENT"])
+                self.counts["has_parent.csv"] += 1
+
+    def setup_statements(self) -> List[str]:
+        """
+        The statements that GraphWriter.create_constraints and GraphWriter.create_indexes run.
+        """
+
+        return [query.strip().rstrip(";").strip() for query in (SOURCE_CONSTRAINT_QUERY,
+                                                                DOCUMENT_CONSTRAINT_QUERY,
+                                                                *SOURCE_INDEX_QUERIES,
+                                                                vector_index_query(self.vector_dimensions))]
+
+    def import_command(self) -> str:
+        nodes = " ".join(f"--nodes={name}" for name in NODE_FILES)
+        relationships = " ".join(f"--relationships={name}" for name in RELATIONSHIP_FILES)
+        return (f"neo4j-admin database import full {nodes} {relationships} "
+                f"--array-delimiter=\"{self.array_delimiter}\" --multiline-fields=true {self.database}")
+
+    def close(self) -> None:
+        """
+        Flush the CSV files and write the import command and setup statements next to them.
+        """
+
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+        if self.skipped_duplicates:
+            print("collapsed rows skipped, their canonical child is not in this export: ", self.skipped_duplicates)
+
+        with open(os.path.join(self.directory, "setup.cypher"), "w") as f:
+            f.write(";\n\n".join(self.setup_statements()) + ";\n")
+
+        with open(os.path.join(self.directory, "import.sh"), "w") as f:
+            f.write("#!/bin/sh\n")
+            f.write("# run from this directory with the target database stopped, then run setup.cypher against it\n")
+            f.write(self.import_command() + "\n")
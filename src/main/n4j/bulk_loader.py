@@ -0,0 +1,248 @@
+from typing import Any, Dict, Iterable, List
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+import threading
+import time
+
+from neo4j.exceptions import (AuthError, ClientError, CypherSyntaxError, Forbidden, NotALeader, ServiceUnavailable,
+                              SessionExpired, TokenExpired, TransientError)
+
+from n4j.communicator import GraphWriter
+from utils.concurrency import retry_with_backoff
+from utils.metrics import metrics
+from utils.streaming import batch_iterator
+
+# errors worth retrying as they are, rather than splitting the batch
+RETRYABLE_ERRORS = (TransientError, ServiceUnavailable, SessionExpired)
+
+# client errors caused by the query, the credentials or the cluster rather than by the rows, which splitting can not isolate
+NON_DATA_CLIENT_ERRORS = (AuthError, CypherSyntaxError, Forbidden, NotALeader, TokenExpired)
+
+
+@dataclass
+class BulkLoadReport:
+    rows_loaded: int = 0
+    failed_rows: List[Dict[str, Any]] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+    batches: int = 0
+    retries: int = 0
+    splits: int = 0
+    final_batch_size: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return round(self.rows_loaded / self.seconds, 1) if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (f"rows loaded: {self.rows_loaded} | failed rows: {len(self.failed_rows)} | "
+                f"rows/sec: {self.rows_per_second} | batches: {self.batches} | retries: {self.retries} | "
+                f"splits: {self.splits} | final batch size: {self.final_batch_size} | seconds: {round(self.seconds, 2)}")
+
+
+class BulkLoadError(RuntimeError):
+    """
+    A retryable error persisted after every retry, e.g. the database stayed unavailable.
+    `report` holds the progress up to the abort and `rows` the batch that could not be written.
+    Rows not yet batched when the load stopped are left in the iterator passed to BulkLoader.load.
+    """
+
+    def __init__(self, message: str, rows: List[Dict[str, Any]], report: BulkLoadReport = None) -> None:
+        super().__init__(message)
+        self.rows = rows
+        self.report = report
+
+
+class BulkLoader:
+    """
+    Loads prepared node rows over several concurrent sessions.
+
+    - The batch size is adjusted after every transaction so that one transaction takes about `target_latency` seconds.
+    - Transient errors are retried with exponential backoff. Once the retries are used up,
+      the load stops and raises a BulkLoadError with the report of the rows loaded so far.
+    - A client error caused by the rows, e.g. a ConstraintError or CypherTypeError, splits the batch in halves,
+      which are written separately, until the rows that can not be written are isolated and reported.
+    - Any other error, e.g. a DatabaseError, an AuthError or a Python exception, stops the load and is raised as it is.
+    """
+
+    def __init__(self,
+                 writer: GraphWriter,
+                 max_workers: int = 4,
+                 initial_batch_size: int = 500,
+                 min_batch_size: int = 50,
+                 max_batch_size: int = 5000,
+                 target_latency: float = 1.0,
+                 max_retries: int = 3,
+                 normalized: bool = True) -> None:
+
+        self.writer = writer
+        self.max_workers = max_workers
+        self.batch_size = initial_batch_size
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.normalized = normalized
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._sessions = []
+        self._report = None
+
+    def _session(self):
+        """
+        One session per worker thread, reused for all of its batches.
+        """
+
+        session = getattr(self._local, "session", None)
+
+        if session is None:
+            session = self.writer.driver.session(database=self.writer.database_name)
+            self._local.session = session
+            with self._lock:
+                self._sessions.append(session)
+
+        return session
+
+    def _execute(self, rows: List[Dict[str, Any]]) -> None:
+        session = self._session()
+        with metrics.timer("neo4j_write_seconds"):
+            if self.normalized:
+                session.execute_write(self.writer._write_normalized, *self.writer.normalize_rows(rows))
+            else:
+                session.execute_write(self.writer._write_rows, rows)
+
+    def _write_with_retries(self, rows: List[Dict[str, Any]]) -> None:
+        attempts = []
+
+        def attempt():
+            if attempts:
+                # the session may be broken after a connection error
+                try:
+                    self._local.session.close()
+                except Exception:
+                    pass
+                self._local.session = None
+            attempts.append(1)
+            self._execute(rows)
+
+        try:
+            retry_with_backoff(attempt, max_retries=self.max_retries, retry_on=RETRYABLE_ERRORS)
+        finally:
+            with self._lock:
+                self._report.retries += len(attempts) - 1
+
+    def _adapt_batch_size(self, rows: int, latency: float) -> None:
+        """
+        Move the batch size toward the size expected to take `target_latency`, by at most a factor of 2 per step.
+        """
+
+        if rows < self.batch_size // 2 or latency <= 0:
+            # small batches, e.g. split or final ones, say little about the best size
+            return
+
+        ideal = rows * self.target_latency / latency
+
+        with self._lock:
+            new_size = min(max(ideal, self.batch_size / 2), self.batch_size * 2)
+            self.batch_size = int(min(max(new_size, self.min_batch_size), self.max_batch_size))
+
+    def _load_batch(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Write a batch, splitting it on client errors caused by its rows until the failing rows are isolated.
+        """
+
+        start = time.perf_counter()
+
+        try:
+            self._write_with_retries(rows)
+
+        except RETRYABLE_ERRORS as e:
+            # splitting would not help: the database, not the rows, failed
+            metrics.inc("neo4j_errors_total")
+            raise BulkLoadError(f"{type(e).__name__} persisted after {self.max_retries} retries "
+                                f"writing a batch of {len(rows)} rows: {e}", rows) from e
+
+        except ClientError as e:
+            metrics.inc("neo4j_errors_total")
+
+            if isinstance(e, NON_DATA_CLIENT_ERRORS):
+                raise
+
+            if len(rows) == 1:
+                with self._lock:
+                    self._report.failed_rows.extend(rows)
+                    self._report.errors.append(str(e))
+                return
+
+            with self._lock:
+                self._report.splits += 1
+
+            middle = len(rows) // 2
+            self._load_batch(rows[:middle])
+            self._load_batch(rows[middle:])
+            return
+
+        self._adapt_batch_size(len(rows), time.perf_counter() - start)
+
+        if self.writer._load_listeners:
+            self.writer.notify_loaded(*self.writer.normalize_rows(rows))
+
+        metrics.inc("neo4j_rows_written_total", len(rows))
+
+        with self._lock:
+            self._report.rows_loaded += len(rows)
+            self._report.batches += 1
+
+    def load(self, rows: Iterable[Dict[str, Any]]) -> BulkLoadReport:
+        """
+        Load the rows and return a report with the throughput and the rows that failed.
+        Rows are consumed lazily, at most 2 batches per worker are in flight at once.
+        Raises BulkLoadError, with the report so far, once a batch has used up its retries;
+        the batches already in flight are finished first and no new ones are started.
+        """
+
+        self._report = BulkLoadReport()
+        start = time.perf_counter()
+        iterator = iter(rows)
+        in_flight = set()
+        error = None
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bulk-load") as executor:
+                while error is None:
+                    batch = next(batch_iterator(iterator, self.batch_size), None)
+                    if batch is None:
+                        break
+
+                    in_flight.add(executor.submit(self._load_batch, batch))
+
+                    if len(in_flight) >= 2 * self.max_workers:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            error = error or future.exception()
+
+                    print("rows loaded: ", self._report.rows_loaded, " | failed: ", len(self._report.failed_rows),
+                          " | batch size: ", self.batch_size, "                  ", end="\r")
+
+                for future in in_flight:
+                    error = error or future.exception()
+
+        finally:
+            for session in self._sessions:
+                session.close()
+            self._sessions = []
+            self._local = threading.local()
+
+        self._report.seconds = time.perf_counter() - start
+        self._report.final_batch_size = self.batch_size
+        print()
+
+        if isinstance(error, BulkLoadError):
+            error.report = self._report
+            print(error)
+            print(self._report)
+        if error is not None:
+            raise error
+
+        return self._report
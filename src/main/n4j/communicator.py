@@ -1,18 +1,280 @@
-# import time
-from typing import List, Optional, Dict
+from typing import Callable, List, Optional, Dict, Tuple, Iterator
+import math
 import os
+import time
 
 from neo4j.exceptions import ConstraintError
 from neo4j import Driver
 
 from n4j import drivers
+from utils.metrics import LatencyRecorder, metrics
 # from credentials import credentials
 
+VECTOR_INDEX_NAME = "text-embeddings"
+
+SOURCE_CONSTRAINT_QUERY = """
+                CREATE CONSTRAINT source_url FOR (s:Source) REQUIRE s.url IS UNIQUE
+                ;
+                """
+
+DOCUMENT_CONSTRAINT_QUERY = """
+                CREATE CONSTRAINT document_id FOR (d:Document) REQUIRE d.index IS UNIQUE
+                ;
+                """
+
+def vector_index_query(vector_dimensions: int) -> str:
+    """
+    The statement creating the vector index on Child embeddings.
+    """
+
+    return """
+                CREATE VECTOR INDEX `{index_name}`
+                FOR (n: Child) ON (n.embedding)
+                OPTIONS {{indexConfig: {{
+                `vector.dimensions`: {vector_dims},
+                `vector.similarity_function`: 'cosine'
+                }}}} 
+                ;
+                """.format(index_name=VECTOR_INDEX_NAME, vector_dims=int(vector_dimensions))
+
+# property indexes backing the playlist and date predicates of filtered searches
+SOURCE_INDEX_QUERIES = ["""
+                CREATE INDEX source_playlist_id IF NOT EXISTS FOR (s:Source) ON (s.playlist_id)
+                ;
+                """,
+                        """
+                CREATE INDEX source_publish_date IF NOT EXISTS FOR (s:Source) ON (s.publish_date)
+                ;
+                """]
+
+# children collapsed onto a canonical child by tools.dedup carry no text or embedding, only the edge to their parent.
+# A canonical child then has several parents, so the read queries below keep one parent per child.
+WRITE_ROWS_QUERY = """
+                UNWIND $data AS param
+
+                MERGE (child:Document {index: param.child_index})
+                MERGE (parent:Document {index: param.parent_index})
+                MERGE (s:Source {url: param.url})
+                SET
+                    child:Child,
+                    child.createTime = datetime(),
+                    child.text = coalesce(param.transcript, child.text),
+                    child.embedding = coalesce(param.embedding, child.embedding),
+
+                    parent:Parent,
+                    parent.text = param.parent_transcript,
+
+                    s.title = param.title,
+                    s.playlist_id = param.playlist_id,
+                    s.video_id = param.video_id,
+                    s.publish_date = param.publish_date
+
+                MERGE (parent)-[:HAS_SOURCE]->(s)
+                MERGE (child)-[:HAS_PARENT]->(parent)
+                """
+
+# the Parents of a Source and the Children that have no Parent in another Source, e.g. before reloading a changed video
+DELETE_SOURCE_DOCUMENTS_QUERY = """
+                UNWIND $urls AS url
+                MATCH (s:Source {url: url})<-[:HAS_SOURCE]-(parent:Parent)
+                OPTIONAL MATCH (parent)<-[:HAS_PARENT]-(child:Child)
+                WHERE NOT EXISTS {
+                    MATCH (child)-[:HAS_PARENT]->(:Parent)-[:HAS_SOURCE]->(other:Source)
+                    WHERE other.url <> url
+                }
+                WITH parent, collect(child) AS children
+                FOREACH (child IN children | DETACH DELETE child)
+                DETACH DELETE parent
+                """
+
+WRITE_SOURCES_QUERY = """
+                UNWIND $sources AS param
+
+                MERGE (s:Source {url: param.url})
+                SET
+                    s.title = param.title,
+                    s.playlist_id = param.playlist_id,
+                    s.video_id = param.video_id,
+                    s.publish_date = param.publish_date
+                """
+
+WRITE_PARENTS_QUERY = """
+                UNWIND $parents AS param
+
+                MATCH (s:Source {url: param.url})
+                MERGE (parent:Document {index: param.index})
+                SET
+                    parent:Parent,
+                    parent.text = param.text
+
+                MERGE (parent)-[:HAS_SOURCE]->(s)
+                """
+
+WRITE_CHILDREN_QUERY = """
+                UNWIND $children AS param
+
+                MATCH (parent:Document {index: param.parent_index})
+                MERGE (child:Document {index: param.index})
+                SET
+                    child:Child,
+                    child.createTime = datetime(),
+                    child.text = coalesce(param.text, child.text),
+                    child.embedding = coalesce(param.embedding, child.embedding)
+
+                MERGE (child)-[:HAS_PARENT]->(parent)
+                """
+
+VECTOR_SEARCH_QUERY = """
+                CALL db.index.vector.queryNodes($indexName, toInteger($k), $questionEmbedding)
+                YIELD node AS vDocs, score
+                OPTIONAL MATCH (vDocs)-[:HAS_PARENT]->(:Parent)-[:HAS_SOURCE]->(s:Source)
+                WITH vDocs, score, collect(s)[0] AS s
+                return s.url as url, vDocs.text as text, vDocs.index as index, score
+                """
+
+RETRIEVE_QUERY = """
+                UNWIND range(0, size($embeddings) - 1) AS question
+                CALL db.index.vector.queryNodes($indexName, toInteger($k), $embeddings[question])
+                YIELD node AS child, score
+                OPTIONAL MATCH (child)-[:HAS_PARENT]->(parent:Parent)
+                WITH question, child, score, collect(parent)[0] AS parent
+                OPTIONAL MATCH (parent)-[:HAS_SOURCE]->(s:Source)
+                RETURN question,
+                       child.index AS index,
+                       child.text AS text,
+                       score,
+                       parent.index AS parent_index,
+                       parent.text AS parent_text,
+                       s.url AS url,
+                       s.title AS title,
+                       s.video_id AS video_id,
+                       s.playlist_id AS playlist_id,
+                       s.publish_date AS publish_date
+                ORDER BY question ASC, score DESC
+                """
+
+FILTERED_RETURN = """
+                RETURN child.index AS index,
+                       child.text AS text,
+                       score,
+                       parent.index AS parent_index,
+                       parent.text AS parent_text,
+                       s.url AS url,
+                       s.title AS title,
+                       s.video_id AS video_id,
+                       s.playlist_id AS playlist_id,
+                       s.publish_date AS publish_date
+                ORDER BY score DESC
+                LIMIT toInteger($k)
+                """
+
+def source_filter(playlist_id: str = None, published_after: str = None, published_before: str = None) -> Tuple[str, Dict[str, str]]:
+    """
+    The WHERE predicate on `s:Source` and its parameters for a filtered search.
+    Only the given bounds are included, so the planner can use the Source property indexes.
+    Dates are compared as the stored YYYY-MM-DD strings, both bounds inclusive.
+    """
+
+    predicates = []
+    parameters = {}
+
+    if playlist_id is not None:
+        predicates.append("s.playlist_id = $playlistId")
+        parameters['playlistId'] = playlist_id
+    if published_after is not None:
+        predicates.append("s.publish_date >= $publishedAfter")
+        parameters['publishedAfter'] = published_after
+    if published_before is not None:
+        predicates.append("s.publish_date <= $publishedBefore")
+        parameters['publishedBefore'] = published_before
+
+    return " AND ".join(predicates) or "true", parameters
+
+def filter_selectivity_query(predicate: str) -> str:
+    """
+    Counts used to estimate how many Child nodes a filter keeps: matching and total Sources, and total Children.
+    """
+
+    return """
+                MATCH (s:Source)
+                WHERE {predicate}
+                WITH count(s) AS matchingSources
+                MATCH (source:Source)
+                WITH matchingSources, count(source) AS totalSources
+                MATCH (child:Child)
+                RETURN matchingSources, totalSources, count(child) AS totalChildren
+                """.format(predicate=predicate)
+
+def overfetch_search_query(predicate: str) -> str:
+    """
+    Over-fetch plan: take the top $fetch Children from the vector index, keep those whose Source
+    passes the filter and return the best $k.
+    """
+
+    return """
+                CALL db.index.vector.queryNodes($indexName, toInteger($fetch), $questionEmbedding)
+                YIELD node AS child, score
+                MATCH (child)-[:HAS_PARENT]->(parent:Parent)-[:HAS_SOURCE]->(s:Source)
+                WHERE {predicate}
+                WITH child, score, collect({{parent: parent, s: s}})[0] AS hit
+                WITH child, score, hit.parent AS parent, hit.s AS s
+                """.format(predicate=predicate) + FILTERED_RETURN
+
+def exact_search_query(predicate: str) -> str:
+    """
+    Filter-first plan: find the matching Sources through their property indexes and score every Child
+    below them exactly with vector.similarity.cosine, which is scaled like the vector index scores, (1 + cosine) / 2.
+    """
+
+    return """
+                MATCH (s:Source)
+                WHERE {predicate}
+                MATCH (s)<-[:HAS_SOURCE]-(parent:Parent)<-[:HAS_PARENT]-(child:Child)
+                WITH child, collect({{parent: parent, s: s}})[0] AS hit
+                WITH child, hit.parent AS parent, hit.s AS s,
+                     vector.similarity.cosine(child.embedding, $questionEmbedding) AS score
+                """.format(predicate=predicate) + FILTERED_RETURN
+
+def filtered_search_request(plan: str, predicate: str, parameters: Dict[str, str], embedding: List[float],
+                            k: int, fetch: int = 0) -> Tuple[str, Dict]:
+    """
+    The query and parameters of one plan of a filtered search, "overfetch" fetching `fetch` candidates
+    from the vector index or "exact" scanning every matching Child.
+    """
+
+    if plan == "overfetch":
+        return overfetch_search_query(predicate), {**parameters, 'questionEmbedding': embedding, 'k': k,
+                                                   'fetch': fetch, 'indexName': VECTOR_INDEX_NAME}
+
+    return exact_search_query(predicate), {**parameters, 'questionEmbedding': embedding, 'k': k}
+
+CHILD_EMBEDDINGS_QUERY = """
+                MATCH (child:Child)-[:HAS_PARENT]->(parent:Parent)
+                WITH child, collect(parent)[0] AS parent
+                OPTIONAL MATCH (parent)-[:HAS_SOURCE]->(s:Source)
+                RETURN child.index AS index,
+                       child.text AS text,
+                       child.embedding AS embedding,
+                       parent.index AS parent_index,
+                       s.url AS url,
+                       s.title AS title,
+                       s.video_id AS video_id,
+                       s.playlist_id AS playlist_id,
+                       s.publish_date AS publish_date
+                """
+
+PARENT_TEXTS_QUERY = """
+                UNWIND $indexes AS parentIndex
+                MATCH (parent:Parent {index: parentIndex})
+                RETURN parent.index AS index, parent.text AS text
+                """
+
 class Communicator:
     """
     The constructor expects an instance of the Neo4j Driver, which will be
     used to interact with Neo4j.
     This class contains methods necessary to interact with the Neo4j database.
+    Without a driver, one is created with the connection pool settings from the environment, see drivers.POOL_SETTINGS.
     """
 
     def __init__(self, driver: Driver = None) -> None:
@@ -20,59 +282,180 @@ class Communicator:
         if driver is None:
             self.driver = drivers.init_driver(os.environ.get("NEO4J_URI"), 
                                               username=os.environ.get("NEO4J_USERNAME"), 
-                                              password=os.environ.get("NEO4J_PASSWORD"))
+                                              password=os.environ.get("NEO4J_PASSWORD"),
+                                              **drivers.pool_config_from_env())
         else:
             self.driver = driver
         self.database_name = os.environ.get("NEO4J_DATABASE")
 
-class GraphWriter(Communicator):
+class WriteNotifier:
+    """
+    Listener registry shared by GraphWriter and AsyncGraphWriter, so local indexes and caches follow the graph:
+    load listeners get the nodes of every written batch, delete listeners the urls of every deleted or replaced Source.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+
+        self._load_listeners = []
+        self._delete_listeners = []
+
+    def add_load_listener(self, listener: Callable[[List[Dict], List[Dict], List[Dict]], None]) -> None:
+        """
+        Register a callback that is called with the distinct sources, parents and children
+        of every batch after it has been written, e.g. to keep a local index or cache up to date.
+        Children collapsed onto a canonical child (see tools.dedup) only add an edge and are not passed on.
+        """
+
+        self._load_listeners.append(listener)
+
+    def notify_loaded(self, sources: List[Dict], parents: List[Dict], children: List[Dict]) -> None:
+        children = [child for child in children if child['embedding'] is not None]
+        for listener in self._load_listeners:
+            listener(sources, parents, children)
+
+    def add_delete_listener(self, listener: Callable[[List[str]], None]) -> None:
+        """
+        Register a callback that is called with the Source urls whose documents were deleted,
+        by delete_sources or by a load replacing them, before the replacing batch is passed to the load listeners.
+        """
+
+        self._delete_listeners.append(listener)
+
+    def notify_deleted(self, urls: List[str]) -> None:
+        for listener in self._delete_listeners:
+            listener(urls)
+
+class GraphWriter(WriteNotifier, Communicator):
     """
     Handles writes to the graph database.
     """
-    def __init__(self, driver: Driver = None) -> None:
-        super().__init__(driver)
 
-    def load_nodes(self, data: List[Dict[str, str]]) -> None:
+    @staticmethod
+    def _write_rows(tx, data: List[Dict[str, str]], replace_sources: List[str] = None) -> None:
+        """
+        Transaction function writing rows with one child each, along with its parent and source,
+        after deleting the previous documents of the `replace_sources` urls.
+        """
+
+        if replace_sources:
+            tx.run(DELETE_SOURCE_DOCUMENTS_QUERY, urls=replace_sources)
+        tx.run(WRITE_ROWS_QUERY, data=data)
+
+    def load_nodes(self, data: List[Dict[str, str]], replace_sources: List[str] = None) -> bool:
         """
         This method uploads the formatted data into the graph.
+        The Parent and Child documents of the `replace_sources` urls, e.g. videos whose transcript changed,
+        are deleted in the same transaction first, see delete_sources.
+        Returns False if the write failed on a constraint, True otherwise.
+        """
+   
+        try:
+            with self.driver.session(database=self.database_name) as session:
+                with metrics.timer("neo4j_write_seconds"):
+                    session.execute_write(self._write_rows, data, replace_sources)
+            metrics.inc("neo4j_rows_written_total", len(data))
+
+            if replace_sources:
+                self.notify_deleted(list(replace_sources))
+            if self._load_listeners:
+                self.notify_loaded(*self.normalize_rows(data))
+
+            return True
+            
+        except ConstraintError as err:
+            metrics.inc("neo4j_errors_total")
+            print(err)
+
+            session.close()
+
+            return False
+
+    def delete_sources(self, urls: List[str]) -> None:
         """
+        Delete the Parent documents of the given Source urls, and their Child documents
+        unless another Source's Parent shares them. The Source nodes are kept.
+        """
+
+        urls = list(urls)
 
         def run(tx):
-            tx.run(
-               query = """
-                UNWIND $data AS param
+            tx.run(DELETE_SOURCE_DOCUMENTS_QUERY, urls=urls)
 
-                MERGE (child:Document {index: param.child_index})
-                MERGE (parent:Document {index: param.parent_index})
-                MERGE (s:Source {url: param.url})
-                SET
-                    child:Child,
-                    child.createTime = datetime(),
-                    child.text = param.transcript,
-                    child.embedding = param.embedding,
-                    
-                    parent:Parent,
-                    parent.text = param.parent_transcript,
+        with self.driver.session(database=self.database_name) as session:
+            session.execute_write(run)
+
+        self.notify_deleted(urls)
+
+    @staticmethod
+    def normalize_rows(data: List[Dict[str, str]]) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+        """
+        Split rows in the load_nodes format into distinct sources, parents and children.
+        Each source and parent appears once no matter how many children reference it.
+        """
+
+        sources = {}
+        parents = {}
+        children = []
+
+        for row in data:
+            if row['url'] not in sources:
+                sources[row['url']] = {"url": row['url'],
+                                       "title": row.get('title'),
+                                       "playlist_id": row.get('playlist_id'),
+                                       "video_id": row.get('video_id'),
+                                       "publish_date": row.get('publish_date')}
+            
+            if row['parent_index'] not in parents:
+                parents[row['parent_index']] = {"index": row['parent_index'],
+                                                "text": row.get('parent_transcript'),
+                                                "url": row['url']}
+                
+            children.append({"index": row['child_index'],
+                             "text": row['transcript'],
+                             "embedding": row['embedding'],
+                             "parent_index": row['parent_index']})
+
+        return list(sources.values()), list(parents.values()), children
+
+    @staticmethod
+    def _write_normalized(tx, sources: List[Dict], parents: List[Dict], children: List[Dict]) -> None:
+        """
+        Transaction function writing distinct sources, parents and children in separate UNWIND passes.
+        """
+
+        tx.run(WRITE_SOURCES_QUERY, sources=sources)
+        tx.run(WRITE_PARENTS_QUERY, parents=parents)
+        tx.run(WRITE_CHILDREN_QUERY, children=children)
+
+    def load_normalized(self, sources: List[Dict], parents: List[Dict], children: List[Dict]) -> None:
+        """
+        This method uploads distinct sources, parents and children into the graph.
+        Each collection is written by its own UNWIND pass within a single transaction,
+        so every source and parent is sent and merged only once.
+        """
 
-                    s.title = param.title,
-                    s.playlist_id = param.playlist_id,
-                    s.video_id = param.video_id,
-                    s.publish_date = param.publish_date
-                    
-                MERGE (parent)-[:HAS_SOURCE]->(s)
-                MERGE (child)-[:HAS_PARENT]->(parent)
-                """, data=data
-            )
-   
         try:
             with self.driver.session(database=self.database_name) as session:
-                session.execute_write(run)
+                with metrics.timer("neo4j_write_seconds"):
+                    session.execute_write(self._write_normalized, sources, parents, children)
+            metrics.inc("neo4j_rows_written_total", len(children))
+
+            self.notify_loaded(sources, parents, children)
             
         except ConstraintError as err:
+            metrics.inc("neo4j_errors_total")
             print(err)
 
             session.close()
 
+    def load_nodes_normalized(self, data: List[Dict[str, str]]) -> None:
+        """
+        Takes the same rows as load_nodes, but deduplicates sources and parents before writing.
+        """
+
+        self.load_normalized(*self.normalize_rows(data))
+
     def create_constraints(self) -> None:
         """
         Create the constraints. 
@@ -80,19 +463,9 @@ class GraphWriter(Communicator):
         """
 
         def source_constraint(tx):
-            tx.run(
-                """
-                CREATE CONSTRAINT source_url FOR (s:Source) REQUIRE s.url IS UNIQUE
-                ;
-                """
-            )
+            tx.run(SOURCE_CONSTRAINT_QUERY)
         def document_constraint(tx):
-            tx.run(
-                """
-                CREATE CONSTRAINT document_id FOR (d:Document) REQUIRE d.index IS UNIQUE
-                ;
-                """
-            )
+            tx.run(DOCUMENT_CONSTRAINT_QUERY)
    
         try:
             with self.driver.session(database=self.database_name) as session:
@@ -107,24 +480,18 @@ class GraphWriter(Communicator):
     def create_indexes(self, vector_dimensions: int) -> None:
         """
         Create the indexes. 
+        The Source property indexes are created first, so they exist even if the vector index already does.
         """
 
         def vector_index(tx):
-            tx.run(
-                """
-                CREATE VECTOR INDEX `text-embeddings`
-                FOR (n: Child) ON (n.embedding)
-                OPTIONS {indexConfig: {
-                `vector.dimensions`: {vector_dims},
-                `vector.similarity_function`: 'cosine'
-                }} 
-                ;
-                """.format(vector_dims=vector_dimensions)
-            )
-      
+            tx.run(vector_index_query(vector_dimensions))
+        def source_indexes(tx):
+            for query in SOURCE_INDEX_QUERIES:
+                tx.run(query)
    
         try:
             with self.driver.session(database=self.database_name) as session:
+                session.execute_write(source_indexes)
                 session.execute_write(vector_index)
             
         except ConstraintError as err:
@@ -132,26 +499,109 @@ class GraphWriter(Communicator):
 
             session.close()
 
-class GraphReader(Communicator):
+class FilteredSearchPlanner:
     """
-    Handles reads from the graph database.
+    Plan selection of filtered searches, shared by GraphReader and AsyncGraphReader, which only run the queries.
+    Filtered searches choose their plan from these settings:
+        exact_scan_limit   estimated matching Children up to which the filter-first exact scan is used
+        overfetch_factor   candidates fetched from the vector index per expected match of the top k
+        max_candidates     most candidates the over-fetch plan takes from the vector index
+        selectivity_ttl    seconds the counts behind a selectivity estimate are reused
+    `latency` records the round trip of every retrieval request, filtered or not.
     """
 
-    def __init__(self, driver: Driver = None) -> None:
-        super().__init__(driver)
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+
+        # round trip latency of every retrieval request
+        self.latency = LatencyRecorder()
+        self.exact_scan_limit = 20_000
+        self.overfetch_factor = 2.0
+        self.max_candidates = 5_000
+        self.selectivity_ttl = 300.0
+        # (predicate, parameters) -> (time, matching sources, total sources, total children)
+        self._selectivity_cache = {}
+
+    @staticmethod
+    def _selectivity_key(predicate: str, parameters: Dict[str, str]) -> Tuple:
+        return predicate, tuple(sorted(parameters.items()))
+
+    def _cached_selectivity(self, key: Tuple) -> Optional[Tuple[float, int]]:
+        """
+        The estimate of a filter from counts younger than `selectivity_ttl`, None when they must be queried again.
+        """
+
+        cached = self._selectivity_cache.get(key)
+        if cached is None or time.monotonic() - cached[0] > self.selectivity_ttl:
+            return None
+        return self._selectivity(*cached[1:])
 
-    def neo4j_vector_index_search(self, embeddings: List[float], k: int = 10) -> None:
+    def _store_selectivity(self, key: Tuple, records: List[Dict]) -> Tuple[float, int]:
+        """
+        Cache the counts of filter_selectivity_query and return the estimate from them.
+        """
+
+        record = records[0] if records else {}
+        counts = (record.get('matchingSources', 0), record.get('totalSources', 0), record.get('totalChildren', 0))
+        self._selectivity_cache[key] = (time.monotonic(), *counts)
+        return self._selectivity(*counts)
+
+    @staticmethod
+    def _selectivity(matching_sources: int, total_sources: int, total_children: int) -> Tuple[float, int]:
+        if not total_sources:
+            return 0.0, 0
+        selectivity = matching_sources / total_sources
+        return selectivity, int(math.ceil(selectivity * total_children))
+
+    def plan_filtered_search(self, k: int, selectivity: float, matching_children: int, plan: str = "auto") -> Tuple[str, int]:
+        """
+        Choose the plan of a filtered search and the number of vector index candidates to fetch.
+        Small filtered sets are scanned exactly ("exact"). Otherwise the index is over-fetched ("overfetch")
+        by enough candidates to expect `overfetch_factor` times k matches, unless that exceeds `max_candidates`,
+        in which case the filter is too selective for the index and the exact scan is used after all.
+        A plan other than "auto" is kept, only the number of candidates is chosen.
+        """
+
+        if plan not in ("auto", "overfetch", "exact"):
+            raise ValueError(f"unknown plan {plan!r}, expected 'auto', 'overfetch' or 'exact'")
+
+        fetch = min(self.max_candidates, int(math.ceil(k * self.overfetch_factor / max(selectivity, 1e-9))))
+        fetch = max(fetch, k)
+
+        if plan == "auto":
+            too_selective = k * self.overfetch_factor / max(selectivity, 1e-9) > self.max_candidates
+            plan = "exact" if matching_children <= self.exact_scan_limit or too_selective else "overfetch"
+
+        return plan, fetch if plan == "overfetch" else 0
+
+    @staticmethod
+    def _needs_exact_scan(records: List[Dict], k: int, matching_children: int) -> bool:
+        """
+        Whether an over-fetch found fewer matches than the filter holds, so the exact scan has to run after it.
+        """
+
+        if len(records) < min(k, matching_children):
+            metrics.inc("filtered_search_fallbacks_total")
+            return True
+        return False
+
+    def _record_filtered_search(self, start: float, plan: str) -> None:
+        self.latency.record(time.perf_counter() - start)
+        metrics.observe("filtered_search_seconds", time.perf_counter() - start, plan=plan)
+
+class GraphReader(FilteredSearchPlanner, Communicator):
+    """
+    Handles reads from the graph database.
+    Filtered searches choose their plan with FilteredSearchPlanner.
+    """
+
+    def neo4j_vector_index_search(self, embeddings: List[float], k: int = 10) -> List[Dict]:
         """
         This method runs vector similarity search on the document embeddings against the question embedding.
         """
 
         def run(tx):
-            return tx.run("""
-                        CALL db.index.vector.queryNodes('document-embeddings', toInteger($k), $questionEmbedding)
-                        YIELD node AS vDocs, score
-                        return vDocs.url as url, vDocs.text as text, vDocs.index as index
-                        """, {'questionEmbedding': embeddings, 'k': k}
-                        )
+            return tx.run(VECTOR_SEARCH_QUERY, {'questionEmbedding': embeddings, 'k': k, 'indexName': VECTOR_INDEX_NAME}).data()
         
         try:
             with self.driver.session(database=self.database_name) as session:
@@ -162,4 +612,140 @@ class GraphReader(Communicator):
         except ConstraintError as err:
             print(err)
 
-            session.close()
\ No newline at end of file
+            session.close()
+
+    @staticmethod
+    def _retrieve(tx, embeddings: List[List[float]], k: int) -> List[Dict]:
+        """
+        Transaction function running the vector search for every question embedding and expanding
+        each hit to its parent and source, all in one query.
+        """
+
+        return tx.run(RETRIEVE_QUERY, {'embeddings': embeddings, 'k': k, 'indexName': VECTOR_INDEX_NAME}).data()
+
+    def retrieve_many(self, embeddings: List[List[float]], k: int = 10) -> List[List[Dict]]:
+        """
+        Retrieve the top k Child documents for each question embedding in a single round trip.
+        Each record holds the child text and score, its parent text and its Source metadata.
+        Returns one list of records per question, in the order of the embeddings.
+        """
+
+        results = [[] for _ in embeddings]
+
+        if not embeddings:
+            return results
+
+        embeddings = [list(map(float, embedding)) for embedding in embeddings]
+
+        start = time.perf_counter()
+
+        with self.driver.session(database=self.database_name) as session:
+            records = session.execute_read(self._retrieve, embeddings, k)
+
+        self.latency.record(time.perf_counter() - start)
+        metrics.observe("retrieval_seconds", time.perf_counter() - start)
+
+        return self._group_by_question(records, results)
+
+    @staticmethod
+    def _group_by_question(records: List[Dict], results: List[List[Dict]]) -> List[List[Dict]]:
+        for record in records:
+            results[record.pop('question')].append(record)
+
+        return results
+
+    def iter_child_embeddings(self, batch_size: int = 10_000) -> Iterator[List[Dict]]:
+        """
+        Stream every Child with its embedding and Source metadata, in batches of records.
+        """
+
+        with self.driver.session(database=self.database_name, fetch_size=batch_size) as session:
+            result = session.run(CHILD_EMBEDDINGS_QUERY)
+
+            batch = []
+            for record in result:
+                batch.append(record.data())
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+    def get_parent_texts(self, parent_indexes: List[str]) -> Dict[str, str]:
+        """
+        Fetch the text of the given Parent documents in one round trip.
+        """
+
+        def run(tx):
+            return tx.run(PARENT_TEXTS_QUERY, {'indexes': list(set(parent_indexes))}).data()
+
+        with self.driver.session(database=self.database_name) as session:
+            records = session.execute_read(run)
+
+        return {record['index']: record['text'] for record in records}
+
+    def retrieve(self, embedding: List[float], k: int = 10) -> List[Dict]:
+        """
+        Retrieve the top k Child documents for one question embedding, see retrieve_many.
+        """
+
+        return self.retrieve_many([embedding], k=k)[0]
+
+    def estimate_filter(self, playlist_id: str = None, published_after: str = None, published_before: str = None) -> Tuple[float, int]:
+        """
+        Estimate the share of Sources a filter keeps and, from it, the number of matching Child nodes.
+        The counts are cached for `selectivity_ttl` seconds per filter.
+        """
+
+        predicate, parameters = source_filter(playlist_id, published_after, published_before)
+        key = self._selectivity_key(predicate, parameters)
+
+        estimate = self._cached_selectivity(key)
+        if estimate is None:
+
+            def run(tx):
+                return tx.run(filter_selectivity_query(predicate), parameters).data()
+
+            with self.driver.session(database=self.database_name) as session:
+                records = session.execute_read(run)
+
+            estimate = self._store_selectivity(key, records)
+
+        return estimate
+
+    @staticmethod
+    def _filtered_search(tx, query: str, parameters: Dict) -> List[Dict]:
+        return tx.run(query, parameters).data()
+
+    def retrieve_filtered(self, embedding: List[float], k: int = 10,
+                          playlist_id: str = None, published_after: str = None, published_before: str = None,
+                          plan: str = "auto") -> List[Dict]:
+        """
+        Retrieve the top k Child documents for one question embedding among those whose Source is in the
+        given playlist and/or was published within the given dates (YYYY-MM-DD, inclusive).
+        The predicates run in the database. `plan` is "auto", "overfetch" or "exact", see plan_filtered_search.
+        An over-fetch that finds fewer than k matches falls back to the exact scan.
+        Returns records in the format of retrieve.
+        """
+
+        predicate, parameters = source_filter(playlist_id, published_after, published_before)
+        selectivity, matching_children = self.estimate_filter(playlist_id, published_after, published_before)
+
+        plan, fetch = self.plan_filtered_search(k, selectivity, matching_children, plan)
+        embedding = list(map(float, embedding))
+        start = time.perf_counter()
+
+        with self.driver.session(database=self.database_name) as session:
+            if plan == "overfetch":
+                records = session.execute_read(self._filtered_search,
+                                               *filtered_search_request(plan, predicate, parameters, embedding, k, fetch))
+                if self._needs_exact_scan(records, k, matching_children):
+                    plan = "exact"
+
+            if plan == "exact":
+                records = session.execute_read(self._filtered_search,
+                                               *filtered_search_request(plan, predicate, parameters, embedding, k))
+
+        self._record_filtered_search(start, plan)
+
+        return records
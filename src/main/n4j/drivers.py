@@ -1,10 +1,83 @@
-from neo4j import GraphDatabase
+from typing import Any, Dict
+import os
 
-def init_driver(uri, username, password):
+from neo4j import GraphDatabase, AsyncGraphDatabase
+from neo4j.exceptions import ConfigurationError
+
+# driver setting -> (environment variable, type)
+POOL_SETTINGS = {
+    "max_connection_pool_size": ("NEO4J_MAX_CONNECTION_POOL_SIZE", int),
+    "connection_acquisition_timeout": ("NEO4J_CONNECTION_ACQUISITION_TIMEOUT", float),
+    "fetch_size": ("NEO4J_FETCH_SIZE", int),
+    "liveness_check_timeout": ("NEO4J_LIVENESS_CHECK_TIMEOUT", float),
+    "max_connection_lifetime": ("NEO4J_MAX_CONNECTION_LIFETIME", float),
+}
+
+def pool_config_from_env() -> Dict[str, Any]:
+    """
+    Connection pool settings from the environment variables in POOL_SETTINGS. Unset variables are left to the driver defaults.
+    """
+
+    config = {}
+    for setting, (variable, cast) in POOL_SETTINGS.items():
+        if os.environ.get(variable):
+            config[setting] = cast(os.environ[variable])
+    return config
+
+def _create(factory, uri: str, username: str, password: str, config: Dict[str, Any]):
+    config = {setting: value for setting, value in config.items() if value is not None}
+
+    try:
+        return factory.driver(uri, auth=(username, password), **config)
+
+    except ConfigurationError as err:
+        # liveness_check_timeout needs neo4j driver 5.15 or later
+        if "liveness_check_timeout" not in str(err):
+            raise
+        print("liveness_check_timeout is not supported by this neo4j driver version, idle connections are not checked")
+        config.pop("liveness_check_timeout")
+        return factory.driver(uri, auth=(username, password), **config)
+
+def init_driver(uri, username, password,
+                max_connection_pool_size: int = None,
+                connection_acquisition_timeout: float = None,
+                fetch_size: int = None,
+                liveness_check_timeout: float = None,
+                max_connection_lifetime: float = None):
     """
         Initiate the Neo4j Driver
+        Settings left as None use the driver defaults:
+            max_connection_pool_size        connections kept per server
+            connection_acquisition_timeout  seconds to wait for a free connection before failing
+            fetch_size                      records fetched per batch when streaming results
+            liveness_check_timeout          idle seconds after which a pooled connection is checked before use
+            max_connection_lifetime         seconds after which a pooled connection is replaced
     """
-    d = GraphDatabase.driver(uri, auth=(username, password))
+    d = _create(GraphDatabase, uri, username, password,
+                {"max_connection_pool_size": max_connection_pool_size,
+                 "connection_acquisition_timeout": connection_acquisition_timeout,
+                 "fetch_size": fetch_size,
+                 "liveness_check_timeout": liveness_check_timeout,
+                 "max_connection_lifetime": max_connection_lifetime})
     d.verify_connectivity()
     print('driver created')
-    return d
\ No newline at end of file
+    return d
+
+async def init_async_driver(uri, username, password,
+                            max_connection_pool_size: int = None,
+                            connection_acquisition_timeout: float = None,
+                            fetch_size: int = None,
+                            liveness_check_timeout: float = None,
+                            max_connection_lifetime: float = None):
+    """
+        Initiate the async Neo4j Driver, with the same settings as init_driver
+    """
+    d = _create(AsyncGraphDatabase, uri, username, password,
+                {"max_connection_pool_size": max_connection_pool_size,
+                 "connection_acquisition_timeout": connection_acquisition_timeout,
+                 "fetch_size": fetch_size,
+                 "liveness_check_timeout": liveness_check_timeout,
+                 "max_connection_lifetime": max_connection_lifetime})
+    await d.verify_connectivity()
+    print('async driver created')
+    return d
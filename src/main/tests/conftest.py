@@ -0,0 +1,26 @@
+"""
+The modules under src/main are imported as top-level packages (tools, n4j, utils, benchmarks), as when running from src/main.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def offline_splitters(monkeypatch):
+    """
+    Split parents by characters instead of tiktoken tokens, whose encoding is downloaded on first use.
+    """
+
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    import tools.chunker
+
+    def build_splitters(config):
+        parent_chunk_size, parent_chunk_overlap, child_chunk_size, child_chunk_overlap = config
+        return (RecursiveCharacterTextSplitter(chunk_size=parent_chunk_size * 4, chunk_overlap=parent_chunk_overlap * 4),
+                RecursiveCharacterTextSplitter(chunk_size=child_chunk_size, chunk_overlap=child_chunk_overlap))
+
+    monkeypatch.setattr(tools.chunker, "_build_splitters", build_splitters)
@@ -0,0 +1,126 @@
+from app.app import RAGPipeline
+from app.llm import LLM
+from benchmarks.corpus import synthetic_rows
+from benchmarks.fakes import FakeDriver, FakeHashingEmbeddings, FakeLLM
+from n4j.communicator import GraphReader, GraphWriter
+from tools import answer_cache
+from tools.answer_cache import AnswerCache
+from tools.embedding import EmbeddingService
+
+
+def context(url: str):
+    return {"url": url, "text": "excerpt", "parent_text": "review"}
+
+
+def source(url: str, playlist_id: str, publish_date: str = "2020-06-01"):
+    return {"url": url, "playlist_id": playlist_id, "publish_date": publish_date}
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1_000.0]
+    monkeypatch.setattr(answer_cache.time, "monotonic", lambda: now[0])
+    cache = AnswerCache(ttl=10.0)
+    cache.put("What about Kid A?", [1.0, 0.0], [], "a classic")
+
+    now[0] += 5.0
+    assert cache.get("what about kid a")['answer'] == "a classic"
+
+    now[0] += 10.0
+    assert cache.get("what about kid a") is None
+    assert cache.get_similar("what about kid a", [1.0, 0.0]) is None
+    assert cache.stats['expirations'] == 1
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AnswerCache(max_entries=2)
+    cache.put("first", [1.0, 0.0, 0.0], [], "1")
+    cache.put("second", [0.0, 1.0, 0.0], [], "2")
+    cache.get("first")
+
+    cache.put("third", [0.0, 0.0, 1.0], [], "3")
+
+    assert cache.get("second") is None
+    assert cache.get("first")['answer'] == "1"
+    assert cache.get("third")['answer'] == "3"
+    assert cache.stats['evictions'] == 1
+
+
+def test_semantic_hit_is_not_stored_under_the_new_question():
+    cache = AnswerCache(similarity_threshold=0.9)
+    cache.put("What did he think of Kid A?", [1.0, 0.1], [], "a classic")
+
+    entry = cache.get_similar("What did he think of Amnesiac?", [1.0, 0.12])
+
+    assert entry['question'] == "What did he think of Kid A?"
+    assert cache.get("What did he think of Amnesiac?") is None
+    assert cache.get_similar("Something else entirely", [0.0, 1.0]) is None
+
+
+def test_lookups_are_isolated_by_scope():
+    cache = AnswerCache()
+    cache.put("best album?", [1.0, 0.0], [context("a")], "from playlist 1", scope=("playlist-1", None, None))
+    cache.put("best album?", [1.0, 0.0], [context("b")], "from playlist 2", scope=("playlist-2", None, None))
+
+    assert cache.get("best album?", ("playlist-1", None, None))['answer'] == "from playlist 1"
+    assert cache.get("best album?", ("playlist-2", None, None))['answer'] == "from playlist 2"
+    assert cache.get("best album?") is None
+    assert cache.get_similar("best album?", [1.0, 0.0], ("playlist-3", None, None)) is None
+
+
+def test_load_drops_citing_entries_and_matching_scopes():
+    cache = AnswerCache()
+    cache.put("cited", [1.0, 0.0], [context("a")], "from a", scope=("playlist-1", None, None))
+    cache.put("nothing found", [0.0, 1.0], [], "no information", scope=("playlist-2", None, None))
+    cache.put("recent", [1.0, 1.0], [], "no information", scope=(None, "2021-01-01", None))
+
+    cache.on_load([source("b", "playlist-2")], [], [])
+
+    assert cache.get("nothing found", ("playlist-2", None, None)) is None
+    assert cache.get("cited", ("playlist-1", None, None)) is not None
+    assert cache.get("recent", (None, "2021-01-01", None)) is not None
+
+    # a Source moved to another playlist still drops the entries citing it
+    cache.on_load([source("a", "playlist-3")], [], [])
+
+    assert cache.get("cited", ("playlist-1", None, None)) is None
+    assert cache.get("recent", (None, "2021-01-01", None)) is not None
+    assert cache.stats['invalidations'] == 2
+
+
+def test_deleted_sources_drop_citing_entries():
+    writer = GraphWriter(driver=FakeDriver())
+    cache = AnswerCache()
+    writer.add_delete_listener(cache.on_delete)
+    cache.put("cited", [1.0, 0.0], [context("a")], "from a")
+    cache.put("other", [0.0, 1.0], [context("b")], "from b")
+
+    writer.delete_sources(["a"])
+
+    assert cache.get("cited") is None
+    assert cache.get("other") is not None
+
+
+def test_pipeline_answers_again_once_a_matching_source_is_loaded():
+    driver = FakeDriver()
+    writer = GraphWriter(driver=driver)
+    writer.load_nodes_normalized(synthetic_rows(4, dimensions=16, playlist_id="playlist-1"))
+
+    llm = FakeLLM()
+    pipeline = RAGPipeline(embedding_service=EmbeddingService(embeddings=FakeHashingEmbeddings(16)),
+                           reader=GraphReader(driver=driver), llm=LLM(llm=llm), cache=AnswerCache(), writer=writer, k=3)
+
+    first = pipeline.answer("What was the best album?", playlist_id="playlist-2")
+    assert first['contexts'] == [] and first['cached'] is None
+    assert pipeline.answer("what was the best album", playlist_id="playlist-2")['cached'] == "exact"
+    assert pipeline.answer("What was the best album?")['cached'] is None
+    assert llm.calls == 2
+
+    writer.load_nodes_normalized(synthetic_rows(2, dimensions=16, playlist_id="playlist-2", seed=1))
+
+    again = pipeline.answer("What was the best album?", playlist_id="playlist-2")
+    assert again['cached'] is None
+    assert again['contexts'] and all(record['playlist_id'] == "playlist-2" for record in again['contexts'])
+    # the unfiltered question can retrieve the new nodes too
+    assert pipeline.answer("What was the best album?")['cached'] is None
+    assert llm.calls == 4
@@ -0,0 +1,106 @@
+import json
+
+import numpy as np
+import pytest
+
+from benchmarks.corpus import synthetic_transcript
+from benchmarks.fakes import FakeBucket, FakeDriver
+from n4j.communicator import GraphWriter
+from tools.artifact import ChunkArtifact
+from tools.chunker import Chunker
+from tools.packed_transcripts import PackedTranscriptStore
+from tools.pipeline import chunk_to_artifact, load_artifact
+
+PLAYLIST = "playlist"
+IDS = [f"video{v}" for v in range(4)]
+
+
+def transcript(video_id: str) -> str:
+    return json.dumps({"video_id": video_id, "title": video_id, "publish_date": "2020-01-01",
+                       "transcript": synthetic_transcript(300, seed=int(video_id[-1]))})
+
+
+@pytest.fixture(params=["blobs", "packed"])
+def bucket(request):
+    bucket = FakeBucket()
+    if request.param == "blobs":
+        for video_id in IDS:
+            bucket.blob("youtube/transcripts/"+PLAYLIST+"/"+video_id+".json").upload_from_string(transcript(video_id))
+    else:
+        with PackedTranscriptStore(bucket, PLAYLIST) as store:
+            for video_id in IDS:
+                store.add(video_id, transcript(video_id))
+    return bucket
+
+
+def reading_chunker(bucket: FakeBucket, read: list) -> Chunker:
+    """
+    Chunker that records the ids of the transcripts it downloads.
+    """
+
+    chunker = Chunker(bucket=bucket)
+    iter_documents = chunker._iter_youtube_transcripts_as_langchain_docs
+
+    def recording(*args, **kwargs):
+        for document in iter_documents(*args, **kwargs):
+            read.append(document.metadata['video_id'])
+            yield document
+
+    chunker._iter_youtube_transcripts_as_langchain_docs = recording
+    return chunker
+
+
+def test_restart_only_reads_videos_missing_from_the_artifact(bucket, tmp_path, offline_splitters):
+    artifact = ChunkArtifact(str(tmp_path / "artifact"))
+    # an interrupted run that committed the first two videos
+    artifact.append_rows(list(Chunker(bucket=bucket).iter_chunks(ids=IDS[:2], playlist_title=PLAYLIST)))
+
+    read = []
+    appended = chunk_to_artifact(reading_chunker(bucket, read), artifact, PLAYLIST)
+
+    assert sorted(read) == IDS[2:]
+    assert appended > 0
+    assert artifact.video_ids() == set(IDS)
+    assert artifact.chunked
+
+
+def test_restart_with_every_video_chunked_reads_nothing(bucket, tmp_path, offline_splitters):
+    artifact = ChunkArtifact(str(tmp_path / "artifact"))
+    artifact.append_rows(list(Chunker(bucket=bucket).iter_chunks(ids=IDS[:2], playlist_title=PLAYLIST)))
+
+    read = []
+    assert chunk_to_artifact(reading_chunker(bucket, read), artifact, PLAYLIST, ids=IDS[:2]) == 0
+    assert read == []
+    assert artifact.chunked
+
+
+class FailingOnceWriter(GraphWriter):
+    """
+    GraphWriter whose `fail_at`-th load fails, as load_nodes reports a ConstraintError.
+    """
+
+    def __init__(self, driver: FakeDriver, fail_at: int) -> None:
+        super().__init__(driver=driver)
+        self.loads = 0
+        self.fail_at = fail_at
+
+    def load_nodes(self, data, replace_sources=None) -> bool:
+        self.loads += 1
+        if self.loads == self.fail_at:
+            return False
+        return super().load_nodes(data, replace_sources)
+
+
+def test_failed_load_keeps_the_checkpoint(bucket, tmp_path, offline_splitters):
+    artifact = ChunkArtifact(str(tmp_path / "artifact"), dimensions=4)
+    chunk_to_artifact(Chunker(bucket=bucket), artifact, PLAYLIST)
+    artifact.append_embeddings(np.ones((artifact.rows, 4), dtype=np.float32))
+    driver = FakeDriver()
+
+    loaded = load_artifact(artifact, FailingOnceWriter(driver, fail_at=2), batch_size=10)
+
+    assert loaded == artifact.loaded == 10
+    assert len(driver.graph.children) == 10
+
+    assert load_artifact(artifact, GraphWriter(driver=driver), batch_size=10) == artifact.rows - 10
+    assert artifact.loaded == artifact.rows == len(driver.graph.children)
@@ -0,0 +1,75 @@
+import pytest
+from neo4j.exceptions import AuthError, ClientError, ConstraintError, ServiceUnavailable, TransientError
+
+from benchmarks.corpus import synthetic_rows
+from benchmarks.fakes import FakeDriver
+from n4j.bulk_loader import BulkLoader, BulkLoadError
+from n4j.communicator import GraphWriter
+
+
+class FailingWriter(GraphWriter):
+    """
+    GraphWriter whose normalized writes raise `error` for every batch with a child in `failing`.
+    """
+
+    error = None
+    failing = set()
+
+    @staticmethod
+    def _write_normalized(tx, sources, parents, children):
+        if any(child['index'] in FailingWriter.failing for child in children):
+            raise FailingWriter.error
+        GraphWriter._write_normalized(tx, sources, parents, children)
+
+
+@pytest.fixture
+def rows():
+    return synthetic_rows(5, parents_per_video=2, children_per_parent=10, dimensions=8)
+
+
+def loader(error, failing, **kwargs):
+    FailingWriter.error = error
+    FailingWriter.failing = set(failing)
+    driver = FakeDriver()
+    return BulkLoader(FailingWriter(driver=driver), max_retries=0, **kwargs), driver.graph
+
+
+@pytest.mark.parametrize("error", [TransientError("deadlock"), ServiceUnavailable("database down")])
+def test_exhausted_retries_raise_with_the_progress_so_far(rows, error):
+    bulk_loader, graph = loader(error, [rows[45]['child_index']], max_workers=1,
+                                initial_batch_size=20, min_batch_size=20, max_batch_size=20)
+
+    with pytest.raises(BulkLoadError) as raised:
+        bulk_loader.load(rows)
+
+    assert raised.value.rows == rows[40:60]
+    assert isinstance(raised.value.__cause__, type(error))
+    assert raised.value.report.splits == 0
+    assert not raised.value.report.failed_rows
+    # a batch already in flight next to the failing one may still finish, none is started after it
+    assert raised.value.report.rows_loaded == len(graph.children) in (40, 60)
+    assert not {row['child_index'] for row in rows[40:60] + rows[80:]} & set(graph.children)
+
+
+@pytest.mark.parametrize("error", [ClientError("bad row"), ConstraintError("duplicate index")])
+def test_data_errors_isolate_the_failing_row(rows, error):
+    bulk_loader, graph = loader(error, [rows[45]['child_index']], max_workers=2, initial_batch_size=20)
+
+    report = bulk_loader.load(rows)
+
+    assert report.failed_rows == [rows[45]]
+    assert report.rows_loaded == len(rows) - 1
+    assert report.splits > 0
+    assert len(graph.children) == len(rows) - 1
+
+
+@pytest.mark.parametrize("error", [TypeError("embedding is not a list"), ValueError("bad value"), AuthError("expired")])
+def test_other_errors_propagate_without_splitting(rows, error):
+    bulk_loader, graph = loader(error, [rows[45]['child_index']], max_workers=1,
+                                initial_batch_size=20, min_batch_size=20, max_batch_size=20)
+
+    with pytest.raises(type(error)):
+        bulk_loader.load(rows)
+
+    assert bulk_loader._report.splits == 0
+    assert not bulk_loader._report.failed_rows
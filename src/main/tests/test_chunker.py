@@ -0,0 +1,31 @@
+import json
+
+import numpy as np
+
+from benchmarks.corpus import synthetic_transcript
+from benchmarks.fakes import FakeBucket
+from tools.chunker import Chunker
+from utils.utils import prepare_new_nodes
+
+PLAYLIST = "playlist"
+
+
+def test_chunks_as_list_returns_fresh_rows_for_the_chunked_videos(offline_splitters):
+    bucket = FakeBucket()
+    for v in range(2):
+        bucket.blob(f"youtube/transcripts/{PLAYLIST}/video{v}.json").upload_from_string(
+            json.dumps({"video_id": f"video{v}", "title": f"video{v}", "publish_date": "2020-01-01",
+                        "transcript": synthetic_transcript(300, seed=v)}))
+
+    chunker = Chunker(bucket=bucket)
+    chunker.chunk_youtube_transcripts(ids=["video0"], playlist_title=PLAYLIST)
+    rows = chunker.chunks_as_list
+    prepare_new_nodes(rows, embedding_service=None, embeddings=np.ones((len(rows), 4), dtype=np.float32))
+    rows[0]['transcript'] = None
+
+    again = chunker.chunks_as_list
+    assert again == [Chunker._chunk_as_row(chunk) for chunk in chunker._chunked_documents]
+    assert not any('embedding' in row for row in again)
+
+    chunker.chunk_youtube_transcripts(ids=["video1"], playlist_title=PLAYLIST)
+    assert {row['video_id'] for row in chunker.chunks_as_list} == {"video0", "video1"}
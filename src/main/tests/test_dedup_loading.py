@@ -0,0 +1,70 @@
+import csv
+import os
+
+import numpy as np
+
+from benchmarks.fakes import FakeDriver
+from n4j.bulk_import import BulkImportExporter
+from n4j.communicator import GraphWriter
+from tools.dedup import COLLAPSE, NearDuplicateFilter
+from tools.vector_index import LocalVectorIndex
+from utils.utils import parent_index, prepare_new_nodes
+
+OUTRO = "so that's my review what did you think of this album let me know in the comments below"
+
+
+def rows(video_id: str, body: str):
+    parent = body + " " + OUTRO
+    index = parent_index(video_id, 0, parent)
+    return [{"url": "https://www.youtube.com/watch?v="+video_id, "video_id": video_id, "parent_index": index,
+             "child_offset": offset, "parent_transcript": parent, "title": video_id, "publish_date": "2020-01-01",
+             "transcript": text}
+            for offset, text in enumerate([body, OUTRO])]
+
+
+def collapsed_nodes(dedup: NearDuplicateFilter, video_id: str, body: str):
+    batch = dedup.filter_rows(rows(video_id, body))
+    embeddings = np.ones((sum(row.get('duplicate_of') is None for row in batch), 4), dtype=np.float32)
+    return prepare_new_nodes(batch, embedding_service=None, playlist_id="playlist", embeddings=embeddings)
+
+
+def test_load_listener_skips_collapsed_children(tmp_path):
+    dedup = NearDuplicateFilter(mode=COLLAPSE)
+    index = LocalVectorIndex(str(tmp_path), dimensions=4)
+    writer = GraphWriter(driver=FakeDriver())
+    writer.add_load_listener(index.on_nodes_loaded)
+
+    writer.load_nodes(collapsed_nodes(dedup, "first", "heavy synth production and a great closing track"))
+    second = collapsed_nodes(dedup, "second", "rapper verses and features all over the tracklist")
+    assert any(row.get('duplicate_of') for row in second)
+
+    writer.load_nodes(second)
+    writer.load_nodes_normalized(second)
+
+    assert len(index) == 3
+    assert all(record['text'] for record in index.records)
+
+
+def test_exporter_writes_edges_of_collapsed_rows(tmp_path):
+    dedup = NearDuplicateFilter(mode=COLLAPSE)
+    first = collapsed_nodes(dedup, "first", "heavy synth production and a great closing track")
+    second = collapsed_nodes(dedup, "second", "rapper verses and features all over the tracklist")
+
+    with BulkImportExporter(str(tmp_path / "together")) as exporter:
+        exporter.write(first)
+        exporter.write(second)
+
+    assert exporter.counts["child.csv"] == 3
+    assert exporter.counts["has_parent.csv"] == 4
+    assert exporter.skipped_duplicates == 0
+
+    # the canonical child of the collapsed row was exported elsewhere
+    with BulkImportExporter(str(tmp_path / "alone")) as exporter:
+        exporter.write(second)
+
+    assert exporter.counts["child.csv"] == 1
+    assert exporter.counts["has_parent.csv"] == 1
+    assert exporter.skipped_duplicates == 1
+
+    with open(os.path.join(tmp_path, "alone", "child.csv"), newline="") as f:
+        assert all(row[2] for row in csv.reader(f))
@@ -0,0 +1,70 @@
+import numpy as np
+
+from benchmarks.fakes import FakeBucket, FakeDriver
+from n4j.communicator import GraphWriter
+from tools import embedding_cache
+from tools.embedding_cache import CachedEmbeddingService, EmbeddingCache
+from tools.ingest import IngestionScheduler
+
+
+class Clock:
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def time(self) -> float:
+        return self.now
+
+
+def last_access(cache: EmbeddingCache):
+    return dict(cache._db.execute("SELECT key, last_access FROM embeddings").fetchall())
+
+
+def test_memory_hits_update_last_access_in_batches(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(embedding_cache.time, "time", clock.time)
+    cache = EmbeddingCache(path=str(tmp_path / "cache.sqlite"), touch_batch_size=2)
+
+    clock.now = 1.0
+    cache.put_many(["a", "b", "c"], np.ones((3, 4), dtype=np.float32))
+
+    clock.now = 2.0
+    cache.get_many(["a"])
+    assert last_access(cache)["a"] == 1.0
+
+    cache.get_many(["b"])
+    assert last_access(cache) == {"a": 2.0, "b": 2.0, "c": 1.0}
+    assert cache.stats['memory_hits'] == 2
+
+    clock.now = 3.0
+    cache.get_many(["c"])
+    cache.close()
+    assert EmbeddingCache(path=str(tmp_path / "cache.sqlite")).get_many(["c"])
+
+
+def test_disk_eviction_keeps_vectors_used_from_memory(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(embedding_cache.time, "time", clock.time)
+    # room for three vectors of 4 float32, an eviction frees one
+    cache = EmbeddingCache(path=str(tmp_path / "cache.sqlite"), max_disk_bytes=56)
+
+    for clock.now, key in enumerate(["a", "b", "c"], start=1):
+        cache.put_many([key], np.ones((1, 4), dtype=np.float32))
+
+    clock.now = 10.0
+    cache.get_many(["a"])
+    cache.put_many(["d"], np.ones((1, 4), dtype=np.float32))
+
+    assert set(last_access(cache)) == {"a", "c", "d"}
+
+
+def test_scheduler_embeds_through_the_cache_by_default(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    scheduler = IngestionScheduler(bucket=FakeBucket(), writer=GraphWriter(driver=FakeDriver()), io_workers=1, split_processes=1,
+                                   embedding_cache=path)
+    scheduler._start_stages()
+    for stage in scheduler.stages.values():
+        stage.shutdown()
+
+    assert isinstance(scheduler.embedding_service, CachedEmbeddingService)
+    assert scheduler.embedding_service.cache._db is not None
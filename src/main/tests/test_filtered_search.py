@@ -0,0 +1,89 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from benchmarks.corpus import synthetic_rows
+from benchmarks.fakes import FakeAsyncDriver, FakeDriver, FakeGraph
+from n4j.async_communicator import AsyncGraphReader
+from n4j.communicator import FilteredSearchPlanner, GraphReader, GraphWriter, filtered_search_request
+
+FILTERS = [{"playlist_id": "playlist-1"},
+           {"published_after": "2011-01-01"},
+           {"playlist_id": "playlist-0", "published_after": "2012-01-01", "published_before": "2014-12-31"}]
+
+
+@pytest.fixture(scope="module")
+def graph():
+    driver = FakeDriver()
+    writer = GraphWriter(driver=driver)
+    writer.create_indexes(16)
+    for p in range(3):
+        writer.load_nodes_normalized(synthetic_rows(10, dimensions=16, playlist_id=f"playlist-{p}", seed=p))
+    return driver.graph
+
+
+def async_retrieve_filtered(graph: FakeGraph, question, k: int, plan: str, **search_filter):
+
+    async def run():
+        reader = AsyncGraphReader(driver=FakeAsyncDriver(graph=graph))
+        reader.exact_scan_limit = 50
+        return await reader.retrieve_filtered(question, k=k, plan=plan, **search_filter)
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("plan", ["auto", "overfetch", "exact"])
+@pytest.mark.parametrize("search_filter", FILTERS)
+def test_async_reader_matches_sync_reader(graph, plan, search_filter):
+    reader = GraphReader(driver=FakeDriver(graph=graph))
+    reader.exact_scan_limit = 50
+    question = np.random.default_rng(0).uniform(-1, 1, 16).tolist()
+
+    expected = reader.retrieve_filtered(question, k=5, plan=plan, **search_filter)
+
+    assert expected
+    assert async_retrieve_filtered(graph, question, 5, plan, **search_filter) == expected
+
+
+def test_selectivity_is_cached_per_filter(graph):
+    driver = FakeDriver(graph=graph)
+    reader = GraphReader(driver=driver)
+
+    first = reader.estimate_filter(playlist_id="playlist-1")
+    transactions = driver.transactions
+    assert reader.estimate_filter(playlist_id="playlist-1") == first
+    assert driver.transactions == transactions
+
+    reader.estimate_filter(playlist_id="playlist-2")
+    assert driver.transactions == transactions + 1
+
+    reader.selectivity_ttl = 0.0
+    reader.estimate_filter(playlist_id="playlist-1")
+    assert driver.transactions == transactions + 2
+
+
+def test_plan_filtered_search():
+    reader = AsyncGraphReader()
+    reader.exact_scan_limit = 100
+
+    assert reader.plan_filtered_search(10, 0.5, 50) == ("exact", 0)
+    assert reader.plan_filtered_search(10, 0.5, 1_000) == ("overfetch", 40)
+    # too selective for the index: the candidates needed exceed max_candidates
+    assert reader.plan_filtered_search(10, 0.001, 1_000)[0] == "exact"
+    with pytest.raises(ValueError):
+        reader.plan_filtered_search(10, 0.5, 50, plan="postfilter")
+
+
+def test_planner_records_latency_without_a_reader():
+    planner = FilteredSearchPlanner()
+    planner._record_filtered_search(0.0, "exact")
+    assert planner.latency.summary()['count'] == 1
+
+
+def test_exact_plan_scores_with_the_cosine_function():
+    query, parameters = filtered_search_request("exact", "s.playlist_id = $playlistId", {"playlistId": "playlist-1"}, [3.0, 4.0], k=5)
+
+    assert "vector.similarity.cosine(child.embedding, $questionEmbedding)" in query
+    assert "reduce(" not in query
+    assert parameters == {"playlistId": "playlist-1", "questionEmbedding": [3.0, 4.0], "k": 5}
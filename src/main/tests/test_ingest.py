@@ -0,0 +1,27 @@
+import json
+
+from benchmarks.corpus import synthetic_transcript
+from benchmarks.fakes import FakeBucket, FakeDriver
+from benchmarks.ingest_benchmark import HashingEmbeddingService
+from n4j.communicator import GraphWriter
+from tools.ingest import IngestionScheduler
+
+PLAYLIST = "playlist"
+
+
+def test_scheduler_normalizes_transcripts_before_splitting(offline_splitters):
+    bucket = FakeBucket()
+    for v in range(2):
+        transcript = " ".join(f"{word} um, [Music]" if i % 7 == 0 else word
+                              for i, word in enumerate(synthetic_transcript(400, seed=v).split()))
+        bucket.blob(f"youtube/transcripts/{PLAYLIST}/video{v}.json").upload_from_string(
+            json.dumps({"video_id": f"video{v}", "title": f"video{v}", "publish_date": "2020-01-01", "transcript": transcript}))
+
+    driver = FakeDriver()
+    scheduler = IngestionScheduler(bucket=bucket, embedding_service=HashingEmbeddingService(), writer=GraphWriter(driver=driver),
+                                   io_workers=2, split_processes=1)
+    summary = scheduler.run({PLAYLIST: "playlist-id"})[PLAYLIST]
+
+    assert summary['rows_loaded'] == len(driver.graph.children) > 0
+    texts = [parent['text'] for parent in driver.graph.parents.values()] + [child['text'] for child in driver.graph.children.values()]
+    assert not any("um," in text.split() or "[Music]" in text for text in texts)
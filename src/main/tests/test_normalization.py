@@ -0,0 +1,28 @@
+import pytest
+
+from utils.normalization import DEFAULT_FILLER_WORDS, EXTRA_FILLER_WORDS, TextNormalizer
+from utils.utils import remove_filler_words
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("so um, this album", "so this album"),
+    ("the hooks um. the verses", "the hooks the verses"),
+    ("uh? what was that", "what was that"),
+    ("ah! the drums (um) hit hard", "the drums hit hard"),
+    ("UM... Uh, okay", "okay"),
+    ("hmm, umm okay", "hmm, umm okay"),
+    ("the album drums humming", "the album drums humming"),
+    ("a - b", "a - b"),
+])
+def test_filler_words_are_removed_with_their_punctuation(text, expected):
+    assert remove_filler_words(text) == expected
+
+
+def test_normalizer_removes_caption_artifacts_and_entities():
+    normalizer = TextNormalizer()
+    assert normalizer("[Music] it&#39;s  um, great >> yeah") == "it's great yeah"
+
+
+def test_extra_filler_words_are_opt_in():
+    normalizer = TextNormalizer(filler_words=DEFAULT_FILLER_WORDS + EXTRA_FILLER_WORDS)
+    assert normalizer("hmm, umm okay er the album") == "okay the album"
@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+from benchmarks.fakes import LocalDirectoryBucket
+from tools.packed_transcripts import PackedTranscriptStore, migrate_playlist
+
+
+def transcript(video_id: str, version: int = 0):
+    return json.dumps({"video_id": video_id, "transcript": f"review {video_id} take {version} " * 20})
+
+
+def shard_names(bucket, playlist_title: str):
+    return {blob.name for blob in bucket.list_blobs(prefix=f"youtube/packed/{playlist_title}/shards/")}
+
+
+@pytest.fixture
+def bucket(tmp_path):
+    return LocalDirectoryBucket(str(tmp_path))
+
+
+def test_ranged_reads_match_whole_shard_reads(bucket):
+    ids = [f"video{i}" for i in range(10)]
+    with PackedTranscriptStore(bucket, "playlist", shard_size=4) as store:
+        for video_id in ids:
+            store.add(video_id, transcript(video_id))
+
+    store = PackedTranscriptStore(bucket, "playlist")
+    assert len(shard_names(bucket, "playlist")) == 3
+
+    ranged = store.plan_reads(["video5"])
+    assert ranged == [(None, [("video5", store.index["video5"])])]
+    whole = store.plan_reads(ids)
+    assert all(shard is not None for shard, _ in whole)
+
+    by_range = {video_id: store.read(video_id) for video_id in ids}
+    by_shard = {video_id: result for video_id, result, e in store.read_many(ids, max_workers=2) if e is None}
+
+    assert by_range == by_shard == {video_id: json.loads(transcript(video_id)) for video_id in ids}
+    assert next(store.read_many(["video5"]))[1] == by_range["video5"]
+
+
+def test_readded_video_points_to_its_new_copy(bucket):
+    with PackedTranscriptStore(bucket, "playlist") as store:
+        store.add("video0", transcript("video0"))
+        store.add("video1", transcript("video1"))
+    first = store.transcript_hash("video0")
+
+    with PackedTranscriptStore(bucket, "playlist") as store:
+        store.add("video0", transcript("video0", version=1))
+
+    reopened = PackedTranscriptStore(bucket, "playlist")
+    assert len(reopened) == 2
+    assert reopened.read("video0") == json.loads(transcript("video0", version=1))
+    assert reopened.read("video1") == json.loads(transcript("video1"))
+    assert reopened.transcript_hash("video0") != first
+    # the old copy stays in its shard until compact
+    assert len(shard_names(bucket, "playlist")) == 2
+
+
+def test_compact_deletes_only_stale_shards(bucket):
+    with PackedTranscriptStore(bucket, "playlist", shard_size=2) as store:
+        for video_id in ["video0", "video1", "video2"]:
+            store.add(video_id, transcript(video_id))
+        store.add("video0", transcript("video0", version=1))
+    with PackedTranscriptStore(bucket, "playlist-other") as other:
+        other.add("video9", transcript("video9"))
+    bucket.blob("youtube/transcripts/playlist/video0.json").upload_from_string(transcript("video0"))
+
+    store = PackedTranscriptStore(bucket, "playlist", shard_size=2)
+    before = shard_names(bucket, "playlist")
+    other_shards = shard_names(bucket, "playlist-other")
+
+    deleted = store.compact()
+
+    after = shard_names(bucket, "playlist")
+    assert deleted == len(before) == 2
+    assert not before & after
+    assert after == {entry['shard'] for entry in store.index.values()}
+    assert shard_names(bucket, "playlist-other") == other_shards
+    assert bucket.get_blob("youtube/transcripts/playlist/video0.json") is not None
+
+    reopened = PackedTranscriptStore(bucket, "playlist")
+    assert {video_id: reopened.read(video_id) for video_id in reopened.ids()} == {
+        "video0": json.loads(transcript("video0", version=1)),
+        "video1": json.loads(transcript("video1")),
+        "video2": json.loads(transcript("video2"))}
+
+
+def test_migrate_deletes_blobs_once_verified(bucket):
+    for i in range(3):
+        bucket.blob(f"youtube/transcripts/playlist/video{i}.json").upload_from_string(transcript(f"video{i}"))
+
+    assert migrate_playlist(bucket, "playlist", max_workers=2, delete=True) == {"transcripts": 3, "packed": 3, "deleted": 3}
+    assert not bucket.list_blobs(prefix="youtube/transcripts/playlist/")
+    assert PackedTranscriptStore(bucket, "playlist").read("video2") == json.loads(transcript("video2"))
+
+
+def test_migrate_refuses_to_delete_on_mismatch(bucket):
+    for i in range(3):
+        bucket.blob(f"youtube/transcripts/playlist/video{i}.json").upload_from_string(transcript(f"video{i}"))
+    migrate_playlist(bucket, "playlist", max_workers=2)
+
+    # point video2 at the packed copy of video1, keeping the md5 of its blob so it is not packed again
+    index = json.loads(bucket.blob("youtube/packed/playlist/index.json").download_as_text())
+    index['videos']["video2"] = {**index['videos']["video1"], "md5": index['videos']["video2"]['md5']}
+    bucket.blob("youtube/packed/playlist/index.json").upload_from_string(json.dumps(index))
+
+    with pytest.raises(ValueError, match="video2"):
+        migrate_playlist(bucket, "playlist", max_workers=2, delete=True)
+
+    assert len(bucket.list_blobs(prefix="youtube/transcripts/playlist/")) == 3
@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+from benchmarks.corpus import synthetic_transcript
+from benchmarks.fakes import FakeBucket, FakeDriver
+from benchmarks.ingest_benchmark import HashingEmbeddingService
+from n4j.communicator import GraphWriter
+from tools.chunker import Chunker
+from tools.dedup import DROP, NearDuplicateFilter
+from tools.manifest import IngestionManifest
+from tools.pipeline import stream_playlist_to_graph
+
+PLAYLIST = "playlist"
+
+
+def upload(bucket: FakeBucket, video_id: str, transcript: str) -> None:
+    bucket.blob("youtube/transcripts/"+PLAYLIST+"/"+video_id+".json").upload_from_string(
+        json.dumps({"video_id": video_id, "title": video_id, "publish_date": "2020-01-01", "transcript": transcript}))
+
+
+def ingest(bucket: FakeBucket, writer: GraphWriter, dedup: NearDuplicateFilter = None):
+    manifest = IngestionManifest(bucket, PLAYLIST)
+    summary = stream_playlist_to_graph(Chunker(bucket=bucket), HashingEmbeddingService(), writer, playlist_title=PLAYLIST,
+                                       playlist_id="id", load_batch_size=20, manifest=manifest, dedup=dedup)
+    return summary, IngestionManifest(bucket, PLAYLIST)
+
+
+def parents_of(driver: FakeDriver, video_id: str):
+    return {index for index, parent in driver.graph.parents.items() if parent['url'] == Chunker.video_url(video_id)}
+
+
+@pytest.fixture
+def bucket():
+    bucket = FakeBucket()
+    for v in range(3):
+        upload(bucket, f"video{v}", synthetic_transcript(600, seed=v))
+    return bucket
+
+
+def test_changed_video_replaces_its_documents(bucket, offline_splitters):
+    driver = FakeDriver()
+    writer = GraphWriter(driver=driver)
+
+    summary, manifest = ingest(bucket, writer)
+    assert len(manifest) == 3
+    before = parents_of(driver, "video1")
+    children = len(driver.graph.children)
+
+    upload(bucket, "video1", synthetic_transcript(600, seed=10))
+    summary, manifest = ingest(bucket, writer)
+
+    assert summary['skipped_videos'] == 2
+    after = parents_of(driver, "video1")
+    assert after and not after & before
+    assert not any(child['parent_index'] in before for child in driver.graph.children.values())
+    assert abs(len(driver.graph.children) - children) < children / 3
+
+
+def test_failed_batches_are_not_recorded(bucket, offline_splitters):
+
+    failed = set()
+
+    class FailingWriter(GraphWriter):
+        def load_nodes(self, data, replace_sources=None):
+            if all(row['video_id'] == "video1" for row in data):
+                failed.update(row['video_id'] for row in data)
+                return False
+            return super().load_nodes(data, replace_sources)
+
+    summary, manifest = ingest(bucket, FailingWriter(driver=FakeDriver()))
+
+    assert failed == {"video1"}
+    for video_id in ("video0", "video1", "video2"):
+        assert (manifest.get(video_id) is None) == (video_id in failed)
+
+    summary, manifest = ingest(bucket, GraphWriter(driver=FakeDriver()))
+    assert summary['skipped_videos'] == 3 - len(failed)
+    assert len(manifest) == 3
+
+
+def test_videos_without_rows_are_recorded(bucket, offline_splitters):
+    upload(bucket, "video3", synthetic_transcript(600, seed=0))
+
+    summary, manifest = ingest(bucket, GraphWriter(driver=FakeDriver()), dedup=NearDuplicateFilter(mode=DROP))
+
+    assert summary['near_duplicates_removed'] > 0
+    assert manifest.get("video3") is not None
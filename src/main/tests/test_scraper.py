@@ -0,0 +1,59 @@
+import io
+
+import pandas as pd
+
+from benchmarks.fakes import FakeBlob, FakeBucket, FakeTranscriptApi
+from tools.scraper import Scraper
+
+
+class FakeResponse:
+
+    def __init__(self, data) -> None:
+        self.data = data
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def json(self):
+        return self.data
+
+
+class FakePlaylistSession:
+    """
+    Serves one page of playlist items, newest first, like the YouTube Data API.
+    """
+
+    def __init__(self, videos) -> None:
+        self.videos = videos
+
+    def get(self, url, params=None, **kwargs) -> FakeResponse:
+        return FakeResponse({"pageInfo": {"totalResults": len(self.videos)},
+                             "items": [{"snippet": {"resourceId": {"videoId": video['id']}, "title": video['title'],
+                                                    "publishedAt": video['publish_date']+"T00:00:00Z"}}
+                                       for video in self.videos]})
+
+
+def test_refresh_downloads_the_stored_csv_once(monkeypatch):
+    videos = [{"id": f"video{i}", "title": f"album {i}", "publish_date": f"2020-01-{10 - i:02d}"} for i in range(5)]
+    bucket = FakeBucket()
+    bucket.blob("youtube/playlist.csv").upload_from_string(pd.DataFrame.from_dict(videos[2:]).to_csv(), "text/csv")
+
+    downloads = []
+    download_as_bytes = FakeBlob.download_as_bytes
+
+    def counting_download(blob, *args, **kwargs):
+        downloads.append(blob.name)
+        return download_as_bytes(blob, *args, **kwargs)
+
+    monkeypatch.setattr(FakeBlob, "download_as_bytes", counting_download)
+    monkeypatch.setattr(FakeBlob, "download_as_string", counting_download)
+
+    scraper = Scraper(channel_id="channel", playlist_id="playlist", bucket=bucket, http_session=FakePlaylistSession(videos),
+                      transcript_api=FakeTranscriptApi({video['id']: "some words about the album" for video in videos}))
+    new_videos = scraper.add_new_youtube_urls(video_info_file_name="playlist", transcripts_folder="playlist")
+
+    assert [video['id'] for video in new_videos] == ["video0", "video1"]
+    assert downloads.count("youtube/playlist.csv") == 1
+
+    stored = pd.read_csv(io.BytesIO(download_as_bytes(bucket.blob("youtube/playlist.csv"))))
+    assert list(stored['id']) == [video['id'] for video in videos]
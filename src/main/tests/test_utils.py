@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from utils.utils import prepare_new_nodes
+
+
+class TruncatingEmbeddingService:
+    """
+    Embedding service that drops the last text, like a provider silently skipping an input.
+    """
+
+    def get_document_embeddings(self, texts, batch_size=256, n_process=1):
+        return np.ones((len(texts) - 1, 4), dtype=np.float32)
+
+
+def chunks(n: int):
+    return [{"parent_index": "parent", "child_offset": i, "transcript": f"chunk {i}"} for i in range(n)]
+
+
+def test_embeddings_are_matched_to_chunks_to_embed():
+    data = chunks(3)
+    data[1]['duplicate_of'] = "canonical"
+
+    nodes = prepare_new_nodes(data, embedding_service=None, embeddings=np.ones((2, 4), dtype=np.float32))
+
+    assert [node['embedding'] is None for node in nodes] == [False, True, False]
+
+
+def test_missing_precomputed_embeddings_raise():
+    with pytest.raises(ValueError, match="2 embeddings for 3 chunks"):
+        prepare_new_nodes(chunks(3), embedding_service=None, embeddings=np.ones((2, 4), dtype=np.float32))
+
+
+def test_embedding_service_returning_too_few_raises():
+    with pytest.raises(ValueError, match="2 embeddings for 3 chunks"):
+        prepare_new_nodes(chunks(3), embedding_service=TruncatingEmbeddingService())
+
+
+def test_chunk_rows_are_left_unchanged():
+    data = chunks(2)
+
+    nodes = prepare_new_nodes(data, embedding_service=None, playlist_id="playlist", embeddings=np.ones((2, 4), dtype=np.float32))
+
+    assert data == chunks(2)
+    assert all(node['playlist_id'] == "playlist" and node['child_index'] for node in nodes)
@@ -0,0 +1,80 @@
+import numpy as np
+
+from benchmarks.fakes import FakeDriver
+from n4j.communicator import GraphWriter
+from tools.vector_index import LocalVectorIndex
+
+
+def records(start: int, stop: int, rng: np.random.Generator, text: str = "text"):
+    return [{"index": f"child{i}", "text": f"{text} {i}", "parent_index": f"parent{i}", "url": f"url{i}",
+             "embedding": rng.normal(size=8).tolist()} for i in range(start, stop)]
+
+
+def test_incremental_adds_survive_reopen(tmp_path):
+    rng = np.random.default_rng(0)
+    index = LocalVectorIndex(str(tmp_path), dimensions=8)
+    index.add(records(0, 50, rng))
+    index.build_ivf(n_lists=4)
+
+    added = records(50, 60, rng)
+    replaced = records(0, 5, rng, text="replaced")
+    assert index.add(added + replaced) == 10
+
+    reopened = LocalVectorIndex(str(tmp_path), dimensions=8)
+
+    assert len(reopened) == 60
+    assert [record['text'] for record in reopened.records[:5]] == [f"replaced {i}" for i in range(5)]
+    assert np.array_equal(reopened._assignments, index._assignments)
+    assert len(reopened._assignments) == 60
+
+    for record in added + replaced:
+        hit = reopened.search(record['embedding'], k=1, n_probe=1)[0]
+        assert hit['index'] == record['index']
+        assert hit['text'] == record['text']
+
+
+def test_missing_assignments_are_recomputed_on_open(tmp_path):
+    rng = np.random.default_rng(1)
+    index = LocalVectorIndex(str(tmp_path), dimensions=8)
+    index.add(records(0, 30, rng))
+    index.build_ivf(n_lists=3)
+
+    # a clustering saved before the last rows were added
+    np.savez(index._ivf_path, centroids=index.centroids, assignments=index._assignments[:20])
+
+    reopened = LocalVectorIndex(str(tmp_path), dimensions=8)
+    assert np.array_equal(reopened._assignments, index._assignments)
+
+
+def rows(url: str, version: str, rng: np.random.Generator):
+    return [{"url": url, "title": url, "video_id": url, "publish_date": "2020-01-01",
+             "parent_index": f"{url}-{version}", "parent_transcript": f"{url} {version}",
+             "child_index": f"{url}-{version}-{i}", "transcript": f"{version} {i}", "embedding": rng.normal(size=8).tolist()}
+            for i in range(5)]
+
+
+def test_replaced_source_children_are_no_longer_returned(tmp_path):
+    rng = np.random.default_rng(2)
+    index = LocalVectorIndex(str(tmp_path), dimensions=8)
+    writer = GraphWriter(driver=FakeDriver())
+    writer.add_load_listener(index.on_nodes_loaded)
+    writer.add_delete_listener(index.remove_sources)
+
+    old = rows("changed", "old", rng)
+    kept = rows("kept", "old", rng)
+    writer.load_nodes(old + kept)
+    index.build_ivf(n_lists=2)
+
+    new = rows("changed", "new", rng)
+    writer.load_nodes(new, replace_sources=["changed"])
+
+    for reopened in (index, LocalVectorIndex(str(tmp_path), dimensions=8)):
+        assert sorted(reopened.ids) == sorted(row['child_index'] for row in kept + new)
+        assert len(reopened._assignments) == len(reopened)
+        for row in old:
+            assert all(hit['index'] != row['child_index'] for hit in reopened.search(row['embedding'], k=len(reopened)))
+        for row in kept + new:
+            assert reopened.search(row['embedding'], k=1, n_probe=2)[0]['index'] == row['child_index']
+
+    writer.delete_sources(["kept"])
+    assert sorted(index.ids) == sorted(row['child_index'] for row in new)
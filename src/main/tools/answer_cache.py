@@ -0,0 +1,283 @@
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from collections import OrderedDict
+import itertools
+import re
+import threading
+import time
+
+import numpy as np
+
+from utils.metrics import metrics
+
+
+def scope_matches(scope: Tuple, source: Dict) -> bool:
+    """
+    Whether a Source passes the search filter of a scope, (playlist_id, published_after, published_before),
+    with None or missing members not filtering. Dates are compared as YYYY-MM-DD strings, both bounds inclusive.
+    """
+
+    playlist_id, published_after, published_before = (tuple(scope) + (None, None, None))[:3]
+    publish_date = source.get('publish_date')
+
+    if playlist_id is not None and source.get('playlist_id') != playlist_id:
+        return False
+    if published_after is not None and (publish_date is None or publish_date < published_after):
+        return False
+    if published_before is not None and (publish_date is None or publish_date > published_before):
+        return False
+    return True
+
+
+class AnswerCache:
+    """
+    Question-level cache for the RAG pipeline, holding each question's embedding, retrieved contexts and answer.
+    Two lookup levels share the same entries:
+    1. exact: keyed by the normalized question text, see normalize_question.
+    2. semantic: reuses the entry of an earlier question whose embedding has a cosine similarity
+       of at least `similarity_threshold` with the new one. A semantic hit is not stored under the new question,
+       so a wrong match is not repeated as an exact hit. Lowering the threshold trades wrong answers for hits,
+       see benchmarks/rag_cache_benchmark.py.
+    Lookups only match entries of the same `scope`, the search filter (playlist_id, published_after, published_before)
+    the contexts were retrieved with, see scope_matches.
+
+    Entries expire `ttl` seconds after they were stored and the least recently used are evicted beyond `max_entries`.
+    Register on_load with GraphWriter.add_load_listener to drop entries when nodes are loaded: those with contexts
+    from a loaded Source, and those whose scope the loaded Source matches, since its nodes could be retrieved
+    for them now, including answers that found nothing. With `invalidate_all_on_load`, every load clears the cache.
+    Register on_delete with GraphWriter.add_delete_listener to drop the entries citing deleted or replaced Sources.
+    """
+
+    def __init__(self, max_entries: int = 1_000, ttl: float = 3_600.0, similarity_threshold: float = 0.95,
+                 invalidate_all_on_load: bool = False) -> None:
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.invalidate_all_on_load = invalidate_all_on_load
+
+        self._lock = threading.RLock()
+        self._ids = itertools.count()
+        # entry id -> entry, least recently used first
+        self._entries = OrderedDict()
+        # (scope, normalized question) -> entry id
+        self._exact = {}
+        # source url -> entry ids
+        self._by_source = {}
+        # scope -> (entry ids, unit embedding matrix), rebuilt after a change
+        self._semantic = {}
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        """
+        Lowercase, drop punctuation and collapse whitespace, e.g. "What's the score of  Kid A?" -> "whats the score of kid a".
+        """
+
+        question = re.sub(r"[^\w\s]", "", question.lower())
+        return " ".join(question.split())
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        requests = self.exact_hits + self.semantic_hits + self.misses
+        return {"exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "hit_rate": round((self.exact_hits + self.semantic_hits) / requests, 4) if requests else 0.0,
+                "entries": len(self._entries)}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, question: str, scope: Tuple = ()) -> Optional[Dict[str, Any]]:
+        """
+        Exact lookup of the normalized question. Does not count a miss, as the semantic level may still hit.
+        """
+
+        key = (scope, self.normalize_question(question))
+
+        with self._lock:
+            entry = self._live(self._exact.get(key))
+            if entry is None:
+                return None
+
+            self._entries.move_to_end(entry['id'])
+            self.exact_hits += 1
+
+        metrics.inc("answer_cache_hits_total", level="exact")
+        return entry
+
+    def get_similar(self, question: str, embedding: List[float], scope: Tuple = ()) -> Optional[Dict[str, Any]]:
+        """
+        Semantic lookup of the most similar earlier question within the threshold.
+        """
+
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+
+        with self._lock:
+            entry = None
+            ids, matrix = self._semantic_index(scope)
+
+            if len(ids):
+                similarities = matrix @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    entry = self._live(ids[best])
+
+            if entry is None:
+                self.misses += 1
+                metrics.inc("answer_cache_misses_total")
+                return None
+
+            self._entries.move_to_end(entry['id'])
+            self.semantic_hits += 1
+
+        metrics.inc("answer_cache_hits_total", level="semantic")
+        return entry
+
+    def put(self, question: str, embedding: List[float], contexts: List[Dict], answer: str, scope: Tuple = ()) -> Dict[str, Any]:
+        """
+        Store the result of a question. The Sources of its contexts are remembered for invalidation.
+        """
+
+        vector = np.asarray(embedding, dtype=np.float32)
+        entry = {"id": next(self._ids),
+                 "question": question,
+                 "scope": scope,
+                 "embedding": vector,
+                 "unit_embedding": vector / (np.linalg.norm(vector) or 1),
+                 "contexts": contexts,
+                 "answer": answer,
+                 "sources": {context.get('url') for context in contexts if context.get('url')},
+                 "keys": set(),
+                 "created": time.monotonic()}
+
+        with self._lock:
+            old = self._exact.get((scope, self.normalize_question(question)))
+            if old is not None:
+                self._remove(old)
+
+            self._entries[entry['id']] = entry
+            self._alias(entry, question)
+            for url in entry['sources']:
+                self._by_source.setdefault(url, set()).add(entry['id'])
+            self._semantic.pop(scope, None)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+        return entry
+
+    def invalidate_sources(self, urls: Iterable[str]) -> int:
+        """
+        Drop every entry with contexts from the given Sources. Returns the number of entries dropped.
+        """
+
+        with self._lock:
+            ids = set()
+            for url in urls:
+                ids.update(self._by_source.get(url, ()))
+
+            return self._invalidate(ids)
+
+    def invalidate_scopes(self, sources: List[Dict]) -> int:
+        """
+        Drop every entry whose scope one of the given Sources matches, see scope_matches.
+        Returns the number of entries dropped.
+        """
+
+        with self._lock:
+            scopes = {entry['scope'] for entry in self._entries.values()}
+            scopes = {scope for scope in scopes if any(scope_matches(scope, source) for source in sources)}
+
+            return self._invalidate({entry_id for entry_id, entry in self._entries.items() if entry['scope'] in scopes})
+
+    def on_load(self, sources: List[Dict], parents: List[Dict], children: List[Dict]) -> None:
+        """
+        GraphWriter load listener.
+        """
+
+        if self.invalidate_all_on_load:
+            with self._lock:
+                self.invalidations += len(self._entries)
+                self.clear()
+        else:
+            self.invalidate_sources(source['url'] for source in sources)
+            self.invalidate_scopes(sources)
+
+    def on_delete(self, urls: List[str]) -> None:
+        """
+        GraphWriter delete listener.
+        """
+
+        self.invalidate_sources(urls)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._exact.clear()
+            self._by_source.clear()
+            self._semantic.clear()
+
+    def _invalidate(self, ids: Set[int]) -> int:
+        for entry_id in ids:
+            self._remove(entry_id)
+        self.invalidations += len(ids)
+
+        if ids:
+            metrics.inc("answer_cache_invalidations_total", len(ids))
+        return len(ids)
+
+    def _live(self, entry_id: Optional[int]) -> Optional[Dict[str, Any]]:
+        """
+        The entry, unless it does not exist or has expired, in which case it is removed.
+        """
+
+        entry = self._entries.get(entry_id)
+        if entry is None:
+            return None
+
+        if time.monotonic() - entry['created'] > self.ttl:
+            self._remove(entry_id)
+            self.expirations += 1
+            return None
+
+        return entry
+
+    def _alias(self, entry: Dict[str, Any], question: str) -> None:
+        key = (entry['scope'], self.normalize_question(question))
+        self._exact[key] = entry['id']
+        entry['keys'].add(key)
+
+    def _semantic_index(self, scope: Tuple) -> Tuple[List[int], np.ndarray]:
+        if scope not in self._semantic:
+            ids = [entry_id for entry_id, entry in self._entries.items() if entry['scope'] == scope]
+            matrix = np.stack([self._entries[entry_id]['unit_embedding'] for entry_id in ids]) if ids else np.zeros((0, 0), dtype=np.float32)
+            self._semantic[scope] = (ids, matrix)
+        return self._semantic[scope]
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+
+        for key in entry['keys']:
+            if self._exact.get(key) == entry_id:
+                del self._exact[key]
+        for url in entry['sources']:
+            ids = self._by_source.get(url)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._by_source[url]
+        self._semantic.pop(entry['scope'], None)
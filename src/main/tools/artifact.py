@@ -0,0 +1,182 @@
+from typing import Dict, Iterator, List, Tuple
+import json
+import os
+
+import numpy as np
+
+
+class ChunkArtifact:
+    """
+    On-disk hand-off between the chunking, embedding and loading stages, so each stage can run
+    and restart on its own without redoing the previous ones.
+
+    The directory holds:
+        rows.jsonl      string table with one chunk row (as in Chunker.chunks_as_list) per line
+        offsets.u64     byte offset of every row in rows.jsonl, memory-mapped for lazy random access
+        embeddings.f32  contiguous float32 embedding column, one row per chunk, memory-mapped
+        meta.json       committed row, byte and embedding counts and the loading checkpoint
+
+    Data is appended first and meta.json is replaced atomically afterwards, so anything past the
+    committed counts (e.g. from a crash mid-write) is truncated the next time the artifact is opened.
+    """
+
+    def __init__(self, directory: str, dimensions: int = 96) -> None:
+
+        self.directory = directory
+        self._rows_path = os.path.join(directory, "rows.jsonl")
+        self._offsets_path = os.path.join(directory, "offsets.u64")
+        self._embeddings_path = os.path.join(directory, "embeddings.f32")
+        self._meta_path = os.path.join(directory, "meta.json")
+
+        os.makedirs(directory, exist_ok=True)
+
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                self._meta = json.load(f)
+        else:
+            self._meta = {"dimensions": dimensions, "rows": 0, "rows_bytes": 0, "embedded": 0, "loaded": 0}
+
+        self.dimensions = self._meta["dimensions"]
+        self._truncate_uncommitted()
+
+    @property
+    def rows(self) -> int:
+        return self._meta["rows"]
+
+    @property
+    def embedded(self) -> int:
+        return self._meta["embedded"]
+
+    @property
+    def loaded(self) -> int:
+        return self._meta["loaded"]
+
+    def _truncate_uncommitted(self) -> None:
+        for path, size in ((self._rows_path, self._meta["rows_bytes"]),
+                           (self._offsets_path, self._meta["rows"] * 8),
+                           (self._embeddings_path, self._meta["embedded"] * self.dimensions * 4)):
+            with open(path, "ab") as f:
+                f.truncate(size)
+
+    def _commit(self, **counts: int) -> None:
+        self._meta.update(counts)
+        tmp_path = self._meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._meta_path)
+
+    @staticmethod
+    def _append(path: str, data: bytes) -> None:
+        with open(path, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def append_rows(self, rows: List[Dict]) -> None:
+        """
+        Chunking stage: append chunk rows. Embeddings, if present in the rows, are not stored here.
+        """
+
+        if not rows:
+            return
+
+        encoded = [(json.dumps({key: value for key, value in row.items() if key != "embedding"}) + "\n").encode("utf-8") for row in rows]
+        offsets = self._meta["rows_bytes"] + np.cumsum([0] + [len(line) for line in encoded[:-1]], dtype=np.uint64)
+
+        self._append(self._rows_path, b"".join(encoded))
+        self._append(self._offsets_path, offsets.astype(np.uint64).tobytes())
+        self._commit(rows=self.rows + len(rows), rows_bytes=self._meta["rows_bytes"] + sum(len(line) for line in encoded))
+
+    def append_embeddings(self, embeddings: np.ndarray) -> None:
+        """
+        Embedding stage: append the embeddings of the next rows, in row order.
+        """
+
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(-1, self.dimensions)
+
+        if self.embedded + len(embeddings) > self.rows:
+            raise ValueError("More embeddings than rows. Embeddings must be appended in row order.")
+
+        self._append(self._embeddings_path, embeddings.tobytes())
+        self._commit(embedded=self.embedded + len(embeddings))
+
+    def mark_loaded(self, count: int) -> None:
+        """
+        Loading stage: checkpoint the number of rows written to the graph.
+        """
+
+        self._commit(loaded=count)
+
+    def _offsets(self) -> np.ndarray:
+        if self.rows == 0:
+            return np.zeros(0, dtype=np.uint64)
+        return np.memmap(self._offsets_path, dtype=np.uint64, mode="r", shape=(self.rows,))
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """
+        The committed embeddings as a read-only memory-mapped (embedded, dimensions) float32 matrix.
+        """
+
+        if self.embedded == 0:
+            return np.zeros((0, self.dimensions), dtype=np.float32)
+        return np.memmap(self._embeddings_path, dtype=np.float32, mode="r", shape=(self.embedded, self.dimensions))
+
+    def read_rows(self, start: int, stop: int) -> List[Dict]:
+        """
+        Read rows [start, stop) without reading the rest of the string table.
+        """
+
+        stop = min(stop, self.rows)
+        if start >= stop:
+            return []
+
+        offsets = self._offsets()
+        begin = int(offsets[start])
+        end = int(offsets[stop]) if stop < self.rows else self._meta["rows_bytes"]
+
+        with open(self._rows_path, "rb") as f:
+            f.seek(begin)
+            data = f.read(end - begin)
+
+        return [json.loads(line) for line in data.decode("utf-8").splitlines()]
+
+    def iter_texts(self, start: int = 0, batch_size: int = 1024) -> Iterator[Tuple[int, List[str]]]:
+        """
+        Yield (start, chunk texts) batches of the rows from `start` on, for the embedding stage.
+        """
+
+        for begin in range(start, self.rows, batch_size):
+            yield begin, [row['transcript'] for row in self.read_rows(begin, begin + batch_size)]
+
+    def iter_embedded_rows(self, start: int = 0, batch_size: int = 500) -> Iterator[Tuple[int, List[Dict], np.ndarray]]:
+        """
+        Yield (start, rows, embeddings) batches of the embedded rows from `start` on, 
+        where embeddings is the memory-mapped slice of the embedding column for those rows.
+        """
+
+        embeddings = self.embeddings
+
+        for begin in range(start, self.embedded, batch_size):
+            rows = self.read_rows(begin, min(begin + batch_size, self.embedded))
+            yield begin, rows, embeddings[begin:begin + len(rows)]
+
+    def video_ids(self) -> set:
+        """
+        The video ids of all committed rows, used to resume the chunking stage.
+        """
+
+        return {row['video_id'] for row in self.read_rows(0, self.rows)}
+
+    @property
+    def chunked(self) -> bool:
+        return self._meta.get("chunked", False)
+
+    def mark_chunked(self) -> None:
+        """
+        Chunking stage: record that every transcript has been chunked.
+        """
+
+        self._commit(chunked=True)
@@ -1,30 +1,144 @@
-from typing import List, Tuple, Callable, Dict
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, List, Tuple, Callable, Dict, Iterator
+from concurrent.futures import Executor
+from contextlib import nullcontext
 import os
 import io
 import json
-from uuid import uuid4
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# langchain and the google cloud sdk are slow to import, they are imported on first use
+if TYPE_CHECKING:
+    from langchain.schema.document import Document
+    from langchain.text_splitter import TokenTextSplitter, RecursiveCharacterTextSplitter
+    from google.cloud import storage
+
+from tools.manifest import IngestionManifest
+from tools.packed_transcripts import BLOBS_LAYOUT, PACKED_LAYOUT, PackedTranscriptStore
+from tools.transcript_mirror import TranscriptMirror
+from utils.concurrency import ordered_prefetch
+from utils.metrics import metrics
+from utils.utils import parent_index, text_hash
+
+
+# (parent chunk size, parent chunk overlap, child chunk size, child chunk overlap)
+SplitterConfig = Tuple[int, int, int, int]
 
-import pandas as pd
-from langchain.schema.document import Document
-from langchain.text_splitter import CharacterTextSplitter, TokenTextSplitter, RecursiveCharacterTextSplitter
-from google.cloud import storage
-from google.oauth2 import service_account
 
+def _build_splitters(config: SplitterConfig) -> Tuple[TokenTextSplitter, RecursiveCharacterTextSplitter]:
+    from langchain.text_splitter import TokenTextSplitter, RecursiveCharacterTextSplitter
+
+    parent_chunk_size, parent_chunk_overlap, child_chunk_size, child_chunk_overlap = config
+
+    # primary splitter
+    primary_splitter = TokenTextSplitter(
+        chunk_size=parent_chunk_size,
+        chunk_overlap=parent_chunk_overlap)
+    
+    # set to ~= average length of question
+    secondary_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=child_chunk_size,
+        chunk_overlap=child_chunk_overlap
+    ) 
+
+    return primary_splitter, secondary_splitter
+
+
+# splitters of a chunking worker process, built once by _init_chunking_worker
+_worker_splitters = None
+
+
+def _init_chunking_worker(config: SplitterConfig) -> None:
+    global _worker_splitters
+    _worker_splitters = _build_splitters(config)
+
+
+def _chunk_in_worker(task: Tuple[Document, List[Callable[[str], str]]]) -> Tuple[List[Document], float, float]:
+    document, cleaning_functions = task
+    return Chunker._split_document(document, *_worker_splitters, cleaning_functions)
 
 
 class Chunker:
 
-    def __init__(self) -> None:
-       
-        credentials = service_account.Credentials.from_service_account_file(
-                os.environ.get('GCP_SERVICE_ACCOUNT_KEY_PATH')
-            )  
-        self.client = storage.Client(credentials=credentials)
- 
+    # primary splitter, in tokens
+    PARENT_CHUNK_SIZE = 512
+    PARENT_CHUNK_OVERLAP = 64
+    # secondary splitter, in characters. set to ~= average length of question
+    CHILD_CHUNK_SIZE = 140
+    CHILD_CHUNK_OVERLAP = 35
+
+    def __init__(self, bucket: storage.Bucket = None, max_workers: int = 8, mirror_directory: str = None,
+                 normalizer: Callable[[str], str] = None,
+                 parent_chunk_size: int = PARENT_CHUNK_SIZE,
+                 parent_chunk_overlap: int = PARENT_CHUNK_OVERLAP,
+                 child_chunk_size: int = CHILD_CHUNK_SIZE,
+                 child_chunk_overlap: int = CHILD_CHUNK_OVERLAP,
+                 transcript_layout: str = None,
+                 executor: Executor = None) -> None:
+        """
+        Parent chunk sizes are in tokens, child chunk sizes in characters.
+        Transcripts are downloaded by a pool of `max_workers` threads, or on `executor` if one is provided, 
+        e.g. a StagePool shared by the Chunkers of several playlists, with at most 2 * max_workers downloads ahead.
+        If a normalizer is provided, e.g. a TextNormalizer, each transcript is normalized once before it is split.
+        If a mirror directory is provided, downloaded transcripts are kept on local disk and reused
+        until their blob changes in GCP Storage.
+        A bucket may be passed in to replace GCP Storage, e.g. with a local fake.
+        Otherwise the GCP Storage client is created on first use.
+        Transcripts are read in transcript_layout, or the TRANSCRIPT_LAYOUT environment variable: "blobs", one json blob
+        per video, "packed", a PackedTranscriptStore per playlist, or "auto" (the default), the packed transcripts of
+        a playlist along with any per-video blobs that are not packed. The mirror only applies to per-video blobs.
+        """
+
         self.service_account = os.environ.get('GCP_SERVICE_ACCOUNT_KEY_PATH')
         self.bucket_name = os.environ.get("GCP_BUCKET_NAME")
-        self.bucket = self.client.get_bucket(self.bucket_name)
+
+        self.client = None
+        self._bucket = bucket
+
+        self.transcript_layout = transcript_layout or os.environ.get("TRANSCRIPT_LAYOUT") or "auto"
+        if self.transcript_layout not in (BLOBS_LAYOUT, PACKED_LAYOUT, "auto"):
+            raise ValueError(f"unknown transcript layout {self.transcript_layout!r}, expected 'blobs', 'packed' or 'auto'")
+        # playlist title -> PackedTranscriptStore, or None if the playlist has no packed transcripts
+        self._packed_stores = {}
+
+        self.max_workers = max_workers
+        self.executor = executor
+        self.mirror = TranscriptMirror(mirror_directory) if mirror_directory else None
+        self.normalizer = normalizer
+
+        self.parent_chunk_size = parent_chunk_size
+        self.parent_chunk_overlap = parent_chunk_overlap
+        self.child_chunk_size = child_chunk_size
+        self.child_chunk_overlap = child_chunk_overlap
+        self._splitters = None
+
+        # transcript hash of every listed video, used to fill the ingestion manifest
+        self.transcript_hashes = {}
+        self.skipped_videos = 0
+        # every split video in order, including those without chunks, and the videos whose manifest entry is outdated
+        self.chunked_video_ids = []
+        self.changed_video_ids = set()
         self._chunked_documents = []
+        # chunking key of every chunk_youtube_transcripts call that added to the chunked documents
+        self._chunking_keys = []
+        self._chunks_as_list_cache = None
+        self._chunks_as_list_key = None
+
+    @property
+    def bucket(self) -> storage.Bucket:
+        if self._bucket is None:
+            from google.cloud import storage
+            from google.oauth2 import service_account
+
+            credentials = service_account.Credentials.from_service_account_file(
+                    os.environ.get('GCP_SERVICE_ACCOUNT_KEY_PATH')
+                )  
+            self.client = storage.Client(credentials=credentials)
+            self._bucket = self.client.get_bucket(self.bucket_name)
+
+        return self._bucket
 
     @property
     def chunk_texts(self) -> List[str]:
@@ -37,23 +151,42 @@ class Chunker:
         return list({chunk.metadata.get('source', '') for chunk in self._chunked_documents})
 
     @property
-    def chunks_as_list(self) -> Dict[str, List[str]]:
+    def chunks_as_list(self) -> List[Dict[str, str]]:
+        """
+        The chunked documents as rows for prepare_new_nodes.
+        The rows are built once and reused until the chunked videos or the chunking parameters change.
+        Every call returns copies, so callers such as NearDuplicateFilter.filter_rows can update them.
+        """
         self._assert_documents_chunked()
 
-        result = []
-        
-        for chunk in self._chunked_documents:
-            result+=[{
-                    "url": "https://www.youtube.com/watch?v="+chunk.metadata.get("video_id"),
-                    "video_id": chunk.metadata.get("video_id"),
-                    "parent_index": chunk.metadata.get("parent_index"),
-                    "parent_transcript": chunk.metadata.get("parent_transcript"),
-                    "title": chunk.metadata.get("title"),
-                    "publish_date": chunk.metadata.get("publish_date"),
-                    "transcript": chunk.page_content
-                    }]
-
-        return result
+        key = (tuple(self._chunking_keys), tuple(self.chunked_video_ids), len(self._chunked_documents))
+
+        if self._chunks_as_list_key != key:
+            self._chunks_as_list_cache = [self._chunk_as_row(chunk) for chunk in self._chunked_documents]
+            self._chunks_as_list_key = key
+
+        return [dict(row) for row in self._chunks_as_list_cache]
+
+    @staticmethod
+    def video_url(video_id: str) -> str:
+        """
+        The url of the Source node of a video.
+        """
+
+        return "https://www.youtube.com/watch?v="+video_id
+
+    @staticmethod
+    def _chunk_as_row(chunk: Document) -> Dict[str, str]:
+        return {
+                "url": Chunker.video_url(chunk.metadata.get("video_id")),
+                "video_id": chunk.metadata.get("video_id"),
+                "parent_index": chunk.metadata.get("parent_index"),
+                "child_offset": chunk.metadata.get("child_offset"),
+                "parent_transcript": chunk.metadata.get("parent_transcript"),
+                "title": chunk.metadata.get("title"),
+                "publish_date": chunk.metadata.get("publish_date"),
+                "transcript": chunk.page_content
+                }
 
     def _assert_documents_chunked(self):
         if not self._chunked_documents:
@@ -74,6 +207,10 @@ class Chunker:
     
     def _get_youtube_video_info(self, id: str, playlist_title: str = "") -> Dict[str, str]:
 
+        store = self._packed_store(playlist_title)
+        if store is not None and id in store:
+            return store.read(id)
+
         if playlist_title != "":
             playlist_title+="/"
 
@@ -87,31 +224,179 @@ class Chunker:
         It then formats them into LangChain Documents. 
         """
 
-        docs = []
         unsuccessful = []
+        docs = list(self._iter_youtube_transcripts_as_langchain_docs(id_list, playlist_title=playlist_title, unsuccessful=unsuccessful))
+
+        return docs, unsuccessful
+
+    @staticmethod
+    def _transcript_prefix(playlist_title: str = "") -> str:
+        if playlist_title != "":
+            playlist_title+="/"
+        return "youtube/transcripts/"+playlist_title
+
+    @staticmethod
+    def _transcript_hash(blob: storage.Blob) -> str:
+        """
+        Version of a transcript that is known from its blob metadata, without downloading it.
+        """
+
+        return getattr(blob, "md5_hash", None) or getattr(blob, "crc32c", None) or getattr(blob, "etag", None)
+
+    def chunking_key(self, cleaning_functions: List[Callable[[str], str]] = None) -> str:
+        """
+        Hash of everything that determines the chunks of a transcript besides its text.
+        """
+
+        params = {"parent": [self.parent_chunk_size, self.parent_chunk_overlap],
+                  "child": [self.child_chunk_size, self.child_chunk_overlap],
+                  "cleaning": [getattr(func, "__qualname__", repr(func)) for func in cleaning_functions or []],
+                  "normalizer": getattr(self.normalizer, "key", getattr(self.normalizer, "__qualname__", None))}
+        
+        return text_hash(json.dumps(params, sort_keys=True))
+
+    def _packed_store(self, playlist_title: str = "") -> PackedTranscriptStore:
+        """
+        The packed transcripts of the playlist, or None in the blobs layout or, in the auto layout, if there are none.
+        """
+
+        if self.transcript_layout == BLOBS_LAYOUT:
+            return None
+
+        if playlist_title not in self._packed_stores:
+            store = PackedTranscriptStore(self.bucket, playlist_title)
+            self._packed_stores[playlist_title] = store if self.transcript_layout == PACKED_LAYOUT or store.exists() else None
+
+        return self._packed_stores[playlist_title]
+
+    def _list_transcript_blobs(self, id_list: List[str] = None, playlist_title: str = "", with_metadata: bool = False) -> List[storage.Blob]:
+        """
+        Get the transcript blobs of a playlist, or of the ids in the id list.
+        Listed blobs carry their generation and etag, so the mirror can validate them without another request.
+        """
+
+        prefix = self._transcript_prefix(playlist_title)
 
-        # grab all trancript file addresses in bucket and format to get ids
         if not id_list:
-            id_list = [self._process_youtube_id(blob.name, playlist_title) for blob in self.client.list_blobs(self.bucket_name, prefix="youtube/transcripts/"+playlist_title)]
-
-        # grab the transcripts and format into LangChain docs
-        for id in id_list:
-            try:
-                info = self._get_youtube_video_info(id, playlist_title=playlist_title)
-                 
-                docs.append(Document(page_content=info['transcript'], metadata={"video_id": id,
-                                                                                "source": "https://www.youtube.com/watch?v="+id, 
-                                                                                "publish_date": info['publish_date'],
-                                                                                "title": info['title'],
-                                                                                }))
-            except Exception as e:
-                print(f"Error loading document with id: {id}")
-                print(f"Error: {e}")
-                unsuccessful.append(id)
+            return [blob for blob in self.bucket.list_blobs(prefix=prefix) if blob.name.endswith(".json")]
 
-        return docs, unsuccessful
+        if self.mirror is not None or with_metadata:
+            # fetch the metadata so the mirror and manifest can validate their copies
+            return [self.bucket.get_blob(prefix+id+".json") or self.bucket.blob(prefix+id+".json") for id in id_list]
+
+        return [self.bucket.blob(prefix+id+".json") for id in id_list]
+
+    def transcript_ids(self, playlist_title: str = "") -> List[str]:
+        """
+        The ids of every stored transcript of a playlist, packed first, from listings only.
+        """
+
+        store = self._packed_store(playlist_title)
+        ids = store.ids() if store is not None else []
+
+        if self.transcript_layout != PACKED_LAYOUT:
+            packed = set(ids)
+            ids += [id for id in (self._process_youtube_id(blob.name, playlist_title) for blob in self._list_transcript_blobs(playlist_title=playlist_title))
+                    if id not in packed]
+
+        return ids
+
+    def _download_transcript(self, blob: storage.Blob) -> Dict[str, str]:
+        """
+        Download a transcript blob, using the local mirror when it holds the current version.
+        """
+
+        text = self.mirror.get(blob) if self.mirror is not None else None
+
+        if text is None:
+            with metrics.timer("transcript_download_seconds"):
+                text = blob.download_as_text()
+            if self.mirror is not None:
+                self.mirror.put(blob, text)
+
+        return json.loads(text)
+
+    def _iter_youtube_transcripts_as_langchain_docs(self, id_list: List[str] = None, playlist_title: str = "", unsuccessful: List[str] = None,
+                                                    manifest: IngestionManifest = None, chunking_key: str = None) -> Iterator[Document]:
+        """
+        Lazily retrieve the YouTube transcripts in the id list, or the whole playlist, as LangChain Documents.
+        Downloads run on a thread pool ahead of the consumer. Packed transcripts are yielded first, grouped by shard,
+        then per-video blobs in listing order.
+        Videos that the manifest records as ingested from the same transcript and chunking key are skipped without downloading.
+        Ids that could not be loaded are appended to `unsuccessful`.
+        """
+
+        store = self._packed_store(playlist_title)
+
+        try:
+            packed_ids = []
+            if store is not None:
+                packed_ids = [id for id in (id_list or store.ids()) if id in store]
+
+            blobs = []
+            if self.transcript_layout != PACKED_LAYOUT:
+                packed = set(packed_ids)
+                unpacked_ids = [id for id in id_list if id not in packed] if id_list else None
+                if unpacked_ids is None or unpacked_ids:
+                    blobs = [blob for blob in self._list_transcript_blobs(unpacked_ids, playlist_title=playlist_title, with_metadata=manifest is not None)
+                             if self._process_youtube_id(blob.name, playlist_title) not in packed]
+            elif id_list and unsuccessful is not None:
+                unsuccessful.extend(id for id in id_list if id not in store)
+
+        except Exception as e:
+            print(f"Error listing transcripts for playlist: {playlist_title}")
+            print(f"Error: {e}")
+            if unsuccessful is not None:
+                unsuccessful.extend(id_list or [])
+            return
+
+        def is_current(id: str, transcript_hash: str) -> bool:
+            self.transcript_hashes[id] = transcript_hash
+            if manifest is not None and manifest.is_current(id, transcript_hash, chunking_key):
+                self.skipped_videos += 1
+                return True
+            if manifest is not None and manifest.get(id) is not None:
+                self.changed_video_ids.add(id)
+            return False
+
+        to_read = [id for id in packed_ids if not is_current(id, store.transcript_hash(id))]
+        to_download = [blob for blob in blobs if not is_current(self._process_youtube_id(blob.name, playlist_title), self._transcript_hash(blob))]
+
+        from langchain.schema.document import Document
+
+        def transcripts() -> Iterator[Tuple[str, Dict[str, str], Exception]]:
+            if to_read:
+                yield from store.read_many(to_read, max_workers=self.max_workers, executor=self.executor)
+
+            if to_download:
+                pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="transcript-download") if self.executor is None else nullcontext(self.executor)
+                with pool as executor:
+                    for blob, info, e in ordered_prefetch(self._download_transcript, to_download, executor, window=2 * self.max_workers):
+                        yield self._process_youtube_id(blob.name, playlist_title), info, e
+
+        try:
+            for id, info, e in transcripts():
+                if e is not None:
+                    metrics.inc("transcript_errors_total", playlist=playlist_title)
+                    print(f"Error loading document with id: {id}")
+                    print(f"Error: {e}")
+                    if unsuccessful is not None:
+                        unsuccessful.append(id)
+                    continue
+
+                transcript = info['transcript'] if self.normalizer is None else self.normalizer(info['transcript'])
+
+                yield Document(page_content=transcript, metadata={"video_id": id,
+                                                                  "source": self.video_url(id), 
+                                                                  "publish_date": info['publish_date'],
+                                                                  "title": info['title'],
+                                                                  })
+        finally:
+            if self.mirror is not None:
+                self.mirror.save()
     
-    def _clean_chunked_documents(self, chunked_docs: List[Document], cleaning_functions: List[Callable[[str], str]]) -> \
+    @staticmethod
+    def _clean_chunked_documents(chunked_docs: List[Document], cleaning_functions: List[Callable[[str], str]]) -> \
             List[Document]:
         for i, doc in enumerate(chunked_docs):
             for func in cleaning_functions:
@@ -119,53 +404,164 @@ class Chunker:
             chunked_docs[i] = doc
         return chunked_docs
     
-    def _create_child_docs(self, docs: List[Document], splitter: Callable[[List[Document]], List[Document]]) -> List[Document]:
+    @staticmethod
+    def _create_child_docs(docs: List[Document], splitter: RecursiveCharacterTextSplitter) -> List[Document]:
         """
         Create child documents given a list of parent documents.
+        Parent and child indexes are derived from the video id, the chunk offset and the chunk text.
         """
 
+        from langchain.schema.document import Document
+
         return_list = []
+        parent_offsets = {}
 
         for i, doc in enumerate(docs):
             # set the parent index before splitting
-            doc.metadata['parent_index'] = str(uuid4())
-            temp_split_docs = splitter.split_documents(documents=[doc])
+            video_id = doc.metadata.get('video_id', '')
+            offset = parent_offsets.get(video_id, 0)
+            parent_offsets[video_id] = offset + 1
+
+            doc.metadata['parent_index'] = parent_index(video_id, offset, doc.page_content)
 
-            for child in temp_split_docs:
+            for child_offset, text in enumerate(splitter.split_text(doc.page_content)):
+                child = Document(page_content=text, metadata=dict(doc.metadata))
                 child.metadata['parent_transcript'] = doc.page_content
+                child.metadata['child_offset'] = child_offset
                 return_list+=[child]
 
         return return_list
 
+    @staticmethod
+    def _split_document(document: Document, primary_splitter: TokenTextSplitter, secondary_splitter: RecursiveCharacterTextSplitter,
+                        cleaning_functions: List[Callable[[str], str]] = None) -> Tuple[List[Document], float, float]:
+        """
+        Split one transcript into parents, then into cleaned children.
+        Returns the children along with the seconds spent splitting and cleaning, 
+        as the metrics of a worker process would be lost.
+        """
+
+        start = time.perf_counter()
+        parents = primary_splitter.split_documents(documents=[document])
+        children = Chunker._create_child_docs(parents, secondary_splitter)
+        split = time.perf_counter()
+        children = Chunker._clean_chunked_documents(children, cleaning_functions or [])
+        return children, split - start, time.perf_counter() - split
+
+    @staticmethod
+    def _record_split(children: List[Document], split_seconds: float, clean_seconds: float) -> List[Document]:
+        metrics.observe("chunk_split_seconds", split_seconds)
+        metrics.observe("chunk_clean_seconds", clean_seconds)
+        metrics.inc("chunks_total", len(children))
+        return children
+
+    @property
+    def splitter_config(self) -> SplitterConfig:
+        return (self.parent_chunk_size, self.parent_chunk_overlap, self.child_chunk_size, self.child_chunk_overlap)
+
+    def _create_splitters(self) -> Tuple[TokenTextSplitter, RecursiveCharacterTextSplitter]:
+        """
+        The splitters are built once and reused, unless the chunk sizes change.
+        """
+
+        if self._splitters is None or self._splitters[0] != self.splitter_config:
+            self._splitters = (self.splitter_config, _build_splitters(self.splitter_config))
+
+        return self._splitters[1]
+
+    def chunking_pool(self, n_process: int) -> ProcessPoolExecutor:
+        """
+        A pool of `n_process` chunking worker processes, which build the splitters of this Chunker once.
+        """
+
+        return ProcessPoolExecutor(max_workers=n_process, initializer=_init_chunking_worker, initargs=(self.splitter_config,))
+
+    def _iter_split_documents(self, documents: Iterator[Document], cleaning_functions: List[Callable[[str], str]] = None,
+                              n_process: int = 1, executor: Executor = None) -> Iterator[List[Document]]:
+        """
+        Yield the children of each document, in the order of the documents.
+        The video id of each document is appended to `chunked_video_ids` as its children are yielded.
+        With n_process > 1 the documents are split on a process pool whose workers build their splitters once.
+        With an executor, a chunking_pool or a StagePool over one, the documents are split on it instead,
+        with at most 4 * n_process documents in flight.
+        """
+
+        if n_process <= 1 and executor is None:
+            primary_splitter, secondary_splitter = self._create_splitters()
+            for document in documents:
+                self.chunked_video_ids.append(document.metadata['video_id'])
+                yield self._record_split(*self._split_document(document, primary_splitter, secondary_splitter, cleaning_functions))
+            return
+
+        tasks = ((document, cleaning_functions) for document in documents)
+
+        with self.chunking_pool(n_process) if executor is None else nullcontext(executor) as pool:
+            for (document, _), result, e in ordered_prefetch(_chunk_in_worker, tasks, pool, window=4 * n_process):
+                if e is not None:
+                    raise e
+                self.chunked_video_ids.append(document.metadata['video_id'])
+                yield self._record_split(*result)
+
     def chunk_youtube_transcripts(self, 
                                   ids: List[str] = None,
                                   playlist_title: str = "",
-                                  cleaning_functions: List[Callable[[str], str]] = None) -> None:
+                                  cleaning_functions: List[Callable[[str], str]] = None,
+                                  manifest: IngestionManifest = None,
+                                  n_process: int = 1) -> None:
         """
         Perform the chunking process for transcripts in the provided id list and playlist.
+        With n_process > 1, transcripts are split in parallel across processes. The order of the chunks does not change.
+        If a manifest is provided, videos already ingested with the same transcript and chunking parameters are skipped.
+        Call record_ingested once the chunks are loaded into the graph.
         """
 
-        # primary splitter
-        primary_splitter = TokenTextSplitter(
-            chunk_size=512,
-            chunk_overlap=64)
-        
-        # set to ~= average length of question
-        secondary_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=140,
-            chunk_overlap=35
-        ) 
         # Start scraping
-        documents, failed = self._scrape_youtube_transcripts_into_langchain_docs(ids, playlist_title=playlist_title)
+        failed = []
+        chunking_key = self.chunking_key(cleaning_functions)
+        self._chunking_keys.append(chunking_key)
+        documents = self._iter_youtube_transcripts_as_langchain_docs(ids, playlist_title=playlist_title, unsuccessful=failed,
+                                                                     manifest=manifest, chunking_key=chunking_key)
 
-        # Create the Parent documents
-        chunked_docs = primary_splitter.split_documents(documents=documents)
+        # Create the Parent and child documents and clean the children
+        for children in self._iter_split_documents(documents, cleaning_functions, n_process=n_process):
+            self._chunked_documents.extend(children)
+
+    def iter_chunks(self, 
+                    ids: List[str] = None,
+                    playlist_title: str = "",
+                    cleaning_functions: List[Callable[[str], str]] = None,
+                    unsuccessful: List[str] = None,
+                    manifest: IngestionManifest = None,
+                    n_process: int = 1,
+                    split_executor: Executor = None) -> Iterator[Dict[str, str]]:
+        """
+        Streaming counterpart of chunk_youtube_transcripts followed by chunks_as_list.
+        Transcripts are downloaded, split and cleaned one at a time and their chunks are yielded as rows,
+        so only a few transcripts are held in memory at once. Nothing is stored on the Chunker.
+        Transcripts are split on `split_executor` if provided, see _iter_split_documents.
+        """
+
+        documents = self._iter_youtube_transcripts_as_langchain_docs(ids, playlist_title=playlist_title, unsuccessful=unsuccessful,
+                                                                     manifest=manifest, chunking_key=self.chunking_key(cleaning_functions))
+
+        for children in self._iter_split_documents(documents, cleaning_functions, n_process=n_process, executor=split_executor):
+            for child in children:
+                yield self._chunk_as_row(child)
+
+    def record_ingested(self, manifest: IngestionManifest, cleaning_functions: List[Callable[[str], str]] = None, 
+                        video_ids: List[str] = None, save: bool = True) -> None:
+        """
+        Record videos as ingested in the manifest. Defaults to every chunked video, including those without chunks.
+        The previous nodes of the videos in `changed_video_ids` are stale, see GraphWriter.delete_sources.
+        """
 
-        # Create the child documents
-        chunked_docs = self._create_child_docs(chunked_docs, secondary_splitter)
+        if video_ids is None:
+            video_ids = self.chunked_video_ids
 
-        # clean chunks
-        chunked_docs = self._clean_chunked_documents(chunked_docs, cleaning_functions)
+        key = self.chunking_key(cleaning_functions)
 
-        self._chunked_documents.extend(chunked_docs)
+        for video_id in video_ids:
+            manifest.record(video_id, self.transcript_hashes.get(video_id), key)
 
+        if save:
+            manifest.save()
@@ -0,0 +1,164 @@
+from typing import Dict, List, Optional
+import re
+
+import numpy as np
+
+from utils.metrics import metrics
+from utils.utils import child_index
+
+# modes of NearDuplicateFilter
+DROP = "drop"
+COLLAPSE = "collapse"
+
+
+
+class NearDuplicateFilter:
+    """
+    Suppresses near-duplicate children, e.g. the intro, outro and sponsor boilerplate repeated in every review,
+    before they are embedded and loaded.
+
+    Each child text gets a MinHash signature: the minimums of `num_perm` hash functions over its `shingle_size`
+    byte shingles, after lowercasing and removing punctuation.
+    The signature is cut into `bands` bands, and a child is only compared with the canonical children sharing
+    one of its bands, so the corpus is deduplicated in linear time. A child whose estimated Jaccard similarity
+    with a canonical child is at least `threshold` is a near duplicate; otherwise it becomes a canonical child.
+
+    mode:
+        drop      near duplicates are removed from the rows
+        collapse  near duplicates get the child index of their canonical child and no text or embedding,
+                  so loading them only adds a HAS_PARENT edge from the canonical Child node to their parent
+    The filter remembers canonical children across calls, so one filter deduplicates every playlist of a run.
+    """
+
+    def __init__(self, mode: str = COLLAPSE, threshold: float = 0.8, num_perm: int = 64, bands: int = 8,
+                 shingle_size: int = 5, seed: int = 1) -> None:
+
+        if mode not in (DROP, COLLAPSE):
+            raise ValueError(f"unknown mode {mode!r}, expected {DROP!r} or {COLLAPSE!r}")
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+
+        self.mode = mode
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+
+        # shingles are mixed into 32 bits with a multiply-shift hash, then permuted by (a * x + b) mod 2**32
+        rng = np.random.default_rng(seed)
+        self._mix = rng.integers(0, 2**64, dtype=np.uint64) | np.uint64(1)
+        self._a = rng.integers(0, 2**32, size=(num_perm, 1), dtype=np.uint32) | np.uint32(1)
+        self._b = rng.integers(0, 2**32, size=(num_perm, 1), dtype=np.uint32)
+
+        # one {band bytes: canonical id} table per band
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = []
+        self._canonical_indexes = []
+
+        self.seen = 0
+        self.removed = 0
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {"seen": self.seen, "canonical": len(self._canonical_indexes), "removed": self.removed}
+
+    def _encode(self, text: str) -> bytes:
+        text = " ".join(re.sub(r"[^\w\s]", " ", (text or "").lower()).split())
+        return text.encode("utf-8").ljust(self.shingle_size)
+
+    def signatures(self, texts: List[str], batch_size: int = 512) -> np.ndarray:
+        """
+        MinHash signatures of the texts, one row of `num_perm` uint32 values per text.
+        The shingles of a batch of texts are hashed and permuted in a few numpy passes.
+        """
+
+        result = np.zeros((len(texts), self.num_perm), dtype=np.uint32)
+
+        for start in range(0, len(texts), batch_size):
+            encoded = [self._encode(text) for text in texts[start:start + batch_size]]
+            lengths = np.array([len(data) for data in encoded], dtype=np.int64)
+            data = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+
+            # pack every byte shingle of the joined texts into an integer, then keep those within a single text
+            n_shingles = len(data) - self.shingle_size + 1
+            shingles = np.zeros(n_shingles, dtype=np.uint64)
+            for i in range(self.shingle_size):
+                shingles = (shingles << np.uint64(8)) ^ data[i:i + n_shingles]
+            counts = lengths - self.shingle_size + 1
+            offsets = np.cumsum(counts) - counts
+            text_starts = np.cumsum(lengths) - lengths
+            shingles = shingles[np.arange(counts.sum()) - np.repeat(offsets - text_starts, counts)]
+            hashes = ((shingles * self._mix) >> np.uint64(32)).astype(np.uint32)
+
+            permuted = self._a * hashes
+            permuted += self._b
+            result[start:start + len(encoded)] = np.minimum.reduceat(permuted, offsets, axis=1).T
+
+        return result
+
+    def signature(self, text: str) -> np.ndarray:
+        return self.signatures([text])[0]
+
+    def _bands(self, signature: np.ndarray) -> List[bytes]:
+        data = signature.tobytes()
+        width = len(data) // self.bands
+        return [data[i:i + width] for i in range(0, len(data), width)]
+
+    def _find(self, signature: np.ndarray, bands: List[bytes]) -> Optional[int]:
+        for table, band in zip(self._buckets, bands):
+            candidate = table.get(band)
+            if candidate is not None and np.mean(self._signatures[candidate] == signature) >= self.threshold:
+                return candidate
+        return None
+
+    def canonical(self, text: str, index: str, signature: np.ndarray = None) -> Optional[str]:
+        """
+        The child index of the canonical child `text` is a near duplicate of,
+        or None if it is new, in which case it becomes canonical under `index`.
+        """
+
+        signature = self.signature(text) if signature is None else signature
+        bands = self._bands(signature)
+        self.seen += 1
+
+        candidate = self._find(signature, bands)
+        if candidate is not None:
+            self.removed += 1
+            return self._canonical_indexes[candidate]
+
+        canonical_id = len(self._canonical_indexes)
+        self._signatures.append(signature)
+        self._canonical_indexes.append(index)
+        for table, band in zip(self._buckets, bands):
+            table.setdefault(band, canonical_id)
+
+        return None
+
+    def filter_rows(self, rows: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        Deduplicate chunk rows, as returned by Chunker.iter_chunks or chunks_as_list, before prepare_new_nodes.
+        Canonical rows get their child index set here, collapsed rows are marked with `duplicate_of`,
+        which prepare_new_nodes does not embed.
+        """
+
+        kept = []
+        removed = self.removed
+
+        with metrics.timer("dedup_seconds"):
+            signatures = self.signatures([row['transcript'] for row in rows])
+
+            for row, signature in zip(rows, signatures):
+                if not row.get("child_index"):
+                    row["child_index"] = child_index(row['parent_index'], row.get('child_offset', 0), row['transcript'])
+
+                canonical = self.canonical(row['transcript'], row['child_index'], signature)
+
+                if canonical is None:
+                    kept.append(row)
+                elif self.mode == COLLAPSE:
+                    row.update({"child_index": canonical, "duplicate_of": canonical, "transcript": None})
+                    kept.append(row)
+
+        metrics.inc("near_duplicate_chunks_total", self.removed - removed, mode=self.mode)
+
+        return kept
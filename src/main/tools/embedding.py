@@ -1,20 +1,83 @@
 from typing import List
 
-from langchain.embeddings.spacy_embeddings import SpacyEmbeddings
+import numpy as np
+
+from utils.metrics import metrics
 
 
 
 class EmbeddingService:
 
-    def __init__(self) -> None:
+    def __init__(self, embeddings = None) -> None:
         """
         SpaCy embedding service.
+        The spaCy model is loaded on first use, unless LangChain SpacyEmbeddings are passed in.
+        """
+        self._embedding_service = embeddings
+        self._dimensions = None
+
+    @property
+    def embedding_service(self):
+        if self._embedding_service is None:
+            # importing langchain's spacy embeddings loads spaCy, which is slow
+            from langchain.embeddings.spacy_embeddings import SpacyEmbeddings
+            self._embedding_service = SpacyEmbeddings()
+        return self._embedding_service
+
+    @property
+    def nlp(self):
+        return self.embedding_service.nlp
+
+    @property
+    def model_id(self) -> str:
+        """
+        Identifies the model and its version, e.g. spacy:en_core_web_sm-3.7.1
         """
-        self.embedding_service = SpacyEmbeddings()
-    
+        meta = self.nlp.meta
+        return f"spacy:{meta.get('lang')}_{meta.get('name')}-{meta.get('version')}"
+
+    @property
+    def dimensions(self) -> int:
+        if self._dimensions is None:
+            self._dimensions = len(self.get_document_embedding("dimensions"))
+        return self._dimensions
+
+    @property
+    def _disabled_components(self) -> List[str]:
+        """
+        The pipeline components that do not contribute to Doc.vector.
+        Models with static word vectors need none of them, the others only need the tok2vec tensor.
+        """
+
+        if self.nlp.vocab.vectors.shape[0] > 0:
+            return list(self.nlp.pipe_names)
+
+        return [name for name in self.nlp.pipe_names if name != "tok2vec"]
+
     def get_document_embedding(self, chunk_text: str) -> List[float]:
         """
         Get embedding for a single document text string.
         """
- 
-        return self.embedding_service.embed_query(chunk_text)
\ No newline at end of file
+
+        return self.embedding_service.embed_query(chunk_text)
+
+    def get_document_embeddings(self, chunk_texts: List[str], batch_size: int = 256, n_process: int = 1) -> np.ndarray:
+        """
+        Get embeddings for many document text strings in one pass through nlp.pipe,
+        running only the pipeline components the vectors depend on.
+        Returns a C-contiguous float32 matrix with one row per text.
+        """
+
+        result = np.zeros((len(chunk_texts), self.dimensions), dtype=np.float32)
+
+        with metrics.timer("embedding_batch_seconds"):
+            docs = self.nlp.pipe(chunk_texts, batch_size=batch_size, n_process=n_process, disable=self._disabled_components)
+
+            for i, doc in enumerate(docs):
+                # empty texts have no vector and are left as zeros
+                if doc.vector.shape[0]:
+                    result[i] = doc.vector
+
+        metrics.inc("embedded_texts_total", len(chunk_texts))
+
+        return result
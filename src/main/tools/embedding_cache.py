@@ -0,0 +1,267 @@
+from typing import Dict, List, Optional
+from collections import OrderedDict
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from tools.embedding import EmbeddingService
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache with two tiers:
+    1. an in-memory LRU holding up to `memory_entries` vectors.
+    2. an optional SQLite file on disk capped at `max_disk_bytes` of vector data.
+       When the cap is exceeded the least recently used rows are evicted.
+
+    Keys are a hash of the model identifier and the chunk text, so a changed model never returns stale vectors.
+    Memory hits also count as accesses of the disk rows: their times are kept and written in batches of `touch_batch_size`,
+    before a disk eviction and by flush, so frequently used vectors are not evicted from disk while they stay in memory.
+    """
+
+    def __init__(self, path: str = None, memory_entries: int = 100_000, max_disk_bytes: int = 1_000_000_000,
+                 touch_batch_size: int = 1_000) -> None:
+
+        self.memory_entries = memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.touch_batch_size = touch_batch_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        # key -> time of the last memory hit not yet written to disk
+        self._touched = {}
+
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._db = None
+        self._disk_bytes = 0
+
+        if path is not None:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """)
+            self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+            self._db.commit()
+            self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def make_key(text: str, model_id: str) -> str:
+        return hashlib.sha256((model_id + "\x00" + text).encode("utf-8")).hexdigest()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        requests = self.hits + self.misses
+        return {"hits": self.hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / requests, 4) if requests else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_bytes": self._disk_bytes}
+
+    def reset_stats(self) -> None:
+        self.hits = self.memory_hits = self.disk_hits = self.misses = self.evictions = 0
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Look up the keys, memory tier first. Returns only the keys that were found.
+        """
+
+        found = {}
+        missing = []
+        now = time.time()
+
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                    self.memory_hits += 1
+                    if self._db is not None:
+                        self._touched[key] = now
+                else:
+                    missing.append(key)
+
+            if len(self._touched) >= self.touch_batch_size:
+                self._write_touched()
+
+            if self._db is not None and missing:
+                disk_found = self._read_disk(missing)
+                self.disk_hits += len(disk_found)
+                for key, vector in disk_found.items():
+                    self._remember(key, vector)
+                found.update(disk_found)
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+
+        return found
+
+    def put_many(self, keys: List[str], vectors: np.ndarray) -> None:
+        """
+        Store one vector per key in both tiers.
+        """
+
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._remember(key, np.array(vector, dtype=np.float32))
+
+            if self._db is not None and len(keys):
+                now = time.time()
+                rows = [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in zip(keys, vectors)]
+                replaced = self._disk_size(keys)
+                self._db.executemany("INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)", rows)
+                self._db.commit()
+                for key in keys:
+                    self._touched.pop(key, None)
+                self._disk_bytes += sum(len(row[1]) for row in rows) - replaced
+                self._evict_disk()
+
+    def flush(self) -> None:
+        """
+        Write the access times of the memory hits since the last write to disk.
+        """
+
+        with self._lock:
+            self._write_touched()
+
+    def close(self) -> None:
+        if self._db is not None:
+            self.flush()
+            self._db.close()
+            self._db = None
+
+    def _write_touched(self) -> None:
+        if self._db is not None and self._touched:
+            self._db.executemany("UPDATE embeddings SET last_access = ? WHERE key = ?",
+                                 [(accessed, key) for key, accessed in self._touched.items()])
+            self._db.commit()
+        self._touched.clear()
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _read_disk(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+
+        # stay below SQLite's default limit of host parameters
+        for i in range(0, len(keys), 900):
+            part = keys[i:i + 900]
+            placeholders = ",".join("?" * len(part))
+            rows = self._db.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part).fetchall()
+            found.update({key: np.frombuffer(blob, dtype=np.float32) for key, blob in rows})
+
+        if found:
+            now = time.time()
+            self._db.executemany("UPDATE embeddings SET last_access = ? WHERE key = ?", [(now, key) for key in found])
+            self._db.commit()
+
+        return found
+
+    def _disk_size(self, keys: List[str]) -> int:
+        size = 0
+        for i in range(0, len(keys), 900):
+            part = keys[i:i + 900]
+            placeholders = ",".join("?" * len(part))
+            size += self._db.execute(f"SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings WHERE key IN ({placeholders})", part).fetchone()[0]
+        return size
+
+    def _evict_disk(self) -> None:
+        """
+        Delete the least recently used rows until the disk tier is back under 90% of its cap.
+        """
+
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+
+        self._write_touched()
+        target = int(self.max_disk_bytes * 0.9)
+        evicted_keys = []
+
+        for key, size in self._db.execute("SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_access ASC"):
+            if self._disk_bytes <= target:
+                break
+            evicted_keys.append((key,))
+            self._disk_bytes -= size
+
+        self._db.executemany("DELETE FROM embeddings WHERE key = ?", evicted_keys)
+        self._db.commit()
+        self.evictions += len(evicted_keys)
+
+
+class CachedEmbeddingService:
+    """
+    Puts an EmbeddingCache in front of an EmbeddingService.
+    Only texts that miss the cache are sent to the model.
+    Can be passed anywhere an EmbeddingService is expected, e.g. prepare_new_nodes.
+    """
+
+    def __init__(self, embedding_service: EmbeddingService = None, cache: EmbeddingCache = None) -> None:
+
+        self.embedding_service = EmbeddingService() if embedding_service is None else embedding_service
+        self.cache = EmbeddingCache() if cache is None else cache
+
+    @property
+    def model_id(self) -> str:
+        return self.embedding_service.model_id
+
+    @property
+    def dimensions(self) -> int:
+        return self.embedding_service.dimensions
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return self.cache.stats
+
+    def get_document_embedding(self, chunk_text: str) -> List[float]:
+        """
+        Get embedding for a single document text string.
+        """
+
+        return self.get_document_embeddings([chunk_text])[0].tolist()
+
+    def get_document_embeddings(self, chunk_texts: List[str], batch_size: int = 256, n_process: int = 1) -> np.ndarray:
+        """
+        Get embeddings for many document text strings, embedding only the cache misses.
+        Returns a C-contiguous float32 matrix with one row per text.
+        """
+
+        model_id = self.model_id
+        keys = [EmbeddingCache.make_key(text, model_id) for text in chunk_texts]
+        found = self.cache.get_many(keys)
+
+        # embed each distinct missing text once
+        missing = list(OrderedDict.fromkeys(key for key in keys if key not in found))
+
+        if missing:
+            text_by_key = dict(zip(keys, chunk_texts))
+            new_vectors = self.embedding_service.get_document_embeddings([text_by_key[key] for key in missing],
+                                                                         batch_size=batch_size,
+                                                                         n_process=n_process)
+            self.cache.put_many(missing, new_vectors)
+            found.update(zip(missing, new_vectors))
+
+        result = np.zeros((len(chunk_texts), self.dimensions), dtype=np.float32)
+        for i, key in enumerate(keys):
+            result[i] = found[key]
+
+        return result
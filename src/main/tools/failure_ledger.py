@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+import json
+import random
+import uuid
+
+if TYPE_CHECKING:
+    from google.cloud import storage
+
+DAY_FORMAT = "%Y%m%d"
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class FailureLedger:
+    """
+    Append-only record of the videos whose transcript could not be fetched, in GCP Storage:
+        youtube/failures/<playlist>/pending/<day of next retry>/<written at>-<id>.jsonl
+        youtube/failures/<playlist>/permanent/<written at>-<id>.jsonl
+    Each write adds new shard objects and never rewrites old ones. Pending shards are grouped by the day their
+    entries are due, so finding the due entries lists and reads only the shards up to today.
+    Shards are deleted once their entries have been retried, see RetryScheduler.complete.
+    """
+
+    def __init__(self, bucket: storage.Bucket, playlist_title: str = "") -> None:
+
+        self.bucket = bucket
+        self.prefix = "youtube/failures/"+(playlist_title or "default")+"/"
+
+    def _shard_name(self, folder: str, now: datetime) -> str:
+        return f"{self.prefix}{folder}/{now.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.jsonl"
+
+    def append(self, entries: List[Dict], now: datetime = None) -> List[str]:
+        """
+        Write the entries as new shards, one per day of next retry plus one for permanent failures.
+        Returns the names of the shards written.
+        """
+
+        now = now or utc_now()
+        shards = {}
+
+        for entry in entries:
+            if entry.get('permanent'):
+                folder = "permanent"
+            else:
+                folder = "pending/" + datetime.fromisoformat(entry['next_retry']).strftime(DAY_FORMAT)
+            shards.setdefault(folder, []).append(entry)
+
+        names = []
+        for folder, shard_entries in shards.items():
+            name = self._shard_name(folder, now)
+            self.bucket.blob(name).upload_from_string("\n".join(json.dumps(entry) for entry in shard_entries) + "\n",
+                                                      content_type='application/x-ndjson')
+            names.append(name)
+
+        return names
+
+    def due_shards(self, now: datetime = None) -> List[str]:
+        """
+        Names of the pending shards due up to and including today.
+        """
+
+        now = now or utc_now()
+        end = self.prefix + "pending/" + (now + timedelta(days=1)).strftime(DAY_FORMAT)
+        return [blob.name for blob in self.bucket.list_blobs(prefix=self.prefix + "pending/", end_offset=end)]
+
+    def read(self, shard_name: str) -> List[Dict]:
+        blob = self.bucket.get_blob(shard_name)
+        if blob is None:
+            return []
+        return [json.loads(line) for line in blob.download_as_text().splitlines() if line.strip()]
+
+    def delete(self, shard_names: Iterable[str]) -> None:
+        for name in shard_names:
+            self.bucket.blob(name).delete()
+
+    def permanent(self) -> List[Dict]:
+        """
+        Every permanent failure. Only for inspection, retries never read these.
+        """
+
+        entries = []
+        for blob in self.bucket.list_blobs(prefix=self.prefix + "permanent/"):
+            entries.extend(self.read(blob.name))
+        return entries
+
+
+class RetryScheduler:
+    """
+    Decides when a failed transcript is tried again, and when to give up on it.
+    Errors are classified by exception name:
+        never_retry_errors  permanent at once, e.g. an invalid video id
+        unavailable_errors  no transcript yet, e.g. an unaired live video, retried after `unavailable_delay`
+        anything else       transient, e.g. a network error, retried after `transient_delay`
+    The delay doubles with every attempt, up to `max_delay`, with +-`jitter` spread so retries do not bunch up.
+    After `max_attempts` attempts a failure is permanent.
+    """
+
+    def __init__(self, ledger: FailureLedger,
+                 unavailable_errors: Iterable[str] = (),
+                 never_retry_errors: Iterable[str] = (),
+                 transient_delay: float = 900.0,
+                 unavailable_delay: float = 86_400.0,
+                 max_delay: float = 30 * 86_400.0,
+                 max_attempts: int = 8,
+                 jitter: float = 0.1) -> None:
+
+        self.ledger = ledger
+        self.unavailable_errors = set(unavailable_errors)
+        self.never_retry_errors = set(never_retry_errors)
+        self.transient_delay = transient_delay
+        self.unavailable_delay = unavailable_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.jitter = jitter
+
+    def delay(self, error: str, attempts: int) -> Optional[float]:
+        """
+        Seconds until the next attempt after `attempts` failed ones, or None if the failure is permanent.
+        """
+
+        if error in self.never_retry_errors or attempts >= self.max_attempts:
+            return None
+
+        base = self.unavailable_delay if error in self.unavailable_errors else self.transient_delay
+        delay = min(self.max_delay, base * 2 ** (attempts - 1))
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def entry(self, video: Dict[str, str], previous: Dict = None, now: datetime = None) -> Dict:
+        """
+        The ledger entry of a failed attempt at `video`, which carries the exception name under 'error'.
+        `previous` is its last entry, if it had failed before.
+        """
+
+        now = now or utc_now()
+        attempts = (previous or {}).get('attempts', 0) + 1
+        error = video.get('error') or "Exception"
+        delay = self.delay(error, attempts)
+
+        return {"id": video['id'],
+                "title": video.get('title'),
+                "publish_date": video.get('publish_date'),
+                "error": error,
+                "attempts": attempts,
+                "first_failed": (previous or {}).get('first_failed') or now.isoformat(timespec="seconds"),
+                "last_failed": now.isoformat(timespec="seconds"),
+                "next_retry": None if delay is None else (now + timedelta(seconds=delay)).isoformat(timespec="seconds"),
+                "permanent": delay is None}
+
+    def record_failures(self, failed: List[Dict[str, str]], now: datetime = None) -> List[Dict]:
+        """
+        Append first failures to the ledger. Costs one write per shard, whatever the size of the ledger.
+        """
+
+        entries = [self.entry(video, now=now) for video in failed]
+        if entries:
+            self.ledger.append(entries, now=now)
+        return entries
+
+    def due(self, now: datetime = None) -> Tuple[List[Dict], List[Dict], List[str]]:
+        """
+        Read the due shards. Returns the entries due for a retry (one per video, the one with most attempts),
+        the entries of those shards that are not due yet, and the names of the shards read.
+        """
+
+        now = now or utc_now()
+        shards = self.ledger.due_shards(now)
+
+        due = {}
+        not_due = []
+        for shard in shards:
+            for entry in self.ledger.read(shard):
+                if datetime.fromisoformat(entry['next_retry']) > now:
+                    not_due.append(entry)
+                elif entry['id'] not in due or entry['attempts'] > due[entry['id']]['attempts']:
+                    due[entry['id']] = entry
+
+        return list(due.values()), not_due, shards
+
+    def complete(self, due: List[Dict], not_due: List[Dict], shards: List[str], failed: List[Dict[str, str]],
+                 now: datetime = None) -> Dict[str, int]:
+        """
+        Record the outcome of retrying `due`: `failed` are the videos that failed again, with their 'error'.
+        Their new entries and the `not_due` ones are appended before the read shards are deleted,
+        so an interrupted run retries some videos twice rather than losing them.
+        """
+
+        now = now or utc_now()
+        previous = {entry['id']: entry for entry in due}
+        entries = [self.entry(video, previous.get(video['id']), now) for video in failed]
+
+        if entries or not_due:
+            self.ledger.append(entries + not_due, now=now)
+        self.ledger.delete(shards)
+
+        return {"retried": len(due),
+                "recovered": len(due) - len(entries),
+                "rescheduled": sum(not entry['permanent'] for entry in entries),
+                "permanent": sum(entry['permanent'] for entry in entries)}
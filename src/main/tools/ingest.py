@@ -0,0 +1,446 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Callable, Dict, List
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+import argparse
+import json
+import os
+import threading
+import time
+
+import requests
+
+if TYPE_CHECKING:
+    from google.cloud import storage
+
+from n4j.communicator import GraphWriter
+from tools.chunker import Chunker
+from tools.dedup import COLLAPSE, DROP, NearDuplicateFilter
+from tools.embedding import EmbeddingService
+from tools.embedding_cache import CachedEmbeddingService, EmbeddingCache
+from tools.manifest import IngestionManifest
+from tools.pipeline import IngestionRecorder
+from tools.scraper import STORAGE_HOST, YOUTUBE_HOST, Scraper
+from utils.concurrency import HostRateLimiter, StagePool
+from utils.metrics import metrics
+from utils.streaming import batch_iterator
+from utils.normalization import TextNormalizer
+from utils.utils import prepare_new_nodes
+
+# the stages shared by every playlist of a run, in pipeline order
+STAGES = ("youtube", "storage", "split", "embed", "load")
+
+# embedding service of an embedding worker process, built once by _init_embedding_worker
+_worker_embedding_service = None
+
+
+def _init_embedding_worker(embedding_cache: str = None) -> None:
+    global _worker_embedding_service
+    _worker_embedding_service = CachedEmbeddingService(cache=EmbeddingCache(path=embedding_cache))
+
+
+def _embed_in_worker(texts: List[str]):
+    return _worker_embedding_service.get_document_embeddings(texts)
+
+
+class IngestionProgress:
+    """
+    Counts per playlist and the state of the shared stages, printed as one combined line.
+    """
+
+    def __init__(self, stages: Dict[str, StagePool]) -> None:
+
+        self.stages = stages
+        self.playlists = {}
+        self._lock = threading.Lock()
+
+    def set_state(self, title: str, state: str) -> None:
+        with self._lock:
+            self.playlists.setdefault(title, {"state": "waiting", "chunks": 0, "loaded": 0})['state'] = state
+
+    def add(self, title: str, counter: str, value: int = 1) -> None:
+        with self._lock:
+            self.playlists[title][counter] += value
+
+    def line(self) -> str:
+        with self._lock:
+            playlists = [f"{title}: {p['state']} {p['chunks']} chunks {p['loaded']} loaded"
+                         for title, p in self.playlists.items() if p['state'] not in ("waiting", "done", "failed")]
+            done = sum(p['state'] == "done" for p in self.playlists.values())
+
+        stages = " ".join(f"{name} {stage.in_flight}/{stage.limit} ({stage.blocked_seconds:.0f}s blocked)"
+                          for name, stage in self.stages.items())
+        return " | ".join(playlists + [f"done {done}/{len(self.playlists)}", stages])
+
+    def print_until(self, stop: threading.Event, interval: float = 1.0) -> None:
+        while not stop.wait(interval):
+            print(self.line(), "                  ", end="\r")
+
+
+class IngestionScheduler:
+    """
+    Runs many playlists through the scrape, download, split, embed and load stages at once, so the network bound,
+    CPU bound and database bound stages of different playlists overlap, instead of one playlist after the other.
+
+    The playlists share one GCP Storage bucket, one YouTube rate limiter and these pools:
+        youtube   `scrape_workers` threads fetching transcripts from YouTube, with `scrape` only
+        storage   `io_workers` threads uploading transcripts to and downloading them from GCP Storage
+        split     `split_processes` chunking worker processes
+        embed     `embed_processes` processes with their own CachedEmbeddingService, or, if 0, one thread with `embedding_service`,
+                  by default a CachedEmbeddingService
+        load      `neo4j_sessions` threads writing batches through `writer`, each in its own session
+    Each stage admits at most `limits[stage]` unfinished tasks across all playlists, by default twice its workers.
+    A playlist submitting to a full stage waits, so a slow stage holds back the stages feeding it and memory stays bounded.
+    Up to `max_playlists` playlists are in flight, of which up to `scrape_playlists` are scraping new videos.
+
+    With `manifest`, unchanged videos are skipped and changed videos replaced per playlist, see IngestionRecorder.
+    A NearDuplicateFilter, `dedup`, is shared by every playlist.
+    The default embedding services keep the disk tier of their EmbeddingCache in the SQLite file `embedding_cache`, if given,
+    so chunks embedded by an earlier run, e.g. of a replaced video, are not embedded again.
+    `chunker_settings` are passed to every Chunker. Unless they set one, transcripts are cleaned once before splitting
+    by a TextNormalizer; `cleaning_functions` would instead run on every child chunk after splitting.
+    """
+
+    def __init__(self,
+                 bucket: storage.Bucket = None,
+                 embedding_service: EmbeddingService = None,
+                 writer: GraphWriter = None,
+                 io_workers: int = 16,
+                 split_processes: int = None,
+                 embed_processes: int = 0,
+                 neo4j_sessions: int = 4,
+                 limits: Dict[str, int] = None,
+                 max_playlists: int = 2,
+                 scrape: bool = False,
+                 scrape_playlists: int = 1,
+                 scrape_workers: int = 8,
+                 channel_id: str = None,
+                 rate_limits: Dict[str, float] = None,
+                 transcript_api=None,
+                 cleaning_functions: List[Callable[[str], str]] = None,
+                 embed_batch_size: int = 256,
+                 load_batch_size: int = 500,
+                 manifest: bool = False,
+                 dedup: NearDuplicateFilter = None,
+                 chunker_settings: Dict[str, Any] = None,
+                 embedding_cache: str = None) -> None:
+
+        self._bucket = bucket
+        self.embedding_service = embedding_service
+        self.embedding_cache = embedding_cache
+        self.writer = writer
+
+        self.io_workers = io_workers
+        self.split_processes = split_processes or os.cpu_count() or 1
+        self.embed_processes = embed_processes
+        self.neo4j_sessions = neo4j_sessions
+        self.limits = {"youtube": 2 * scrape_workers,
+                       "storage": 2 * io_workers,
+                       "split": 2 * self.split_processes,
+                       "embed": 2 * max(1, embed_processes),
+                       "load": 2 * neo4j_sessions,
+                       **(limits or {})}
+        self.max_playlists = max_playlists
+
+        self.scrape = scrape
+        self.scrape_playlists = scrape_playlists
+        self.scrape_workers = scrape_workers
+        self.channel_id = channel_id
+        self.rate_limiter = HostRateLimiter(rate_limits)
+        self.transcript_api = transcript_api
+        self._http = requests.Session()
+
+        self.cleaning_functions = cleaning_functions
+        self.embed_batch_size = embed_batch_size
+        self.load_batch_size = load_batch_size
+        self.manifest = manifest
+        self.dedup = dedup
+        self.chunker_settings = {"normalizer": TextNormalizer(), **(chunker_settings or {})}
+
+        self._dedup_lock = threading.Lock()
+        self._scrape_slots = threading.BoundedSemaphore(scrape_playlists)
+        self._channel_lock = threading.Lock()
+        self.stages = {}
+        self.progress = None
+
+    @property
+    def bucket(self) -> storage.Bucket:
+        if self._bucket is None:
+            self._bucket = Chunker().bucket
+        return self._bucket
+
+    def _chunker(self, executor=None) -> Chunker:
+        return Chunker(bucket=self.bucket, max_workers=self.io_workers, executor=executor, **self.chunker_settings)
+
+    def _start_stages(self) -> None:
+        if self.writer is None:
+            self.writer = GraphWriter()
+
+        if self.embed_processes > 0:
+            embed_pool = ProcessPoolExecutor(max_workers=self.embed_processes, initializer=_init_embedding_worker,
+                                             initargs=(self.embedding_cache,))
+            self._embed = _embed_in_worker
+        else:
+            if self.embedding_service is None:
+                self.embedding_service = CachedEmbeddingService(cache=EmbeddingCache(path=self.embedding_cache))
+            embed_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+            self._embed = self.embedding_service.get_document_embeddings
+
+        pools = {"storage": ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="transcript-storage"),
+                 "split": self._chunker().chunking_pool(self.split_processes),
+                 "embed": embed_pool,
+                 "load": ThreadPoolExecutor(max_workers=self.neo4j_sessions, thread_name_prefix="neo4j-load")}
+        if self.scrape:
+            pools["youtube"] = ThreadPoolExecutor(max_workers=self.scrape_workers, thread_name_prefix="transcript-fetch")
+
+        self.stages = {name: StagePool(name, pools[name], self.limits[name]) for name in STAGES if name in pools}
+        self.progress = IngestionProgress(self.stages)
+
+    def _scraper(self, playlist_id: str) -> Scraper:
+        scraper = Scraper(channel_id=self.channel_id, playlist_id=playlist_id, bucket=self.bucket, transcript_api=self.transcript_api,
+                          http_session=self._http, rate_limiter=self.rate_limiter,
+                          fetch_executor=self.stages['youtube'], upload_executor=self.stages['storage'])
+
+        # the channel id is looked up once for every playlist
+        with self._channel_lock:
+            self.channel_id = scraper.channel_id
+
+        return scraper
+
+    def _scrape(self, title: str, playlist_id: str) -> int:
+        """
+        Fetch the transcripts of the new videos of the playlist and record the failures, see Scraper.add_new_youtube_urls.
+        """
+
+        with self._scrape_slots:
+            self.progress.set_state(title, "scraping")
+            scraper = self._scraper(playlist_id)
+            new_videos = scraper.add_new_youtube_urls(video_info_file_name=title, transcripts_folder=title,
+                                                      max_workers=self.scrape_workers)
+            scraper.update_unsuccessful_transcripts(transcripts_folder=title)
+
+        return len(new_videos)
+
+    def _filter(self, batch: List[Dict]) -> List[Dict]:
+        if self.dedup is None:
+            return batch
+        with self._dedup_lock:
+            return self.dedup.filter_rows(batch)
+
+    def ingest_playlist(self, title: str, playlist_id: str) -> Dict[str, float]:
+        """
+        Scrape, if enabled, and load one playlist through the shared stages.
+        Embedded batches are loaded, and loaded batches recorded, in the order the rows were chunked.
+        """
+
+        start = time.time()
+        self.progress.set_state(title, "waiting")
+        scraped = self._scrape(title, playlist_id) if self.scrape else 0
+
+        self.progress.set_state(title, "chunking")
+        chunker = self._chunker(self.stages['storage'])
+        manifest = IngestionManifest(self.bucket, title) if self.manifest else None
+        unsuccessful = []
+        removed = self.dedup.removed if self.dedup is not None else 0
+
+        rows = chunker.iter_chunks(playlist_title=title, cleaning_functions=self.cleaning_functions, unsuccessful=unsuccessful,
+                                   manifest=manifest, n_process=self.split_processes, split_executor=self.stages['split'])
+
+        recorder = IngestionRecorder(chunker, self.writer, manifest, self.cleaning_functions)
+        embedding = deque()
+        loading = deque()
+        pending_rows = []
+        loaded = 0
+
+        def finish_load() -> None:
+            nonlocal loaded
+            batch, future = loading.popleft()
+            written = future.result()
+            recorder.loaded(batch, written)
+            if written:
+                loaded += len(batch)
+                metrics.inc("rows_loaded_total", len(batch), playlist=title)
+                self.progress.add(title, "loaded", len(batch))
+
+        def submit_load(batch: List[Dict]) -> None:
+            replace_sources = recorder.replace_sources(batch)
+
+            # a batch replacing the documents of a changed video must not overlap with the other batches of that video
+            if replace_sources:
+                while loading:
+                    finish_load()
+
+            loading.append((batch, self.stages['load'].submit(self.writer.load_nodes, batch, replace_sources)))
+            while loading and (loading[0][1].done() or len(loading) > 2 or replace_sources):
+                finish_load()
+
+        def finish_embedding() -> None:
+            batch, future = embedding.popleft()
+            pending_rows.extend(prepare_new_nodes(batch, embedding_service=None, playlist_id=playlist_id, embeddings=future.result()))
+            while len(pending_rows) >= self.load_batch_size:
+                submit_load(pending_rows[:self.load_batch_size])
+                del pending_rows[:self.load_batch_size]
+
+        try:
+            for batch in batch_iterator(rows, self.embed_batch_size):
+                self.progress.add(title, "chunks", len(batch))
+                batch = self._filter(batch)
+                texts = [row['transcript'] for row in batch if row.get('duplicate_of') is None]
+                embedding.append((batch, self.stages['embed'].submit(self._embed, texts)))
+
+                while embedding and (embedding[0][1].done() or len(embedding) > 2):
+                    finish_embedding()
+
+            self.progress.set_state(title, "loading")
+            while embedding:
+                finish_embedding()
+            if pending_rows:
+                submit_load(list(pending_rows))
+            while loading:
+                finish_load()
+
+            recorder.finish()
+
+        finally:
+            # batches still in flight after a failure are awaited, so nothing is written behind the caller's back
+            for _, future in list(embedding) + list(loading):
+                future.exception()
+            recorder.save()
+
+        metrics.inc("videos_skipped_total", chunker.skipped_videos, playlist=title)
+        seconds = time.time() - start
+
+        return {"new_videos": scraped,
+                "rows_loaded": loaded,
+                "skipped_videos": chunker.skipped_videos,
+                "failed_transcripts": len(unsuccessful),
+                "near_duplicates_removed": self.dedup.removed - removed if self.dedup is not None else 0,
+                "seconds": round(seconds, 2),
+                "rows_per_second": round(loaded / seconds, 1) if seconds else 0.0}
+
+    def _run_playlist(self, title: str, playlist_id: str) -> Dict[str, float]:
+        try:
+            summary = self.ingest_playlist(title, playlist_id)
+            self.progress.set_state(title, "done")
+        except Exception as err:
+            self.progress.set_state(title, "failed")
+            metrics.inc("playlists_failed_total", playlist=title)
+            print()
+            print(f"{title}: failed: {err!r}")
+            return {"error": repr(err)}
+
+        print()
+        print(f"{title}: {summary}")
+        return summary
+
+    def run(self, playlists: Dict[str, str], progress_interval: float = 1.0) -> Dict[str, Dict[str, float]]:
+        """
+        Ingest the playlists, {title: playlist id} as in resources/playlist_ids.json.
+        A failed playlist does not stop the others, its summary holds the error.
+        Returns the summary of each playlist, see ingest_playlist.
+        """
+
+        self._start_stages()
+        for title in playlists:
+            self.progress.set_state(title, "waiting")
+
+        stop = threading.Event()
+        printer = threading.Thread(target=self.progress.print_until, args=(stop, progress_interval), name="progress", daemon=True)
+        printer.start()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_playlists, thread_name_prefix="playlist") as executor:
+                futures: Dict[str, Future] = {title: executor.submit(self._run_playlist, title, playlist_id)
+                                              for title, playlist_id in playlists.items()}
+                summaries = {title: future.result() for title, future in futures.items()}
+        finally:
+            stop.set()
+            printer.join()
+            for stage in self.stages.values():
+                stage.shutdown()
+            if isinstance(self.embedding_service, CachedEmbeddingService):
+                self.embedding_service.cache.flush()
+
+        if metrics.enabled:
+            metrics.export()
+
+        return summaries
+
+
+def _parse_limits(values: List[str]) -> Dict[str, int]:
+    limits = {}
+    for value in values or []:
+        stage, _, limit = value.partition("=")
+        if stage not in STAGES or not limit.isdigit():
+            raise argparse.ArgumentTypeError(f"expected STAGE=N with STAGE one of {', '.join(STAGES)}, got {value!r}")
+        limits[stage] = int(limit)
+    return limits
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Scrape and load playlists into the graph through shared worker pools.")
+    parser.add_argument("playlists", nargs="*", help="playlist titles, default: every playlist in the playlists file")
+    parser.add_argument("--playlists-file", default="resources/playlist_ids.json")
+    parser.add_argument("--scrape", action="store_true", help="fetch the transcripts of new videos before loading")
+    parser.add_argument("--channel-id", default="UCt7fwAhXDy3oNFTAzF2o8Pw")
+    parser.add_argument("--youtube-rate", type=float, help="maximum transcript requests per second to YouTube")
+    parser.add_argument("--storage-rate", type=float, help="maximum transcript uploads per second to GCP Storage")
+    parser.add_argument("--max-playlists", type=int, default=2)
+    parser.add_argument("--scrape-playlists", type=int, default=1)
+    parser.add_argument("--scrape-workers", type=int, default=8, help="threads fetching transcripts from YouTube")
+    parser.add_argument("--io-workers", type=int, default=16, help="threads uploading and downloading transcripts")
+    parser.add_argument("--split-processes", type=int, default=None)
+    parser.add_argument("--embed-processes", type=int, default=0)
+    parser.add_argument("--embedding-cache", help="SQLite file keeping embeddings across runs, default: in memory only")
+    parser.add_argument("--neo4j-sessions", type=int, default=4)
+    parser.add_argument("--limit", action="append", metavar="STAGE=N", help="maximum unfinished tasks of a stage, repeatable")
+    parser.add_argument("--embed-batch-size", type=int, default=256)
+    parser.add_argument("--load-batch-size", type=int, default=500)
+    parser.add_argument("--manifest", action="store_true", help="skip videos already ingested, see IngestionManifest")
+    parser.add_argument("--dedup", choices=[DROP, COLLAPSE], help="suppress near-duplicate chunks, see NearDuplicateFilter")
+    parser.add_argument("--vector-dimensions", type=int, default=96)
+    parser.add_argument("--skip-schema", action="store_true", help="do not create the constraints and indexes first")
+    args = parser.parse_args()
+
+    with open(args.playlists_file) as f:
+        playlists = json.load(f)
+    if args.playlists:
+        playlists = {title: playlists[title] for title in args.playlists}
+
+    writer = GraphWriter()
+    if not args.skip_schema:
+        try:
+            writer.create_constraints()
+            writer.create_indexes(vector_dimensions=args.vector_dimensions)
+        except Exception as e:
+            print(e)
+
+    scheduler = IngestionScheduler(writer=writer,
+                                   io_workers=args.io_workers,
+                                   split_processes=args.split_processes,
+                                   embed_processes=args.embed_processes,
+                                   neo4j_sessions=args.neo4j_sessions,
+                                   limits=_parse_limits(args.limit),
+                                   max_playlists=args.max_playlists,
+                                   scrape=args.scrape,
+                                   scrape_playlists=args.scrape_playlists,
+                                   scrape_workers=args.scrape_workers,
+                                   channel_id=args.channel_id,
+                                   rate_limits={YOUTUBE_HOST: args.youtube_rate, STORAGE_HOST: args.storage_rate},
+                                   embed_batch_size=args.embed_batch_size,
+                                   load_batch_size=args.load_batch_size,
+                                   manifest=args.manifest,
+                                   dedup=NearDuplicateFilter(mode=args.dedup) if args.dedup else None,
+                                   chunker_settings={"normalizer": TextNormalizer()},
+                                   embedding_cache=args.embedding_cache)
+
+    summaries = scheduler.run(playlists)
+
+    print()
+    for title, summary in summaries.items():
+        print(title, summary)
+
+
+if __name__ == "__main__":
+    main()
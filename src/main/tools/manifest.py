@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Dict, Optional
+from datetime import datetime, timezone
+import json
+import threading
+
+if TYPE_CHECKING:
+    from google.cloud import storage
+
+
+class IngestionManifest:
+    """
+    Records, per video, which transcript version was loaded into the graph and with which chunking parameters.
+    The manifest is a single JSON object per playlist in GCP Storage:
+        youtube/manifests/<playlist>.json
+    A rerun can skip every video whose transcript hash and chunking key are unchanged.
+    """
+
+    def __init__(self, bucket: storage.Bucket, playlist_title: str = "") -> None:
+
+        self.bucket = bucket
+        self.blob_name = "youtube/manifests/"+(playlist_title or "default")+".json"
+        self._lock = threading.Lock()
+        self._dirty = False
+
+        blob = self.bucket.get_blob(self.blob_name)
+        self._entries = json.loads(blob.download_as_text()) if blob is not None else {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, video_id: str) -> Optional[Dict[str, str]]:
+        return self._entries.get(video_id)
+
+    def is_current(self, video_id: str, transcript_hash: str, chunking_key: str) -> bool:
+        """
+        True if the video was already ingested from this transcript version with these chunking parameters.
+        """
+
+        entry = self._entries.get(video_id)
+        return (entry is not None 
+                and transcript_hash is not None
+                and entry.get("transcript_hash") == transcript_hash 
+                and entry.get("chunking_key") == chunking_key)
+
+    def record(self, video_id: str, transcript_hash: str, chunking_key: str) -> None:
+        with self._lock:
+            self._entries[video_id] = {"transcript_hash": transcript_hash,
+                                       "chunking_key": chunking_key,
+                                       "ingested_at": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+            self._dirty = True
+
+    def save(self) -> None:
+        """
+        Upload the manifest if anything was recorded since the last save.
+        """
+
+        with self._lock:
+            if not self._dirty:
+                return
+            self.bucket.blob(self.blob_name).upload_from_string(json.dumps(self._entries), content_type='application/json')
+            self._dirty = False
@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timezone
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import os
+import threading
+import uuid
+
+if TYPE_CHECKING:
+    from google.cloud import storage
+
+from utils.concurrency import ordered_prefetch
+from utils.metrics import metrics
+
+# transcript storage layouts
+BLOBS_LAYOUT = "blobs"
+PACKED_LAYOUT = "packed"
+
+
+def resolve_transcript_layout(layout: str = None) -> str:
+    """
+    The layout to write transcripts in: the given one, else the TRANSCRIPT_LAYOUT environment variable, else one blob per video.
+    """
+
+    layout = layout or os.environ.get("TRANSCRIPT_LAYOUT") or BLOBS_LAYOUT
+    if layout not in (BLOBS_LAYOUT, PACKED_LAYOUT):
+        raise ValueError(f"unknown transcript layout {layout!r}, expected {BLOBS_LAYOUT!r} or {PACKED_LAYOUT!r}")
+    return layout
+
+
+class PackedTranscriptStore:
+    """
+    Transcripts of a playlist packed into a few objects in GCP Storage, instead of one blob per video:
+        youtube/packed/<playlist>/shards/<written at>-<id>.jsonl.gz
+        youtube/packed/<playlist>/index.json
+    Each transcript is its own gzip member, so a shard is a valid .jsonl.gz file and a single transcript
+    can be read with a ranged read of its bytes. The index maps every video id to its shard, offset and
+    length, and to the md5 of its JSON text, which equals the md5_hash of the same transcript as a single blob.
+
+    Written transcripts are buffered and flushed as a new shard every `shard_size` transcripts, and by flush().
+    A transcript written again is pointed to its new shard, the old copy stays behind until compact().
+    Only one writer per playlist is supported at a time.
+    """
+
+    def __init__(self, bucket: storage.Bucket, playlist_title: str = "", shard_size: int = 500) -> None:
+
+        self.bucket = bucket
+        self.prefix = "youtube/packed/"+(playlist_title or "default")+"/"
+        self.index_name = self.prefix+"index.json"
+        self.shard_size = shard_size
+
+        self._lock = threading.RLock()
+        self._index = None
+        self._buffer = []
+
+    @property
+    def index(self) -> Dict[str, Dict]:
+        """
+        video id -> {"shard", "offset", "length", "md5"}, downloaded on first use.
+        """
+
+        with self._lock:
+            if self._index is None:
+                blob = self.bucket.get_blob(self.index_name)
+                self._index = json.loads(blob.download_as_text())['videos'] if blob is not None else {}
+            return self._index
+
+    def exists(self) -> bool:
+        return self.bucket.get_blob(self.index_name) is not None
+
+    def __contains__(self, video_id: str) -> bool:
+        return video_id in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def ids(self) -> List[str]:
+        return list(self.index)
+
+    def transcript_hash(self, video_id: str) -> Optional[str]:
+        entry = self.index.get(video_id)
+        return entry['md5'] if entry is not None else None
+
+    @staticmethod
+    def _md5(data: bytes) -> str:
+        return base64.b64encode(hashlib.md5(data).digest()).decode()
+
+    def add(self, video_id: str, text: str) -> None:
+        """
+        Buffer the JSON text of a transcript, as it would be stored in its own blob.
+        """
+
+        with self._lock:
+            self._buffer.append((video_id, text))
+            if len(self._buffer) >= self.shard_size:
+                self._write_shard()
+
+    def flush(self) -> None:
+        """
+        Write the buffered transcripts as a shard and upload the index.
+        """
+
+        with self._lock:
+            if self._buffer:
+                self._write_shard()
+
+    def _write_shard(self) -> None:
+        index = self.index
+        name = f"{self.prefix}shards/{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.jsonl.gz"
+
+        members = []
+        entries = {}
+        offset = 0
+        for video_id, text in self._buffer:
+            data = text.encode("utf-8")
+            member = gzip.compress(data + b"\n", mtime=0)
+            members.append(member)
+            entries[video_id] = {"shard": name, "offset": offset, "length": len(member), "md5": self._md5(data)}
+            offset += len(member)
+
+        self.bucket.blob(name).upload_from_string(b"".join(members), content_type='application/gzip')
+
+        # the index is uploaded after the shard it points to, so it never references a missing shard
+        index.update(entries)
+        self.bucket.blob(self.index_name).upload_from_string(json.dumps({"videos": index}), content_type='application/json')
+        metrics.inc("packed_shards_written_total")
+
+        self._buffer = []
+
+    def __enter__(self) -> "PackedTranscriptStore":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.flush()
+
+    @staticmethod
+    def _decode(member: bytes) -> Dict[str, str]:
+        return json.loads(gzip.decompress(member))
+
+    def read(self, video_id: str) -> Dict[str, str]:
+        """
+        Read one transcript with a ranged read of its shard.
+        """
+
+        return self._read_range(self.index[video_id])
+
+    def _read_range(self, entry: Dict) -> Dict[str, str]:
+        member = self.bucket.blob(entry['shard']).download_as_bytes(start=entry['offset'], end=entry['offset'] + entry['length'] - 1)
+        return self._decode(member)
+
+    def _read_shard(self, shard: str, entries: List[Tuple[str, Dict]]) -> List[Tuple[str, Dict[str, str]]]:
+        data = self.bucket.blob(shard).download_as_bytes()
+        return [(video_id, self._decode(data[entry['offset']:entry['offset'] + entry['length']])) for video_id, entry in entries]
+
+    def plan_reads(self, video_ids: Iterable[str], whole_shard_share: float = 0.5) -> List[Tuple[Optional[str], List[Tuple[str, Dict]]]]:
+        """
+        Group the reads of the video ids into (shard, [(id, index entry), ...]) to download whole,
+        and (None, [(id, index entry)]) to read by range.
+        A shard is downloaded whole when the wanted transcripts make up at least `whole_shard_share` of its indexed bytes.
+        """
+
+        with self._lock:
+            index = dict(self.index)
+
+        wanted = {}
+        for video_id in video_ids:
+            wanted.setdefault(index[video_id]['shard'], []).append((video_id, index[video_id]))
+
+        shard_bytes = {}
+        for entry in index.values():
+            shard_bytes[entry['shard']] = shard_bytes.get(entry['shard'], 0) + entry['length']
+
+        reads = []
+        for shard, entries in wanted.items():
+            if sum(entry['length'] for _, entry in entries) >= whole_shard_share * shard_bytes[shard]:
+                reads.append((shard, entries))
+            else:
+                reads.extend((None, [item]) for item in entries)
+        return reads
+
+    def read_many(self, video_ids: Iterable[str], max_workers: int = 8,
+                  executor: Executor = None) -> Iterator[Tuple[str, Dict[str, str], Optional[Exception]]]:
+        """
+        Read the transcripts of the video ids on a thread pool, or `executor`, whole shards or ranges, see plan_reads.
+        Yields (video id, transcript, exception) in the order of the planned reads.
+        """
+
+        def run(read):
+            shard, entries = read
+            if shard is None:
+                video_id, entry = entries[0]
+                return [(video_id, self._read_range(entry))]
+            return self._read_shard(shard, entries)
+
+        reads = self.plan_reads(video_ids)
+
+        pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="packed-read") if executor is None else nullcontext(executor)
+        with pool as executor:
+            for read, results, e in ordered_prefetch(run, reads, executor, window=2 * max_workers):
+                if e is not None:
+                    for video_id, _ in read[1]:
+                        yield video_id, None, e
+                    continue
+                for video_id, transcript in results:
+                    yield video_id, transcript, None
+
+    def compact(self) -> int:
+        """
+        Rewrite the transcripts still in the index into new shards and delete shards they no longer point to.
+        Returns the number of shards deleted.
+        """
+
+        self.flush()
+        old_shards = {blob.name for blob in self.bucket.list_blobs(prefix=self.prefix+"shards/")}
+
+        for video_id, transcript, e in self.read_many(self.ids()):
+            if e is not None:
+                raise e
+            self.add(video_id, json.dumps(transcript))
+        self.flush()
+
+        live = {entry['shard'] for entry in self.index.values()}
+        stale = old_shards - live
+        for name in stale:
+            self.bucket.blob(name).delete()
+
+        return len(stale)
+
+
+def migrate_playlist(bucket: storage.Bucket, playlist_title: str = "", shard_size: int = 500, max_workers: int = 8,
+                     delete: bool = False) -> Dict[str, int]:
+    """
+    Pack the per-video transcript blobs of a playlist, youtube/transcripts/<playlist>/<id>.json, into a PackedTranscriptStore.
+    Transcripts already packed with the same md5 are skipped, so an interrupted migration can be rerun.
+    If `delete`, every transcript is read back from the store and compared first, and the original blobs are only
+    deleted when all of them match.
+    """
+
+    prefix = "youtube/transcripts/"+(playlist_title+"/" if playlist_title else "")
+    blobs = [blob for blob in bucket.list_blobs(prefix=prefix) if blob.name.endswith(".json")]
+    store = PackedTranscriptStore(bucket, playlist_title, shard_size=shard_size)
+
+    def video_id(blob) -> str:
+        return blob.name[len(prefix):-len(".json")]
+
+    to_pack = [blob for blob in blobs if store.transcript_hash(video_id(blob)) is None
+               or store.transcript_hash(video_id(blob)) != getattr(blob, "md5_hash", None)]
+
+    print("transcripts: ", len(blobs), "| to pack: ", len(to_pack))
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="transcript-download") as executor:
+        for blob, text, e in ordered_prefetch(lambda blob: blob.download_as_text(), to_pack, executor, window=2 * max_workers):
+            if e is not None:
+                raise e
+            store.add(video_id(blob), text)
+    store.flush()
+
+    deleted = 0
+    if delete:
+        packed = {video_id: transcript for video_id, transcript, e in store.read_many([video_id(blob) for blob in blobs], max_workers)
+                  if e is None}
+        for blob in blobs:
+            original = json.loads(blob.download_as_text())
+            if packed.get(video_id(blob)) != original:
+                raise ValueError(f"packed transcript of {video_id(blob)} does not match {blob.name}, nothing is deleted")
+        for blob in blobs:
+            blob.delete()
+            deleted += 1
+
+    return {"transcripts": len(blobs), "packed": len(to_pack), "deleted": deleted}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pack per-video transcript blobs into shards, see PackedTranscriptStore.")
+    parser.add_argument("playlists", nargs="*", help="playlist folders, default: every title in resources/playlist_ids.json")
+    parser.add_argument("--shard-size", type=int, default=500)
+    parser.add_argument("--max-workers", type=int, default=8)
+    parser.add_argument("--delete", action="store_true", help="delete the per-video blobs once verified")
+    parser.add_argument("--compact", action="store_true", help="also drop superseded copies from the shards")
+    args = parser.parse_args()
+
+    from tools.chunker import Chunker
+
+    bucket = Chunker().bucket
+    playlists = args.playlists
+    if not playlists:
+        with open("resources/playlist_ids.json") as f:
+            playlists = list(json.load(f))
+
+    for playlist_title in playlists:
+        print(playlist_title, migrate_playlist(bucket, playlist_title, shard_size=args.shard_size,
+                                               max_workers=args.max_workers, delete=args.delete))
+        if args.compact:
+            print("stale shards deleted: ", PackedTranscriptStore(bucket, playlist_title, args.shard_size).compact())
+
+
+if __name__ == "__main__":
+    main()
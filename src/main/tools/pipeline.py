@@ -0,0 +1,273 @@
+from typing import Callable, Dict, Iterable, Iterator, List
+import time
+
+from tools.artifact import ChunkArtifact
+from tools.chunker import Chunker
+from tools.dedup import NearDuplicateFilter
+from tools.embedding import EmbeddingService
+from tools.manifest import IngestionManifest
+from n4j.communicator import GraphWriter
+from utils.metrics import metrics
+from utils.streaming import batch_iterator, bounded_stage
+from utils.utils import prepare_new_nodes
+
+
+class IngestionRecorder:
+    """
+    Records the videos of a playlist in its ingestion manifest once all of their rows are written to the graph.
+
+    Rows arrive grouped by video in the order the chunker split them, so once a batch is written every video split
+    before the last video of the batch is complete. This includes videos without rows, e.g. when all of their chunks
+    were dropped as near duplicates, which would otherwise be chunked again on every run.
+    Videos with rows in a failed batch are not recorded, so the next run loads them again.
+
+    The previous documents of videos whose manifest entry is outdated are deleted, by the transaction writing their
+    first batch (pass replace_sources to GraphWriter.load_nodes), or when they are recorded if they have no rows.
+    Without a manifest nothing is recorded or deleted.
+    """
+
+    def __init__(self, chunker: Chunker, writer: GraphWriter, manifest: IngestionManifest = None,
+                 cleaning_functions: List[Callable[[str], str]] = None) -> None:
+
+        self.chunker = chunker
+        self.writer = writer
+        self.manifest = manifest
+        self.cleaning_functions = cleaning_functions
+
+        # chunker.chunked_video_ids before this position are recorded
+        self._position = 0
+        self._failed = set()
+        self._replaced = set()
+
+    def replace_sources(self, batch: List[Dict]) -> List[str]:
+        """
+        The urls of the changed videos whose first rows are in the batch.
+        """
+
+        if self.manifest is None:
+            return []
+
+        urls = []
+        for row in batch:
+            if row['video_id'] in self.chunker.changed_video_ids and row['video_id'] not in self._replaced:
+                self._replaced.add(row['video_id'])
+                urls.append(row['url'])
+        return urls
+
+    def loaded(self, batch: List[Dict], written: bool = True) -> None:
+        """
+        Record the videos completed by a batch, once load_nodes returned `written`.
+        """
+
+        if self.manifest is None or not batch:
+            return
+
+        if not written:
+            self._failed.update(row['video_id'] for row in batch)
+
+        self._record_until(batch[-1]['video_id'])
+
+    def finish(self) -> None:
+        """
+        Record the remaining videos, once every batch is written.
+        """
+
+        if self.manifest is not None:
+            self._record_until(None)
+
+    def save(self) -> None:
+        if self.manifest is not None:
+            self.manifest.save()
+
+    def _record_until(self, video_id: str = None) -> None:
+        chunked = self.chunker.chunked_video_ids
+        end = len(chunked) if video_id is None else chunked.index(video_id, self._position)
+        video_ids = [id for id in chunked[self._position:end] if id not in self._failed]
+        self._position = end
+
+        stale = [id for id in video_ids if id in self.chunker.changed_video_ids and id not in self._replaced]
+        if stale:
+            self.writer.delete_sources([Chunker.video_url(id) for id in stale])
+            self._replaced.update(stale)
+
+        self.chunker.record_ingested(self.manifest, self.cleaning_functions, video_ids=video_ids, save=False)
+
+
+def embed_batches(batches: Iterable[List[Dict[str, str]]], embedding_service: EmbeddingService, playlist_id: str = "") -> Iterator[List[Dict]]:
+    """
+    Embed each batch of chunk rows as it arrives.
+    """
+
+    for batch in batches:
+        yield prepare_new_nodes(data=batch, embedding_service=embedding_service, playlist_id=playlist_id)
+
+
+def stream_playlist_to_graph(chunker: Chunker,
+                             embedding_service: EmbeddingService,
+                             writer: GraphWriter,
+                             playlist_title: str,
+                             playlist_id: str,
+                             ids: List[str] = None,
+                             cleaning_functions: List[Callable[[str], str]] = None,
+                             embed_batch_size: int = 256,
+                             load_batch_size: int = 500,
+                             queue_size: int = 4,
+                             manifest: IngestionManifest = None,
+                             dedup: NearDuplicateFilter = None) -> Dict[str, float]:
+    """
+    Stream a playlist from GCP Storage into the graph.
+
+    Transcripts are downloaded and chunked, chunks are embedded and embedded rows are loaded
+    by separate stages connected with queues of at most `queue_size` batches. Each stage runs
+    concurrently with the others and blocks when the next stage falls behind, so peak memory
+    depends on the batch sizes rather than on the size of the playlist.
+
+    If a manifest is provided, unchanged videos are skipped, the previous documents of changed videos are
+    replaced and every video is recorded in the manifest once all of its rows are written, see IngestionRecorder.
+
+    If a NearDuplicateFilter is provided, near-duplicate chunks are dropped or collapsed before they are embedded.
+    Pass the same filter for every playlist to deduplicate across them.
+
+    The rows loaded per playlist are counted in the `rows_loaded_total` metric, and metrics are exported
+    once the playlist is done.
+
+    returns:
+        counts of loaded rows, skipped videos, failed transcript ids, near duplicates removed, the elapsed time and rows per second.
+    """
+
+    start = time.time()
+    unsuccessful = []
+    loaded = 0
+
+    rows = chunker.iter_chunks(ids=ids, playlist_title=playlist_title,
+                               cleaning_functions=cleaning_functions, unsuccessful=unsuccessful,
+                               manifest=manifest)
+
+    chunk_batches = batch_iterator(rows, embed_batch_size)
+    removed = 0
+    if dedup is not None:
+        removed = dedup.removed
+        chunk_batches = (dedup.filter_rows(batch) for batch in chunk_batches)
+
+    chunk_batches = bounded_stage(chunk_batches, maxsize=queue_size, name="chunk")
+
+    embedded_rows = (row for batch in embed_batches(chunk_batches, embedding_service, playlist_id) for row in batch)
+
+    load_batches = bounded_stage(batch_iterator(embedded_rows, load_batch_size), maxsize=queue_size, name="embed")
+
+    recorder = IngestionRecorder(chunker, writer, manifest, cleaning_functions)
+
+    try:
+        for idx, batch in enumerate(load_batches):
+            written = writer.load_nodes(data=batch, replace_sources=recorder.replace_sources(batch))
+            recorder.loaded(batch, written)
+            if written:
+                loaded += len(batch)
+                metrics.inc("rows_loaded_total", len(batch), playlist=playlist_title)
+            print(playlist_title+": rows loaded: ", loaded, " batch", idx+1, "                  ", end="\r")
+
+        recorder.finish()
+
+    finally:
+        recorder.save()
+
+    print()
+
+    metrics.inc("videos_skipped_total", chunker.skipped_videos, playlist=playlist_title)
+    if metrics.enabled:
+        metrics.export()
+
+    seconds = time.time() - start
+    removed = dedup.removed - removed if dedup is not None else 0
+
+    return {"rows_loaded": loaded,
+            "skipped_videos": chunker.skipped_videos,
+            "failed_transcripts": len(unsuccessful),
+            "near_duplicates_removed": removed,
+            "seconds": round(seconds, 2),
+            "rows_per_second": round(loaded / seconds, 1) if seconds else 0.0}
+
+
+def chunk_to_artifact(chunker: Chunker,
+                      artifact: ChunkArtifact,
+                      playlist_title: str,
+                      ids: List[str] = None,
+                      cleaning_functions: List[Callable[[str], str]] = None,
+                      batch_size: int = 2000) -> int:
+    """
+    Chunking stage: append the chunk rows of a playlist to the artifact.
+    Rows are committed at transcript boundaries, so a restarted run only downloads and splits
+    the videos not yet in the artifact.
+    Returns the number of rows appended.
+    """
+
+    if artifact.chunked:
+        return 0
+
+    done = artifact.video_ids()
+    if done:
+        ids = [id for id in (ids or chunker.transcript_ids(playlist_title)) if id not in done]
+        if not ids:
+            artifact.mark_chunked()
+            return 0
+
+    appended = 0
+    pending = []
+
+    for row in chunker.iter_chunks(ids=ids, playlist_title=playlist_title, cleaning_functions=cleaning_functions):
+        # only commit once the previous video is complete
+        if len(pending) >= batch_size and pending[-1]['video_id'] != row['video_id']:
+            artifact.append_rows(pending)
+            appended += len(pending)
+            pending = []
+
+        pending.append(row)
+
+    artifact.append_rows(pending)
+    artifact.mark_chunked()
+
+    return appended + len(pending)
+
+
+def embed_artifact(artifact: ChunkArtifact, embedding_service: EmbeddingService, batch_size: int = 1024) -> int:
+    """
+    Embedding stage: embed the artifact rows that have no embedding yet.
+    Returns the number of rows embedded.
+    """
+
+    embedded = 0
+
+    for start, texts in artifact.iter_texts(start=artifact.embedded, batch_size=batch_size):
+        artifact.append_embeddings(embedding_service.get_document_embeddings(texts))
+        embedded += len(texts)
+        print("rows embedded: ", artifact.embedded, "/", artifact.rows, "                  ", end="\r")
+
+    print()
+
+    return embedded
+
+
+def load_artifact(artifact: ChunkArtifact, writer: GraphWriter, playlist_id: str = "", batch_size: int = 500) -> int:
+    """
+    Loading stage: write the embedded artifact rows to the graph, continuing after the last checkpoint.
+    The checkpoint only moves past written batches: the stage stops at the first batch that fails to load,
+    so a rerun starts from it.
+    Returns the number of rows loaded.
+    """
+
+    loaded = 0
+
+    for start, rows, embeddings in artifact.iter_embedded_rows(start=artifact.loaded, batch_size=batch_size):
+        written = writer.load_nodes(data=prepare_new_nodes(rows, embedding_service=None, playlist_id=playlist_id, embeddings=embeddings))
+        if not written:
+            print()
+            print("loading stopped at row", start, "of", artifact.rows, "- rerun to continue from it")
+            break
+
+        artifact.mark_loaded(start + len(rows))
+        loaded += len(rows)
+        print("rows loaded: ", artifact.loaded, "/", artifact.rows, "                  ", end="\r")
+
+    print()
+
+    return loaded
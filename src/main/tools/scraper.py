@@ -1,52 +1,118 @@
-from typing import Callable, Dict
-from typing import List, Tuple
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Callable, Dict
+from typing import List, Tuple, Iterator
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import nullcontext
 import os
 import sys
 import io
+import queue
+import threading
 import requests
 import json
 
-import pandas as pd
 # from langchain.schema.document import Document
 # from langchain.text_splitter import CharacterTextSplitter, TokenTextSplitter
-from google.cloud import storage
-from google.oauth2 import service_account
 from youtube_transcript_api import YouTubeTranscriptApi
+from youtube_transcript_api import TranscriptsDisabled, NoTranscriptFound, NoTranscriptAvailable, VideoUnavailable, InvalidVideoId
 from youtube_transcript_api.formatters import TextFormatter
 
+# pandas and the google cloud sdk are slow to import, they are imported on first use
+if TYPE_CHECKING:
+    import pandas as pd
+    from google.cloud import storage
+
+from tools.failure_ledger import FailureLedger, RetryScheduler
+from tools.packed_transcripts import PACKED_LAYOUT, PackedTranscriptStore, resolve_transcript_layout
+from utils.concurrency import HostRateLimiter, retry_with_backoff
+from utils.metrics import metrics
+
+YOUTUBE_API_BASE_URL = "https://www.googleapis.com/youtube/v3"
+
+YOUTUBE_HOST = "www.youtube.com"
+STORAGE_HOST = "storage.googleapis.com"
+
+# transcript errors that will not go away by retrying
+PERMANENT_TRANSCRIPT_ERRORS = (TranscriptsDisabled, NoTranscriptFound, NoTranscriptAvailable, VideoUnavailable, InvalidVideoId)
+
+# transcript errors that will not go away by waiting either, so they are not scheduled for a later retry
+NEVER_RETRY_TRANSCRIPT_ERRORS = (InvalidVideoId,)
+
 
 class Scraper:
     """
     This class provides methods for scraping transcripts from YouTube and loading new data into storage buckets.
     """
 
-    def __init__(self, channel_id: str = None, playlist_id: str = None) -> None:
-       
-        credentials = service_account.Credentials.from_service_account_file(
-                os.environ.get('GCP_SERVICE_ACCOUNT_KEY_PATH')
-            )  
-        self.client = storage.Client(credentials=credentials)
- 
+    def __init__(self, channel_id: str = None, playlist_id: str = None, bucket: storage.Bucket = None, transcript_api = None,
+                 api_base_url: str = None, http_session: requests.Session = None, transcript_layout: str = None,
+                 rate_limiter: HostRateLimiter = None, fetch_executor: Executor = None, upload_executor: Executor = None) -> None:
+        """
+        A bucket and a transcript api may be passed in to replace GCP Storage and YouTubeTranscriptApi, 
+        e.g. with local fakes.
+        Transcripts are written in transcript_layout, or the TRANSCRIPT_LAYOUT environment variable:
+        "blobs", one json blob per video (the default), or "packed", shards of a PackedTranscriptStore per playlist folder.
+        YouTube Data API requests go to api_base_url, or the YOUTUBE_API_BASE_URL environment variable, 
+        so they can be pointed at a local mock. They share one pooled http session.
+        A HostRateLimiter may be passed in to share request rates with other Scrapers, it replaces the rate_limits of each call.
+        Likewise executors, e.g. StagePools shared by the Scrapers of several playlists, may be passed in to fetch
+        transcripts and to upload them. They replace the pools of max_workers threads of each call.
+        The two must not share threads, since fetch tasks submit the uploads.
+        The GCP Storage client, and the channel and playlist ids when not provided, are fetched on first use.
+        """
+
+        self.api_base_url = (api_base_url or os.environ.get("YOUTUBE_API_BASE_URL") or YOUTUBE_API_BASE_URL).rstrip("/")
+        self._http = requests.Session() if http_session is None else http_session
+
         self.service_account = os.environ.get('GCP_SERVICE_ACCOUNT_KEY_PATH')
         self.bucket_name = os.environ.get("GCP_BUCKET_NAME")
 
-        if self.client.bucket(self.bucket_name).exists:
-            self.bucket = self.client.get_bucket(self.bucket_name)
-        else:
-            raise ValueError("Bucket does not exist. Please create bucket via GCP console and try again.")
+        self.client = None
+        self._bucket = bucket
+
+        self._transcript_api = YouTubeTranscriptApi if transcript_api is None else transcript_api
+        self.rate_limiter = rate_limiter
+        self.fetch_executor = fetch_executor
+        self.upload_executor = upload_executor
+
+        self.transcript_layout = resolve_transcript_layout(transcript_layout)
+        # playlist folder -> PackedTranscriptStore, for the packed layout
+        self._packed_stores = {}
+        self._packed_stores_lock = threading.Lock()
             
 
         # track failed transcript creations
         # This can happen with unaired live videos
         self._unsuccessful_list = None
 
-        self._channel_id = self._get_channel_id() if not channel_id else channel_id
-        self._playlist_id = self._get_playlist_id() if not playlist_id else playlist_id
+        self._channel_id = channel_id
+        self._playlist_id = playlist_id
 
         self._scraped_video_info = None
 
+    @property
+    def bucket(self) -> storage.Bucket:
+        if self._bucket is None:
+            from google.cloud import storage
+            from google.oauth2 import service_account
+
+            credentials = service_account.Credentials.from_service_account_file(
+                    os.environ.get('GCP_SERVICE_ACCOUNT_KEY_PATH')
+                )  
+            self.client = storage.Client(credentials=credentials)
+
+            if self.client.bucket(self.bucket_name).exists:
+                self._bucket = self.client.get_bucket(self.bucket_name)
+            else:
+                raise ValueError("Bucket does not exist. Please create bucket via GCP console and try again.")
+
+        return self._bucket
+
     @property
     def channel_id(self) -> str:
+        if not self._channel_id:
+            self._channel_id = self._get_channel_id()
         return self._channel_id
     
     @channel_id.setter
@@ -55,34 +121,82 @@ class Scraper:
     
     @property
     def playlist_id(self) -> str:
+        if not self._playlist_id:
+            self._playlist_id = self._get_playlist_id()
         return self._playlist_id
     
     @playlist_id.setter
     def playlist_id(self, playlist_id: str) -> None:
         self._playlist_id = playlist_id
     
-    def add_new_youtube_urls(self) -> None:
+    def add_new_youtube_urls(self, 
+                             video_info_file_name: str = "video_info", 
+                             transcripts_folder: str = "",
+                             max_workers: int = 1,
+                             rate_limits: Dict[str, float] = None,
+                             max_retries: int = 0) -> List[Dict[str, str]]:
         """
         This method checks for new youtube videos and updates the csv file in GCP Storage.
+        1. pages through the playlist, newest first, until it reaches a video already in the stored csv.
+        2. creates and uploads the transcripts of the new videos only. Failures are kept as in create_and_upload_transcripts.
+        3. prepends the new videos to the stored csv.
+
+        The cost of a refresh depends on the number of new uploads, not the size of the playlist.
+        If there is no stored csv yet, the whole playlist is scraped.
+
+        returns:
+            The info of the new videos, newest first.
         """
 
-        pass
+        import pandas as pd
+
+        # the stored csv is downloaded once, to find the known videos and to prepend the new ones to
+        stored_videos = None
+        known_ids = set()
+        if self.bucket.get_blob("youtube/"+video_info_file_name+".csv") is not None:
+            stored_videos = self._get_youtube_video_info(video_info_file_name=video_info_file_name)
+            known_ids = set(stored_videos['id'])
+
+        new_videos = []
+        for video in self._iter_playlist_videos():
+            if video['id'] in known_ids:
+                break
+            new_videos.append(video)
+
+        print("new videos: ", len(new_videos))
+
+        if not new_videos:
+            self._unsuccessful_list = []
+            return new_videos
+
+        self._create_and_upload(new_videos, transcripts_folder=transcripts_folder, max_workers=max_workers,
+                                rate_limits=rate_limits, max_retries=max_retries)
+
+        # the csv is updated last, so an interrupted refresh finds the same new videos next time
+        videos = pd.DataFrame.from_dict(new_videos)
+        if stored_videos is not None:
+            videos = pd.concat([videos, stored_videos], ignore_index=True)
+
+        self.bucket.blob("youtube/"+video_info_file_name+".csv").upload_from_string(videos.to_csv(), 'text/csv')
+
+        return new_videos
 
     def _get_youtube_video_info(self, video_info_file_name: str) -> pd.DataFrame:
+        import pandas as pd
+
 
         videos_temp = self.bucket.get_blob("youtube/"+video_info_file_name+".csv")
         videos_temp = videos_temp.download_as_string()
         videos = pd.read_csv(io.BytesIO(videos_temp))[['id', 'title', 'publish_date']]
         return videos
     
-    @staticmethod
-    def _create_transcript(video_id: str) -> str:
+    def _create_transcript(self, video_id: str) -> str:
         """
         This method retrieves the video transcript and formats it.
         Returns a string representation of the video transcript.
         """
 
-        raw_transcript = YouTubeTranscriptApi.get_transcript(video_id)
+        raw_transcript = self._transcript_api.get_transcript(video_id)
 
         # instantiate the text formatter
         formatter = TextFormatter()
@@ -97,6 +211,7 @@ class Scraper:
         """
         This method uploads a transcript to GCP Storage.
         Uploading a file will automatically overwrite any existing file with the same id in storage.
+        In the packed layout the transcript is buffered and written with the next shard of the playlist folder.
         """
 
         if folder != "":
@@ -107,91 +222,284 @@ class Scraper:
                      "title": title,
                      "publish_date": publish_date,
                      "transcript": transcript}
-        self.bucket.blob(file_loc+video_id+".json").upload_from_string(json.dumps(to_upload), content_type='application/json')
+        if self.transcript_layout == PACKED_LAYOUT:
+            self.packed_store(folder.rstrip("/")).add(video_id, json.dumps(to_upload))
+        else:
+            self.bucket.blob(file_loc+video_id+".json").upload_from_string(json.dumps(to_upload), content_type='application/json')
+
+    def packed_store(self, transcripts_folder: str = "") -> PackedTranscriptStore:
+        """
+        The PackedTranscriptStore of a playlist folder, shared by all uploads to it.
+        """
+
+        with self._packed_stores_lock:
+            if transcripts_folder not in self._packed_stores:
+                self._packed_stores[transcripts_folder] = PackedTranscriptStore(self.bucket, transcripts_folder)
+            return self._packed_stores[transcripts_folder]
+
+    def _fetch_transcript(self, video_id: str, limiter: HostRateLimiter, max_retries: int) -> str:
+        """
+        Rate limited and retried wrapper around _create_transcript.
+        Errors that can not be fixed by retrying are raised immediately.
+        """
 
-    # TODO: Multi-thread this process
-    def create_and_upload_transcripts(self, transcripts_folder: str = "", video_info_file_name: str = "video_info") -> List[str]:
+        def fetch():
+            limiter.acquire(YOUTUBE_HOST)
+            with metrics.timer("transcript_fetch_seconds"):
+                return self._create_transcript(video_id=video_id)
+        
+        return retry_with_backoff(fetch, max_retries=max_retries, give_up_on=PERMANENT_TRANSCRIPT_ERRORS)
+    
+    def _store_transcript(self, transcript: str, info: Dict[str, str], folder: str, limiter: HostRateLimiter, max_retries: int) -> None:
+        """
+        Rate limited and retried wrapper around _upload_transcript.
+        """
+
+        def upload():
+            if self.transcript_layout != PACKED_LAYOUT:
+                limiter.acquire(STORAGE_HOST)
+            self._upload_transcript(transcript=transcript, 
+                                    video_id=info['id'], title=info['title'], 
+                                    publish_date=info['publish_date'],
+                                    folder=folder)
+        
+        retry_with_backoff(upload, max_retries=max_retries)
+
+    def _process_videos_serially(self, videos: List[Dict[str, str]], folder: str, limiter: HostRateLimiter, max_retries: int) -> Iterator[Tuple[int, Exception]]:
+        """
+        Fetch and upload one video at a time.
+        Yields the position of each video along with the raised exception, if any.
+        """
+
+        for pos, info in enumerate(videos):
+            try:
+                transcript = self._fetch_transcript(info['id'], limiter, max_retries)
+                self._store_transcript(transcript, info, folder, limiter, max_retries)
+                yield pos, None
+
+            except Exception as e:
+                yield pos, e
+
+    def _process_videos_concurrently(self, videos: List[Dict[str, str]], folder: str, limiter: HostRateLimiter, 
+                                     max_retries: int, max_workers: int, max_pending_uploads: int) -> Iterator[Tuple[int, Exception]]:
+        """
+        Fetch transcripts on one thread pool and upload them on another, so that fetches overlap with uploads.
+        At most `max_pending_uploads` fetched transcripts are held in memory waiting for upload.
+        Yields the position of each video along with the raised exception, if any, in order of completion.
+        """
+
+        outcomes = queue.Queue()
+        pending = threading.BoundedSemaphore(max_pending_uploads)
+
+        upload_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="transcript-upload") if self.upload_executor is None else nullcontext(self.upload_executor)
+        fetch_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="transcript-fetch") if self.fetch_executor is None else nullcontext(self.fetch_executor)
+
+        with upload_executor as upload_pool:
+
+            def finish(pos, exc):
+                pending.release()
+                outcomes.put((pos, exc))
+
+            def fetch_and_hand_off(pos, info):
+                pending.acquire()
+                try:
+                    transcript = self._fetch_transcript(info['id'], limiter, max_retries)
+                    upload = upload_pool.submit(self._store_transcript, transcript, info, folder, limiter, max_retries)
+                except Exception as e:
+                    finish(pos, e)
+                    return
+
+                upload.add_done_callback(lambda fut: finish(pos, fut.exception()))
+
+            with fetch_executor as fetch_pool:
+                for pos, info in enumerate(videos):
+                    fetch_pool.submit(fetch_and_hand_off, pos, info)
+
+                for _ in range(len(videos)):
+                    yield outcomes.get()
+
+    def create_and_upload_transcripts(self, 
+                                      transcripts_folder: str = "", 
+                                      video_info_file_name: str = "video_info", 
+                                      max_workers: int = 1,
+                                      rate_limits: Dict[str, float] = None,
+                                      max_retries: int = 0,
+                                      max_pending_uploads: int = None) -> List[str]:
         """
         This method:
         1. gets the list of all neo4j video urls from GCP Storage.
         2. gets a transcript of each video. If unsuccessful, is added to list to be returned.
         3. uploads the transcript to GCP Storage.
 
+        If max_workers is greater than 1, or the Scraper has executors, transcripts are fetched and uploaded concurrently
+        by bounded worker pools.
+        rate_limits maps a host (YOUTUBE_HOST, STORAGE_HOST) to the maximum number of requests per second sent to it.
+        Failed requests are retried up to max_retries times with exponential backoff.
+
         returns:
             None
         """
 
-        unsuccessful = []
-        fail_count = 0
+        videos = self._get_youtube_video_info(video_info_file_name=video_info_file_name).to_dict('records')
+
+        self._create_and_upload(videos, transcripts_folder=transcripts_folder, max_workers=max_workers, rate_limits=rate_limits,
+                                max_retries=max_retries, max_pending_uploads=max_pending_uploads)
+
+    def _create_and_upload(self, 
+                           videos: List[Dict[str, str]], 
+                           transcripts_folder: str = "", 
+                           max_workers: int = 1,
+                           rate_limits: Dict[str, float] = None,
+                           max_retries: int = 0,
+                           max_pending_uploads: int = None) -> None:
+        """
+        Create and upload the transcripts of the videos, see create_and_upload_transcripts.
+        """
+
+        limiter = self.rate_limiter or HostRateLimiter(rate_limits)
+
+        if max_workers > 1 or self.fetch_executor is not None:
+            outcomes = self._process_videos_concurrently(videos, transcripts_folder, limiter, max_retries, 
+                                                         max_workers=max_workers, 
+                                                         max_pending_uploads=max_pending_uploads or 2 * max_workers)
+        else:
+            outcomes = self._process_videos_serially(videos, transcripts_folder, limiter, max_retries)
+
+        self._unsuccessful_list = self._report_outcomes(videos, outcomes)
+
+        if self.transcript_layout == PACKED_LAYOUT:
+            limiter.acquire(STORAGE_HOST)
+            self.packed_store(transcripts_folder).flush()
 
-        videos = self._get_youtube_video_info(video_info_file_name=video_info_file_name)
+        metrics.inc("transcripts_uploaded_total", len(videos) - len(self._unsuccessful_list), playlist=transcripts_folder)
+        metrics.inc("transcript_errors_total", len(self._unsuccessful_list), playlist=transcripts_folder)
 
+    @staticmethod
+    def _report_outcomes(videos: List[Dict[str, str]], outcomes: Iterator[Tuple[int, Exception]]) -> List[Dict[str, str]]:
+        """
+        Print progress as videos complete and collect the failed videos in their original order,
+        with the name of the exception raised under 'error'.
+        """
+
+        failed_positions = []
+        errors = {}
         total = len(videos)
+        done = 0
 
-        for idx, info in videos.iterrows():
-            id = info['id']
-            try:
-                transcript = self._create_transcript(video_id=id)
-                self._upload_transcript(transcript=transcript, 
-                                        video_id=id, title=info['title'], 
-                                        publish_date=info['publish_date'],
-                                        folder=transcripts_folder)
+        for pos, exc in outcomes:
+            if exc is not None:
+                failed_positions.append(pos)
+                errors[pos] = type(exc).__name__
 
-            except Exception as e:
-                # print("Failed: "+id)
-                fail_count+=1
-                unsuccessful+=[{"id": id,
-                                "title": info['title'],
-                                "publish_date": info['publish_date']}]
-            
-            if idx % 2 == 0:
-                print("Progress : ", round((idx+1) / total * 100, 2), "% | ", "failed: ", fail_count, end="\r")
-         
+            if done % 2 == 0:
+                print("Progress : ", round((done+1) / total * 100, 2), "% | ", "failed: ", len(failed_positions), end="\r")
+            done += 1
+
+        print("Progress : ", round(done / total * 100, 2) if total else 100.0, "% | ", "failed: ", len(failed_positions), end="\r")
 
-        # print("failed count: ", len(unsuccessful))
-        print("Progress : ", round((idx+1) / total * 100, 2), "% | ", "failed: ", fail_count, end="\r")
+        return [{"id": videos[pos]['id'],
+                 "title": videos[pos]['title'],
+                 "publish_date": videos[pos]['publish_date'],
+                 "error": errors[pos]} for pos in sorted(failed_positions)]
 
+    def retry_scheduler(self, transcripts_folder: str = "", **settings) -> RetryScheduler:
+        """
+        The RetryScheduler over the failure ledger of a playlist folder, classifying the transcript errors of this module.
+        settings are passed on, e.g. max_attempts.
+        """
 
-        self._unsuccessful_list = unsuccessful 
+        return RetryScheduler(FailureLedger(self.bucket, transcripts_folder),
+                              unavailable_errors=[error.__name__ for error in PERMANENT_TRANSCRIPT_ERRORS],
+                              never_retry_errors=[error.__name__ for error in NEVER_RETRY_TRANSCRIPT_ERRORS],
+                              **settings)
 
-    def update_unsuccessful_transcripts(self, file_name: str = "failed_video_info") -> None:
+    def update_unsuccessful_transcripts(self, transcripts_folder: str = "", scheduler: RetryScheduler = None) -> List[Dict]:
         """
-        This method takes a list of unsuccessful YouTube ids and creates a new csv file
-        in GCP Storage for later retrieval. 
+        This method appends the videos that failed in the last run to the failure ledger of the playlist folder,
+        scheduling their retry, see FailureLedger. Only the new failures are written, the ledger is not read.
+
+        returns:
+            The new ledger entries.
         """
 
-        file_loc = "youtube/"
+        scheduler = self.retry_scheduler(transcripts_folder) if scheduler is None else scheduler
 
-        # create failed df
-        failed_df = pd.DataFrame.from_dict(self._unsuccessful_list)
+        entries = scheduler.record_failures(self._unsuccessful_list or [])
+        print("failures recorded: ", len(entries), "| permanent: ", sum(entry['permanent'] for entry in entries))
 
-        # check if failed df in GCP storage
-        if storage.Blob(bucket=self.bucket, name=file_loc+file_name+".csv").exists(self.client):
-            # pull failed df from storage
-            videos_temp = self.bucket.get_blob(file_loc+file_name+".csv")
-            videos_temp = videos_temp.download_as_string()
+        return entries
 
-            previous_failed_df =  pd.read_csv(io.BytesIO(videos_temp))[['id', 'title', 'publish_date']]
+    def retry_failed_transcripts(self,
+                                 transcripts_folder: str = "",
+                                 scheduler: RetryScheduler = None,
+                                 max_workers: int = 1,
+                                 rate_limits: Dict[str, float] = None,
+                                 max_retries: int = 0,
+                                 now=None) -> Dict[str, int]:
+        """
+        This method retries the transcripts in the failure ledger that are due:
+        1. reads the due shards of the ledger only.
+        2. creates and uploads the transcripts of the due videos, as create_and_upload_transcripts.
+        3. reschedules the videos that failed again with exponential backoff, or marks them permanent.
 
-            # append new failed df
-            new_failed_df = pd.concat(previous_failed_df, failed_df)
-            
-        else:
-            # create first failed df
-            new_failed_df = failed_df
+        Recovered videos are already listed in the video info csv, so the next ingestion picks up their transcripts.
+
+        returns:
+            Counts of retried, recovered, rescheduled and permanent videos.
+        """
 
-        # upload new df to storage
-        self.bucket.blob(file_loc+"failed_video_info.csv").upload_from_string(new_failed_df.to_csv(), 'text/csv')
+        scheduler = self.retry_scheduler(transcripts_folder) if scheduler is None else scheduler
 
-    @staticmethod
-    def _get_channel_id() -> str:
+        due, not_due, shards = scheduler.due(now)
+        print("failed transcripts due: ", len(due))
+
+        failed = []
+        if due:
+            self._create_and_upload(due, transcripts_folder=transcripts_folder, max_workers=max_workers,
+                                    rate_limits=rate_limits, max_retries=max_retries)
+            failed = self._unsuccessful_list
+            print()
+
+        summary = scheduler.complete(due, not_due, shards, failed, now)
+        metrics.inc("transcripts_recovered_total", summary['recovered'], playlist=transcripts_folder)
+        print(summary)
+
+        return summary
+
+    def import_failed_video_info(self, file_name: str = "failed_video_info", transcripts_folder: str = "",
+                                 scheduler: RetryScheduler = None) -> List[Dict]:
+        """
+        One-off migration of the csv written by earlier versions of update_unsuccessful_transcripts into the failure ledger.
+        The videos are scheduled as first failures and the csv is left in place.
+        """
+
+        import pandas as pd
+
+        blob = self.bucket.get_blob("youtube/"+file_name+".csv")
+        if blob is None:
+            return []
+
+        videos = pd.read_csv(io.BytesIO(blob.download_as_bytes()))[['id', 'title', 'publish_date']].to_dict('records')
+        self._unsuccessful_list = [{**video, "error": "Exception"} for video in videos]
+
+        return self.update_unsuccessful_transcripts(transcripts_folder=transcripts_folder, scheduler=scheduler)
+
+    def _api_get(self, resource: str, **params: str) -> Dict:
+        """
+        GET a YouTube Data API resource over the pooled http session.
+        """
+
+        params['key'] = os.environ.get('YOUTUBE_API_KEY')
+        req = self._http.get(f"{self.api_base_url}/{resource}", params=params)
+        req.raise_for_status()
+        return req.json()
+
+    def _get_channel_id(self) -> str:
         """
         This method retrieves the channel id for the "The Needle Drop" YouTube channel.
         """
 
-        address = f"https://www.googleapis.com/youtube/v3/search?q=the+needle+drop&key={os.environ.get('YOUTUBE_API_KEY')}&part=snippet"
-        req = requests.get(address)
-        data = req.json()
+        data = self._api_get("search", q="the needle drop", part="snippet")
 
         return data['items'][0]['snippet']['channelId']
     
@@ -200,52 +508,65 @@ class Scraper:
         This method retrieves the uploads id for the channel of interest.
         """
 
-        address = f"https://www.googleapis.com/youtube/v3/channels?id={self.channel_id}&key={os.environ.get('YOUTUBE_API_KEY')}&part=contentDetails"
         try:
-            req = requests.get(address)
-            data = req.json()
+            data = self._api_get("channels", id=self.channel_id, part="contentDetails")
         except ValueError as e:
             print(e, "Provide accurate channel id.")
+            raise
 
         return data['items'][0]['contentDetails']['relatedPlaylists']['uploads']
 
+    def _iter_playlist_videos(self, page_size: int = 50) -> Iterator[Dict[str, str]]:
+        """
+        Lazily page through the playlist items, one request per page. 
+        Stops requesting pages as soon as the consumer stops iterating.
+        """
 
-    def scrape_video_info(self, next_page_token: str = None, total_results: int = -1, videos: List[str] = []) -> List[str]:
-            
-        address = f"https://www.googleapis.com/youtube/v3/playlistItems?playlistId={self.playlist_id}&key={os.environ.get('YOUTUBE_API_KEY')}&part=snippet&maxResults=50"
-        
-        if not next_page_token:
-            vid_req = requests.get(address)
+        next_page_token = None
+        total_results = -1
+        retrieved = 0
 
-        else:
-            vid_req = requests.get(address+f'&pageToken={next_page_token}')
-            
-        vids = vid_req.json()
+        while True:
+            params = {"playlistId": self.playlist_id, "part": "snippet", "maxResults": page_size}
+            if next_page_token:
+                params['pageToken'] = next_page_token
 
-        if total_results == -1:
-            total_results = vids['pageInfo']['totalResults']
-            print('total results set: ', total_results)
+            vids = self._api_get("playlistItems", **params)
 
-        videos += [{"id": x['snippet']['resourceId']['videoId'], 
-                    "title": x['snippet']['title'],
-                    "publish_date": x['snippet']['publishedAt'][:10]} for x in vids['items']]
+            if total_results == -1:
+                total_results = vids['pageInfo']['totalResults']
+                print('total results set: ', total_results)
 
+            retrieved += len(vids['items'])
+            print("total results: ", total_results, end='\r')
+            print("ids retrieved: ", retrieved, "\r")
 
-        print("total results: ", total_results, end='\r')
-        print("ids retrieved: ", len(videos), "\r")
+            for x in vids['items']:
+                yield {"id": x['snippet']['resourceId']['videoId'], 
+                       "title": x['snippet']['title'],
+                       "publish_date": x['snippet']['publishedAt'][:10]}
 
-        if "nextPageToken" not in vids.keys():
-            print("complete")
-            self._scraped_video_info = videos
-            return videos
-        
-        self.scrape_video_info(next_page_token=vids['nextPageToken'], total_results=total_results, videos=videos)
+            next_page_token = vids.get("nextPageToken")
+            if not next_page_token:
+                print("complete")
+                return
+
+    def scrape_video_info(self) -> List[Dict[str, str]]:
+        """
+        Scrape the info of every video in the playlist.
+        """
+
+        videos = list(self._iter_playlist_videos())
+        self._scraped_video_info = videos
+        return videos
     
     def upload_scraped_video_info(self, file_name: str = "video_info") -> None:
         """
         This method uploads the scraped video ids to a new csv in the designated GCP Storage bucket.
         """
 
+        import pandas as pd
+
         file_loc = "youtube/"
 
         data = pd.DataFrame.from_dict(self._scraped_video_info)
@@ -0,0 +1,93 @@
+from typing import Dict, Optional
+import json
+import os
+import threading
+
+
+class TranscriptMirror:
+    """
+    Local disk mirror of transcript blobs.
+    A mirrored copy is only used while its recorded generation and etag match the blob in GCP Storage,
+    so a re-run downloads only transcripts that were added or changed since the last run.
+    """
+
+    def __init__(self, directory: str) -> None:
+
+        self.directory = directory
+        self._index_path = os.path.join(directory, "index.json")
+        self._lock = threading.Lock()
+        self._dirty = False
+
+        os.makedirs(directory, exist_ok=True)
+
+        if os.path.exists(self._index_path):
+            with open(self._index_path) as f:
+                self._index = json.load(f)
+        else:
+            self._index = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _version(blob) -> Dict[str, str]:
+        return {"generation": str(getattr(blob, "generation", None)), "etag": getattr(blob, "etag", None)}
+
+    def _path(self, blob_name: str) -> str:
+        return os.path.join(self.directory, "blobs", blob_name)
+
+    def get(self, blob) -> Optional[str]:
+        """
+        Return the mirrored text of the blob, or None if it is missing or out of date.
+        Blobs without a generation are never served from the mirror.
+        """
+
+        with self._lock:
+            recorded = self._index.get(blob.name)
+
+        version = self._version(blob)
+
+        if recorded is None or version["generation"] == "None" or recorded != version:
+            self.misses += 1
+            return None
+
+        try:
+            with open(self._path(blob.name), encoding="utf-8") as f:
+                text = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return text
+
+    def put(self, blob, text: str) -> None:
+        """
+        Store the text of the blob along with its generation and etag.
+        """
+
+        path = self._path(blob.name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmp_path = path + ".tmp." + str(threading.get_ident())
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._index[blob.name] = self._version(blob)
+            self._dirty = True
+
+    def save(self) -> None:
+        """
+        Persist the index. Called once after a batch of downloads rather than per blob.
+        """
+
+        with self._lock:
+            if not self._dirty:
+                return
+            tmp_path = self._index_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._index, f)
+            os.replace(tmp_path, self._index_path)
+            self._dirty = False
@@ -0,0 +1,312 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+import json
+import os
+import threading
+
+import numpy as np
+
+# local searches do not need the neo4j driver
+if TYPE_CHECKING:
+    from n4j.communicator import GraphReader
+
+# Source and Child fields stored for every indexed Child, as returned by GraphReader.retrieve
+RECORD_FIELDS = ["index", "text", "parent_index", "url", "title", "video_id", "playlist_id", "publish_date"]
+
+
+class LocalVectorIndex:
+    """
+    In-process mirror of the Child embeddings for low latency top-k cosine search.
+
+    The directory holds:
+        embeddings.f32  unit-normalized float32 rows, memory-mapped
+        records.jsonl   one record per row with the fields in RECORD_FIELDS
+        ivf.npz         optional coarse clustering (centroids and row assignments)
+
+    Searches return the same fields and scores as GraphReader.retrieve, apart from the parent text,
+    which can be fetched from Neo4j with search_with_parents.
+    Register on_nodes_loaded and remove_sources as GraphWriter listeners to follow loads, replacements and deletions.
+    """
+
+    def __init__(self, directory: str, dimensions: int = 96) -> None:
+
+        self.directory = directory
+        self.dimensions = dimensions
+        self._matrix_path = os.path.join(directory, "embeddings.f32")
+        self._records_path = os.path.join(directory, "records.jsonl")
+        self._ivf_path = os.path.join(directory, "ivf.npz")
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+
+        self.records = []
+        self._position = {}
+        if os.path.exists(self._records_path):
+            with open(self._records_path, encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    self._position[record['index']] = len(self.records)
+                    self.records.append(record)
+
+        self._matrix = self._map(len(self.records))
+
+        self.centroids = None
+        self._assignments = None
+        if os.path.exists(self._ivf_path):
+            ivf = np.load(self._ivf_path)
+            self.centroids = ivf["centroids"]
+            self._assignments = ivf["assignments"]
+
+            # rows added after the clustering was last saved, e.g. by an interrupted add
+            if len(self._assignments) < len(self.records):
+                missing = self._assign(np.asarray(self._matrix[len(self._assignments):]))
+                self._assignments = np.concatenate([self._assignments, missing])
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def ids(self) -> np.ndarray:
+        return np.array([record['index'] for record in self.records])
+
+    def _map(self, rows: int) -> np.ndarray:
+        if rows == 0:
+            return np.zeros((0, self.dimensions), dtype=np.float32)
+        return np.memmap(self._matrix_path, dtype=np.float32, mode="r+", shape=(rows, self.dimensions))
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(np.asarray(vectors) @ self.centroids.T, axis=1).astype(np.int32)
+
+    def _save_ivf(self) -> None:
+        np.savez(self._ivf_path, centroids=self.centroids, assignments=self._assignments)
+
+    def _write_records(self) -> None:
+        path = self._records_path + ".tmp"
+        with open(path, "w", encoding="utf-8") as f:
+            for record in self.records:
+                f.write(json.dumps(record) + "\n")
+        os.replace(path, self._records_path)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1
+        return np.ascontiguousarray(vectors / norms, dtype=np.float32)
+
+    def add(self, records: Iterable[Dict]) -> int:
+        """
+        Add Child records, each holding an `embedding` and the fields in RECORD_FIELDS.
+        Records whose index is already present replace the stored vector and fields, and records.jsonl is rewritten.
+        With a clustering, new and replaced rows are assigned to their closest cluster and ivf.npz is saved.
+        Returns the number of new rows.
+        """
+
+        records = list(records)
+        if not records:
+            return 0
+
+        vectors = self._normalize([record['embedding'] for record in records])
+
+        with self._lock:
+            new_records = []
+            new_vectors = []
+            replaced = {}
+
+            for record, vector in zip(records, vectors):
+                stored = {field: record.get(field) for field in RECORD_FIELDS}
+                position = self._position.get(stored['index'])
+
+                if position is not None:
+                    self._matrix[position] = vector
+                    self.records[position] = stored
+                    replaced[position] = vector
+                    continue
+
+                self._position[stored['index']] = len(self.records) + len(new_records)
+                new_records.append(stored)
+                new_vectors.append(vector)
+
+            if new_records:
+                with open(self._matrix_path, "ab") as f:
+                    f.write(np.asarray(new_vectors, dtype=np.float32).tobytes())
+
+            if replaced:
+                self.records.extend(new_records)
+                self._write_records()
+            elif new_records:
+                with open(self._records_path, "a", encoding="utf-8") as f:
+                    for record in new_records:
+                        f.write(json.dumps(record) + "\n")
+                self.records.extend(new_records)
+
+            if self.centroids is not None and (new_records or replaced):
+                if replaced:
+                    positions = list(replaced)
+                    self._assignments[positions] = self._assign(list(replaced.values()))
+                if new_records:
+                    self._assignments = np.concatenate([self._assignments, self._assign(new_vectors)])
+                self._save_ivf()
+
+            if isinstance(self._matrix, np.memmap):
+                self._matrix.flush()
+            self._matrix = self._map(len(self.records))
+
+        return len(new_records)
+
+    def on_nodes_loaded(self, sources: List[Dict], parents: List[Dict], children: List[Dict]) -> None:
+        """
+        GraphWriter load listener adding freshly written children to the index:
+            writer.add_load_listener(index.on_nodes_loaded)
+        Children without an embedding, collapsed onto a canonical child by tools.dedup, are already indexed and skipped.
+        """
+
+        sources_by_url = {source['url']: source for source in sources}
+        url_by_parent = {parent['index']: parent['url'] for parent in parents}
+
+        records = []
+        for child in children:
+            if child.get('embedding') is None:
+                continue
+            source = sources_by_url.get(url_by_parent.get(child['parent_index']), {})
+            records.append({**source, **child})
+
+        self.add(records)
+
+    def remove_sources(self, urls: Iterable[str]) -> int:
+        """
+        Remove the rows of the given Source urls, e.g. as a GraphWriter delete listener:
+            writer.add_delete_listener(index.remove_sources)
+        The remaining rows are compacted, so embeddings.f32, records.jsonl and ivf.npz are rewritten.
+        Returns the number of rows removed.
+        """
+
+        urls = set(urls)
+
+        with self._lock:
+            keep = [position for position, record in enumerate(self.records) if record['url'] not in urls]
+            removed = len(self.records) - len(keep)
+            if not removed:
+                return 0
+
+            path = self._matrix_path + ".tmp"
+            with open(path, "wb") as f:
+                f.write(np.asarray(self._matrix)[keep].astype(np.float32).tobytes())
+            os.replace(path, self._matrix_path)
+
+            self.records = [self.records[position] for position in keep]
+            self._position = {record['index']: position for position, record in enumerate(self.records)}
+            self._write_records()
+
+            if self._assignments is not None:
+                self._assignments = self._assignments[keep]
+                self._save_ivf()
+
+            self._matrix = self._map(len(self.records))
+
+        return removed
+
+    def load_from_graph(self, reader: GraphReader, batch_size: int = 10_000) -> int:
+        """
+        Add every Child in the graph to the index. Returns the number of new rows.
+        """
+
+        added = 0
+        for batch in reader.iter_child_embeddings(batch_size=batch_size):
+            added += self.add(batch)
+        return added
+
+    def build_ivf(self, n_lists: int = None, n_iter: int = 10, seed: int = 0) -> None:
+        """
+        Cluster the rows with spherical k-means so searches can scan only the closest clusters.
+        Defaults to about sqrt(rows) clusters.
+        """
+
+        with self._lock:
+            matrix = np.asarray(self._matrix)
+            if len(matrix) == 0:
+                raise ValueError("The index is empty. Add records before building the clustering.")
+
+            n_lists = min(len(matrix), n_lists or max(1, int(np.sqrt(len(matrix)))))
+            rng = np.random.default_rng(seed)
+            centroids = matrix[rng.choice(len(matrix), size=n_lists, replace=False)].copy()
+
+            for _ in range(n_iter):
+                assignments = np.argmax(matrix @ centroids.T, axis=1)
+                for cluster in range(n_lists):
+                    members = matrix[assignments == cluster]
+                    if len(members):
+                        centroids[cluster] = members.sum(axis=0)
+                centroids = self._normalize(centroids)
+
+            self.centroids = centroids
+            self._assignments = self._assign(matrix)
+            self._save_ivf()
+
+    def _candidates(self, query: np.ndarray, n_probe: int) -> Optional[np.ndarray]:
+        if self.centroids is None or n_probe is None:
+            return None
+
+        n_probe = min(n_probe, len(self.centroids))
+        closest = np.argpartition(-(self.centroids @ query), n_probe - 1)[:n_probe]
+        return np.flatnonzero(np.isin(self._assignments, closest))
+
+    def search_many(self, embeddings: Iterable[List[float]], k: int = 10, n_probe: int = None) -> List[List[Dict]]:
+        """
+        Top k rows by cosine similarity for each query embedding.
+        Without n_probe every row is scored. With n_probe and a built clustering, only the rows
+        in the n_probe closest clusters are scored.
+        Scores are mapped to [0, 1] as (1 + cosine) / 2, like the Neo4j vector index.
+        """
+
+        queries = self._normalize(np.atleast_2d(np.asarray(embeddings, dtype=np.float32)))
+
+        with self._lock:
+            matrix = self._matrix
+            records = self.records
+
+        results = []
+
+        if n_probe is None or self.centroids is None:
+            similarities = queries @ np.asarray(matrix).T
+            for row in similarities:
+                results.append(self._top_k(row, np.arange(len(row)), k, records))
+            return results
+
+        for query in queries:
+            candidates = self._candidates(query, n_probe)
+            results.append(self._top_k(matrix[candidates] @ query, candidates, k, records))
+
+        return results
+
+    @staticmethod
+    def _top_k(similarities: np.ndarray, positions: np.ndarray, k: int, records: List[Dict]) -> List[Dict]:
+        if len(similarities) == 0:
+            return []
+
+        k = min(k, len(similarities))
+        best = np.argpartition(-similarities, k - 1)[:k]
+        best = best[np.argsort(-similarities[best])]
+
+        return [{**records[positions[i]], "score": float((1 + similarities[i]) / 2)} for i in best]
+
+    def search(self, embedding: List[float], k: int = 10, n_probe: int = None) -> List[Dict]:
+        """
+        Top k rows for one query embedding, see search_many.
+        """
+
+        return self.search_many([embedding], k=k, n_probe=n_probe)[0]
+
+    def search_with_parents(self, reader: GraphReader, embedding: List[float], k: int = 10, n_probe: int = None) -> List[Dict]:
+        """
+        Search locally, then fetch the parent texts of the hits from Neo4j in one round trip.
+        """
+
+        hits = self.search(embedding, k=k, n_probe=n_probe)
+        parent_texts = reader.get_parent_texts([hit['parent_index'] for hit in hits])
+
+        for hit in hits:
+            hit['parent_text'] = parent_texts.get(hit['parent_index'])
+
+        return hits
@@ -0,0 +1,171 @@
+from typing import Any, Callable, Dict, Iterable, Iterator, Tuple, Type, TypeVar
+from collections import deque
+from concurrent.futures import Executor
+import random
+import threading
+import time
+
+T = TypeVar("T")
+
+
+class RateLimiter:
+    """
+    Token bucket rate limiter.
+    Each call to acquire() blocks until a token is available, so at most `rate` calls
+    are let through per second on average, with bursts of up to `burst` calls.
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+
+        if rate <= 0:
+            raise ValueError("rate must be greater than 0.")
+
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """
+    Holds one RateLimiter per host, so that requests to YouTube and to GCP Storage
+    are throttled independently of each other.
+    Hosts without a configured rate are not throttled.
+    """
+
+    def __init__(self, rates: Dict[str, float] = None, burst: int = 1) -> None:
+
+        self._limiters = {host: RateLimiter(rate, burst) for host, rate in (rates or {}).items() if rate}
+
+    def acquire(self, host: str) -> None:
+        limiter = self._limiters.get(host)
+        if limiter is not None:
+            limiter.acquire()
+
+
+def retry_with_backoff(func: Callable[[], T],
+                       max_retries: int = 3,
+                       base_delay: float = 0.5,
+                       max_delay: float = 30.0,
+                       retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+                       give_up_on: Tuple[Type[BaseException], ...] = ()) -> T:
+    """
+    Call `func` and retry it with exponential backoff and full jitter if it raises one of `retry_on`.
+    Exceptions in `give_up_on` are raised immediately.
+    The last exception is raised once `max_retries` retries have been used up.
+    """
+
+    attempt = 0
+
+    while True:
+        try:
+            return func()
+
+        except give_up_on:
+            raise
+
+        except retry_on:
+            if attempt >= max_retries:
+                raise
+
+            time.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
+            attempt += 1
+
+
+def ordered_prefetch(func: Callable[[Any], T], items: Iterable[Any], executor: Executor, window: int) -> Iterator[Tuple[Any, T, BaseException]]:
+    """
+    Apply `func` to the items on `executor`, keeping at most `window` calls in flight.
+    Yields (item, result, exception) in the order of `items`, with exception set to None on success,
+    so results can be consumed while later items are still being fetched.
+    """
+
+    in_flight = deque()
+    iterator = iter(items)
+
+    def fill():
+        for item in iterator:
+            in_flight.append((item, executor.submit(func, item)))
+            if len(in_flight) >= window:
+                return
+
+    fill()
+
+    while in_flight:
+        item, future = in_flight.popleft()
+        fill()
+        try:
+            yield item, future.result(), None
+        except Exception as e:
+            yield item, None, e
+
+
+class StagePool:
+    """
+    One stage of a pipeline on a shared executor, e.g. a thread pool for downloads or a process pool for splitting,
+    with at most `limit` tasks submitted and not yet finished across all of its users.
+    submit blocks while the stage is full, so a slow stage holds back the stages feeding it.
+    Counts submitted, finished and failed tasks and the seconds submitters spent blocked, for progress reports.
+    Can be passed wherever an executor is only used through submit, e.g. to ordered_prefetch.
+    """
+
+    def __init__(self, name: str, executor: Executor, limit: int) -> None:
+
+        self.name = name
+        self.executor = executor
+        self.limit = limit
+        self._slots = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+
+        self.submitted = 0
+        self.finished = 0
+        self.failed = 0
+        self.blocked_seconds = 0.0
+
+    @property
+    def in_flight(self) -> int:
+        return self.submitted - self.finished
+
+    def _done(self, future) -> None:
+        with self._lock:
+            self.finished += 1
+            if not future.cancelled() and future.exception() is not None:
+                self.failed += 1
+        self._slots.release()
+
+    def submit(self, func: Callable[..., T], *args: Any, **kwargs: Any):
+        start = time.monotonic()
+        self._slots.acquire()
+        with self._lock:
+            self.blocked_seconds += time.monotonic() - start
+            self.submitted += 1
+
+        try:
+            future = self.executor.submit(func, *args, **kwargs)
+        except BaseException:
+            with self._lock:
+                self.finished += 1
+                self.failed += 1
+            self._slots.release()
+            raise
+
+        future.add_done_callback(self._done)
+        return future
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,353 @@
+from typing import Dict, List, Tuple
+from collections import deque
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+
+class LatencyRecorder:
+    """
+    Keeps the most recent `max_samples` latencies, in seconds, and reports their percentiles.
+    """
+
+    def __init__(self, max_samples: int = 10_000) -> None:
+
+        self._samples = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def percentile(self, p: float) -> float:
+        """
+        Nearest-rank percentile of the recorded samples, p between 0 and 100.
+        """
+
+        with self._lock:
+            samples = sorted(self._samples)
+
+        return self._nearest_rank(samples, p)
+
+    @staticmethod
+    def _nearest_rank(samples: List[float], p: float) -> float:
+        if not samples:
+            return 0.0
+        rank = max(1, min(len(samples), int(-(-p * len(samples) // 100))))
+        return samples[rank - 1]
+
+    def summary(self) -> Dict[str, float]:
+        with self._lock:
+            samples = sorted(self._samples)
+
+        return {"count": self.count,
+                "mean": sum(samples) / len(samples) if samples else 0.0,
+                "p50": self._nearest_rank(samples, 50),
+                "p99": self._nearest_rank(samples, 99),
+                "max": samples[-1] if samples else 0.0}
+
+
+# histogram bucket upper bounds, in seconds for timers
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Counter:
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        # time of the first and last increment, for rates
+        self.first = None
+        self.last = None
+
+    def inc(self, value: float, now: float) -> None:
+        if self.first is None:
+            self.first = now
+        self.value += value
+        self.last = now
+
+
+class Histogram:
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.samples = LatencyRecorder(max_samples=1000)
+
+    def observe(self, value: float) -> None:
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.samples.record(value)
+
+
+class _Timer:
+
+    def __init__(self, registry: "MetricsRegistry", name: str, labels: Dict[str, str]) -> None:
+        self._registry = registry
+        self._name = name
+        self._labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._registry.observe(self._name, time.perf_counter() - self._start, **self._labels)
+
+
+class _NullTimer:
+
+    def __enter__(self) -> "_NullTimer":
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms keyed by name and labels, e.g.:
+        metrics.inc("rows_loaded_total", len(batch), playlist="electronic")
+        with metrics.timer("neo4j_write_seconds"):
+            ...
+
+    A disabled registry returns right away from every call and its timers do nothing,
+    so instrumented code costs close to nothing until metrics are enabled.
+    Snapshots are handed to the registered exporters on export().
+    """
+
+    def __init__(self, enabled: bool = False, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+
+        self.enabled = enabled
+        self.buckets = buckets
+        self.exporters = []
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def enable(self, *exporters) -> None:
+        self.exporters.extend(exporters)
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, str]) -> Tuple[str, Labels]:
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        if not self.enabled:
+            return
+
+        key = self._key(name, labels)
+        now = time.monotonic()
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None:
+                counter = self._counters[key] = Counter()
+            counter.inc(value, now)
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        if not self.enabled:
+            return
+
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def timer(self, name: str, **labels: str):
+        """
+        Context manager observing the elapsed seconds in the histogram `name`.
+        """
+
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def value(self, name: str, **labels: str) -> float:
+        counter = self._counters.get(self._key(name, labels))
+        return counter.value if counter is not None else 0.0
+
+    def rate(self, name: str, **labels: str) -> float:
+        """
+        Average increments per second of a counter between its first and last increment.
+        """
+
+        counter = self._counters.get(self._key(name, labels))
+        if counter is None or counter.last == counter.first:
+            return 0.0
+        return counter.value / (counter.last - counter.first)
+
+    def snapshot(self) -> List[Dict]:
+        """
+        The current value of every counter and histogram as a list of plain dicts.
+        """
+
+        with self._lock:
+            counters = list(self._counters.items())
+            histograms = list(self._histograms.items())
+
+        result = []
+
+        for (name, labels), counter in counters:
+            result.append({"name": name, "type": "counter", "labels": dict(labels), 
+                           "value": counter.value, "rate": self.rate(name, **dict(labels))})
+
+        for (name, labels), histogram in histograms:
+            summary = histogram.samples.summary()
+            result.append({"name": name, "type": "histogram", "labels": dict(labels),
+                           "count": histogram.count, "sum": histogram.sum,
+                           "buckets": list(zip(list(histogram.buckets) + [float("inf")], histogram.bucket_counts)),
+                           "p50": summary["p50"], "p99": summary["p99"], "max": summary["max"]})
+
+        return result
+
+    def export(self) -> None:
+        snapshot = self.snapshot()
+        for exporter in self.exporters:
+            exporter.export(snapshot)
+
+
+class LoggingExporter:
+    """
+    Logs one line per metric.
+    """
+
+    def __init__(self, logger: logging.Logger = None, level: int = logging.INFO) -> None:
+        self.logger = logger or logging.getLogger("metrics")
+        self.level = level
+
+    def export(self, snapshot: List[Dict]) -> None:
+        for metric in snapshot:
+            labels = ",".join(f"{key}={value}" for key, value in metric["labels"].items())
+            if metric["type"] == "counter":
+                self.logger.log(self.level, "%s{%s} %s (%.1f/s)", metric["name"], labels, metric["value"], metric["rate"])
+            else:
+                self.logger.log(self.level, "%s{%s} count=%d sum=%.3f p50=%.4f p99=%.4f max=%.4f", metric["name"], labels,
+                                metric["count"], metric["sum"], metric["p50"], metric["p99"], metric["max"])
+
+
+class JsonLinesExporter:
+    """
+    Appends one JSON object per metric, stamped with the export time, to a file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def export(self, snapshot: List[Dict]) -> None:
+        timestamp = time.time()
+        with open(self.path, "a") as f:
+            for metric in snapshot:
+                metric = dict(metric, timestamp=timestamp)
+                if "buckets" in metric:
+                    metric["buckets"] = [[str(bound), count] for bound, count in metric["buckets"]]
+                f.write(json.dumps(metric) + "\n")
+
+
+class PrometheusExporter:
+    """
+    Renders snapshots in the Prometheus text format.
+    export() writes them to `path`, e.g. for the node exporter textfile collector, and
+    serve() exposes the registry on http://<host>:<port>/metrics for scraping.
+    """
+
+    def __init__(self, path: str = None, prefix: str = "fantano_") -> None:
+        self.path = path
+        self.prefix = prefix
+
+    @staticmethod
+    def _labels(labels: Dict[str, str], **extra: str) -> str:
+        labels = {**labels, **extra}
+        if not labels:
+            return ""
+        escaped = (key + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+                   for key, value in labels.items())
+        return "{" + ",".join(escaped) + "}"
+
+    def render(self, snapshot: List[Dict]) -> str:
+        lines = []
+        described = set()
+
+        for metric in snapshot:
+            name = self.prefix + metric["name"]
+
+            if name not in described:
+                lines.append(f"# TYPE {name} {metric['type']}")
+                described.add(name)
+
+            if metric["type"] == "counter":
+                lines.append(f"{name}{self._labels(metric['labels'])} {metric['value']}")
+                continue
+
+            cumulative = 0
+            for bound, count in metric["buckets"]:
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{self._labels(metric['labels'], le=le)} {cumulative}")
+            lines.append(f"{name}_sum{self._labels(metric['labels'])} {metric['sum']}")
+            lines.append(f"{name}_count{self._labels(metric['labels'])} {metric['count']}")
+
+        return "\n".join(lines) + "\n"
+
+    def export(self, snapshot: List[Dict]) -> None:
+        if self.path is None:
+            return
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render(snapshot))
+        os.replace(tmp_path, self.path)
+
+    def serve(self, registry: "MetricsRegistry", port: int = 9100, host: str = ""):
+        """
+        Serve the registry on a background thread. Call shutdown() on the returned server to stop.
+        """
+
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter.render(registry.snapshot()).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+
+
+# shared registry used by the instrumented code, enabled with METRICS_ENABLED=1 or metrics.enable(...)
+metrics = MetricsRegistry(enabled=os.environ.get("METRICS_ENABLED", "") == "1")
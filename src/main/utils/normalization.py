@@ -0,0 +1,58 @@
+from typing import Iterable
+import html
+import re
+import string
+
+DEFAULT_FILLER_WORDS = ("um", "ah", "uh")
+
+# more filler words to opt into, e.g. TextNormalizer(filler_words=DEFAULT_FILLER_WORDS + EXTRA_FILLER_WORDS)
+EXTRA_FILLER_WORDS = ("umm", "uhh", "ahh", "er", "erm", "hmm", "mm")
+
+# caption tags such as [Music] or [Applause] and speaker change markers
+CAPTION_ARTIFACTS = re.compile(r"\[[^\[\]]{0,40}\]|>>+")
+
+# an html entity, e.g. &amp; or &#39;
+HTML_ENTITY = re.compile(r"&(?:#\d+|#x[0-9a-fA-F]+|[a-zA-Z]+);")
+
+
+class TextNormalizer:
+    """
+    Cleans a transcript in a few linear passes:
+    1. html entities are unescaped.
+    2. caption artifacts such as [Music] and >> are removed with one precompiled regex.
+    3. a token-level filter drops filler words and collapses whitespace.
+       Only whole tokens are dropped, so e.g. "album" is left alone. Punctuation around a token is ignored
+       when matching, so "um," "uh?" and "(ah!)" are dropped along with their punctuation.
+
+    Meant to run once per transcript, before splitting.
+    """
+
+    def __init__(self,
+                 filler_words: Iterable[str] = DEFAULT_FILLER_WORDS,
+                 remove_caption_artifacts: bool = True,
+                 unescape_html: bool = True) -> None:
+
+        self.filler_words = frozenset(word.lower() for word in filler_words)
+        self.remove_caption_artifacts = remove_caption_artifacts
+        self.unescape_html = unescape_html
+
+    @property
+    def key(self) -> str:
+        """
+        Identifies the configuration, e.g. for Chunker.chunking_key.
+        """
+
+        return repr((type(self).__name__, sorted(self.filler_words), self.remove_caption_artifacts, self.unescape_html))
+
+    def __call__(self, text: str) -> str:
+
+        if self.unescape_html and "&" in text:
+            text = HTML_ENTITY.sub(lambda match: html.unescape(match.group(0)), text)
+
+        if self.remove_caption_artifacts and ("[" in text or ">>" in text):
+            text = CAPTION_ARTIFACTS.sub(" ", text)
+
+        fillers = self.filler_words
+
+        # splitting on whitespace and joining with single spaces also collapses whitespace
+        return " ".join(token for token in text.split() if token.lower().strip(string.punctuation) not in fillers)
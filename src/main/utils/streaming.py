@@ -0,0 +1,70 @@
+from typing import Any, Iterable, Iterator, List
+from itertools import islice
+import queue
+import threading
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+def batch_iterator(data: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    """
+    Like utils.batch_method, but accepts any iterable and only holds one batch at a time.
+    """
+
+    iterator = iter(data)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def bounded_stage(source: Iterable[Any], maxsize: int = 4, name: str = "stage") -> Iterator[Any]:
+    """
+    Iterate `source` on a background thread and hand its items over through a queue of at most `maxsize` items.
+    The producer blocks when the queue is full, so a slow consumer applies backpressure
+    and at most `maxsize` items are buffered between the two stages.
+    Exceptions raised by the producer are re-raised in the consumer.
+    """
+
+    items = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in source:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_Failure(e))
+            return
+        put(_DONE)
+
+    thread = threading.Thread(target=produce, name=name, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        # let the producer exit at its next put if the consumer stops early
+        stop.set()
@@ -1,42 +1,89 @@
-from typing import List, Iterator, Any, Dict
-from uuid import uuid4
-import time
+from __future__ import annotations
 
-from tools.embedding import EmbeddingService
+from typing import TYPE_CHECKING, List, Iterator, Any, Dict
+from uuid import UUID, uuid5
+import hashlib
+
+import numpy as np
+
+from utils.normalization import TextNormalizer
+
+if TYPE_CHECKING:
+    from tools.embedding import EmbeddingService
 
 def batch_method(data: List[Any], batch_size: int) -> Iterator[List[Any]]:
     for i in range(0, len(data), batch_size):
             yield data[i:i + batch_size]
 
-def remove_filler_words(text: str) -> str:
+# namespace for the content derived node indexes
+INDEX_NAMESPACE = UUID("6f1c2b4e-3d5a-5b8e-9c47-0a1e2f3d4b5c")
+
+def text_hash(text: str) -> str:
     """
-    Remove filler words from a text string.
+    Stable hash of a text string.
     """
 
-    filler_words = ["um", "ah", "uh"]
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def content_index(*parts: str) -> str:
+    """
+    Derive a document index from its content, so that re-loading the same content MERGEs onto the same node.
+    """
+
+    return str(uuid5(INDEX_NAMESPACE, "\x1f".join(str(part) for part in parts)))
+
+def parent_index(video_id: str, offset: int, text: str) -> str:
+    return content_index(video_id, offset, text_hash(text))
 
-    for word in filler_words:
-        text = text.replace(word, "")
+def child_index(parent_idx: str, offset: int, text: str) -> str:
+    return content_index(parent_idx, offset, text_hash(text))
 
-    # remove extra whitespace
-    return text.strip()
+_filler_word_normalizer = TextNormalizer(remove_caption_artifacts=False, unescape_html=False)
 
-def prepare_new_nodes(data: List[Dict[str,str]], embedding_service: EmbeddingService, playlist_id: str = "") -> List[Dict]:
+def remove_filler_words(text: str) -> str:
+    """
+    Remove filler words from a text string.
+    Only whole words are removed, see utils.normalization.TextNormalizer.
+    """
+
+    return _filler_word_normalizer(text)
+
+def prepare_new_nodes(data: List[Dict[str,str]], embedding_service: EmbeddingService, playlist_id: str = "", 
+                      batch_size: int = 256, n_process: int = 1, embeddings: np.ndarray = None) -> List[Dict]:
     """
     format chunked data to be uploaded into neo4j graph.
+    The chunk embeddings are requested in batches.
+    Child indexes are derived from the parent index, the chunk offset and the chunk text, so reloads are MERGE no-ops.
+    Pass a CachedEmbeddingService to only embed chunks that are not in the embedding cache.
+    Precomputed embeddings, one row per chunk, may be passed instead of an embedding service.
+    Raises a ValueError if the number of embeddings does not match the number of chunks to embed.
+    Chunks collapsed onto a canonical child by tools.dedup.NearDuplicateFilter are not embedded and get no
+    precomputed embedding row, their embedding is None.
+    Returns new rows, the rows in `data` are left unchanged.
     """
 
-    new_nodes = data.copy()
+    new_nodes = [dict(chunk) for chunk in data]
+    to_embed = [chunk for chunk in new_nodes if chunk.get("duplicate_of") is None]
 
-    for chunk in new_nodes:
-        
+    if embeddings is None:
+        embeddings = embedding_service.get_document_embeddings([chunk['transcript'] for chunk in to_embed], 
+                                                               batch_size=batch_size, 
+                                                               n_process=n_process)
+
+    # zip would silently drop the chunks past the last embedding and load them without one
+    if len(embeddings) != len(to_embed):
+        raise ValueError(f"got {len(embeddings)} embeddings for {len(to_embed)} chunks to embed")
+
+    for chunk, embedding in zip(to_embed, embeddings):
 
-        start = time.time()
+        if not chunk.get("child_index"):
+            chunk["child_index"] = child_index(chunk['parent_index'], chunk.get('child_offset', 0), chunk['transcript'])
 
-        # make request
-        chunk.update({  "child_index": str(uuid4()),
-                        "playlist_id": playlist_id,
-                        "embedding": embedding_service.get_document_embedding(chunk['transcript'])})
+        chunk.update({  "playlist_id": playlist_id,
+                        "embedding": embedding.tolist()})
+
+    for chunk in new_nodes:
+        if chunk.get("duplicate_of") is not None:
+            chunk.update({"playlist_id": playlist_id, "embedding": None})
 
-            
-    return new_nodes
\ No newline at end of file
+    return new_nodes